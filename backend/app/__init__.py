@@ -1,82 +1,98 @@
+import os
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
 from flask import Flask
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
-from pymongo import MongoClient
 from .config import config
+from .database import init_db, get_db
+from .storage import init_storage, get_storage
+from .log import configure_logging
+from .metrics import init_metrics
+from .compression import init_compression
+
+_IMPORT_FINISHED = time.perf_counter()
 
 # Global variables
-mongo_client = None
-db = None
 jwt = JWTManager()
 
 
 def create_app(config_name='default'):
     """Application factory pattern"""
     
+    started = time.perf_counter()
+    phases = {}
+    
+    def phase(name, since):
+        now = time.perf_counter()
+        phases[name] = round((now - since) * 1000, 2)
+        return now
+    
     app = Flask(__name__)
     
     # Load configuration
     app.config.from_object(config[config_name])
+    configure_logging(app)
+    mark = phase('config', started)
     
     # Initialize extensions
     CORS(app, origins=app.config['CORS_ORIGINS'], supports_credentials=True)
     jwt.init_app(app)
+    register_jwt_handlers(app)
+    mark = phase('extensions', mark)
     
-    # Initialize MongoDB
-    init_db(app)
+    # Initialize storage: MongoDB (clients are created per worker on first use) or SQLite
+    init_storage(app)
+    mark = phase('database', mark)
     
     # Register blueprints
     register_blueprints(app)
+    mark = phase('blueprints', mark)
     
     # Register error handlers
     register_error_handlers(app)
     
+    # Request timing and GET /metrics
+    init_metrics(app)
+    
+    # Negotiated gzip/br/zstd (after metrics, so sent bytes are what gets counted)
+    init_compression(app)
+    
+    # Register CLI commands
+    register_commands(app)
+    
+    report_startup(app, started, phases)
+    
     return app
 
 
-def init_db(app):
-    """Initialize MongoDB connection"""
-    global mongo_client, db
-    
-    try:
-        mongo_client = MongoClient(
-            app.config['MONGODB_URI'],
-            serverSelectionTimeoutMS=5000
-        )
-        
-        # Test connection
-        mongo_client.server_info()
-        
-        db = mongo_client[app.config['MONGODB_DB_NAME']]
-        
-        # Create indexes
-        create_indexes(db)
-        
-        app.logger.info(f"Connected to MongoDB: {app.config['MONGODB_DB_NAME']}")
-        
-    except Exception as e:
-        app.logger.error(f"Failed to connect to MongoDB: {str(e)}")
-        raise
+def report_startup(app, started, phases):
+    """Record and log how long boot took, split by phase"""
+    
+    report = {
+        'pid': os.getpid(),
+        'imports_ms': round((_IMPORT_FINISHED - _IMPORT_STARTED) * 1000, 2),
+        'create_app_ms': round((time.perf_counter() - started) * 1000, 2),
+        'phases_ms': phases
+    }
+    app.extensions['startup_report'] = report
+    
+    app.logger.info(
+        f"Started in {report['create_app_ms']} ms "
+        f"(imports {report['imports_ms']} ms; "
+        + ', '.join(f"{name} {ms} ms" for name, ms in phases.items()) + ")",
+        extra={'fields': report}
+    )
 
 
-def create_indexes(db):
-    """Create database indexes for better query performance"""
-    
-    # Users collection indexes
-    db.users.create_index('email', unique=True)
-    
-    # Events collection indexes
-    db.events.create_index([('userId', 1), ('timestamp', -1)])
-    db.events.create_index('timestamp')
-    db.events.create_index('type')
-    db.events.create_index('domain')
+def register_jwt_handlers(app):
+    """Register JWT callbacks"""
     
-    # Sessions collection indexes
-    db.sessions.create_index([('userId', 1), ('startTime', -1)])
-    db.sessions.create_index('domain')
+    from app.auth.revocation import is_token_revoked
     
-    # Insights collection indexes
-    db.insights.create_index([('userId', 1), ('date', -1)])
+    jwt.token_in_blocklist_loader(is_token_revoked)
 
 
 def register_blueprints(app):
@@ -86,11 +102,25 @@ def register_blueprints(app):
     from app.events.routes import events_bp
     from app.analytics.routes import analytics_bp
     from app.ai.routes import ai_bp
+    from app.status.routes import status_bp
     
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(events_bp, url_prefix='/api/events')
     app.register_blueprint(analytics_bp, url_prefix='/api/analytics')
     app.register_blueprint(ai_bp, url_prefix='/api/ai')
+    app.register_blueprint(status_bp, url_prefix='/api/status')
+
+
+def register_commands(app):
+    """Register CLI commands"""
+    
+    from app.cli import archive_cli, events_cli, indexes_cli, retention_cli, shards_cli
+    
+    app.cli.add_command(indexes_cli)
+    app.cli.add_command(shards_cli)
+    app.cli.add_command(archive_cli)
+    app.cli.add_command(retention_cli)
+    app.cli.add_command(events_cli)
 
 
 def register_error_handlers(app):
@@ -109,8 +139,3 @@ def register_error_handlers(app):
     @app.errorhandler(400)
     def bad_request(error):
         return jsonify({'error': 'Bad request', 'message': str(error)}), 400
-
-
-def get_db():
-    """Get database instance"""
-    return db
\ No newline at end of file
@@ -1,4 +1,11 @@
 from .gemini import get_gemini_ai
+from .classifier import DomainClassifier, get_domain_classifier
+from .providers import LLMProvider, GeminiProvider, FakeProvider, create_llm_provider
+from .breaker import CircuitBreaker, LLMUnavailableError
 from .routes import ai_bp
 
-__all__ = ['get_gemini_ai', 'ai_bp']
\ No newline at end of file
+__all__ = [
+    'get_gemini_ai', 'DomainClassifier', 'get_domain_classifier',
+    'LLMProvider', 'GeminiProvider', 'FakeProvider', 'create_llm_provider',
+    'CircuitBreaker', 'LLMUnavailableError', 'ai_bp'
+]
\ No newline at end of file
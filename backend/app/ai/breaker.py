@@ -0,0 +1,129 @@
+import threading
+import time
+
+
+class LLMUnavailableError(Exception):
+    """The LLM could not produce an answer in time; callers should fall back"""
+
+
+class CircuitOpenError(LLMUnavailableError):
+    """Raised without calling upstream while the circuit is open"""
+
+
+class LLMTimeoutError(LLMUnavailableError):
+    """Raised when an upstream call exceeds its deadline"""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+    
+    closed    -> calls pass; failures and slow calls are counted
+    open      -> calls are rejected until `reset_timeout` has elapsed
+    half_open -> a single trial call decides between closed and open
+    """
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, failure_threshold=5, slow_call_seconds=10, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+        
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0
+        self._trial_in_flight = False
+        
+        self.stats = {
+            'calls': 0,
+            'successes': 0,
+            'failures': 0,
+            'slow_calls': 0,
+            'timeouts': 0,
+            'short_circuited': 0,
+            'opened': 0,
+            'half_opened': 0,
+            'closed': 0
+        }
+    
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+    
+    def allow(self):
+        """Reserve a call; returns False if the circuit rejects it"""
+        with self._lock:
+            state = self._current_state()
+            
+            if state == self.CLOSED:
+                self.stats['calls'] += 1
+                return True
+            
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                self.stats['calls'] += 1
+                return True
+            
+            self.stats['short_circuited'] += 1
+            return False
+    
+    def record_success(self, duration):
+        """Record a completed call; slow calls count as failures"""
+        if duration >= self.slow_call_seconds:
+            with self._lock:
+                self.stats['slow_calls'] += 1
+            self.record_failure()
+            return
+        
+        with self._lock:
+            self.stats['successes'] += 1
+            self._failures = 0
+            self._trial_in_flight = False
+            if self._state != self.CLOSED:
+                self._transition(self.CLOSED)
+    
+    def record_failure(self, timeout=False):
+        """Record a failed call, opening the circuit when the threshold is reached"""
+        with self._lock:
+            self.stats['failures'] += 1
+            if timeout:
+                self.stats['timeouts'] += 1
+            
+            self._failures += 1
+            was_trial = self._trial_in_flight
+            self._trial_in_flight = False
+            
+            if was_trial or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                if self._state != self.OPEN:
+                    self._transition(self.OPEN)
+    
+    def release(self):
+        """Free a reserved call that ended without a verdict (e.g. abandoned stream)"""
+        with self._lock:
+            self._trial_in_flight = False
+    
+    def snapshot(self):
+        """Current state and counters, for status endpoints and metrics"""
+        with self._lock:
+            return {
+                'state': self._current_state(),
+                'consecutive_failures': self._failures,
+                **self.stats
+            }
+    
+    def _current_state(self):
+        # Caller holds the lock
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._transition(self.HALF_OPEN)
+        return self._state
+    
+    def _transition(self, state):
+        # Caller holds the lock
+        self._state = state
+        self.stats[{'open': 'opened', 'half_open': 'half_opened', 'closed': 'closed'}[state]] += 1
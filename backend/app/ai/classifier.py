@@ -0,0 +1,251 @@
+"""
+Compiled rule-based domain classifier (fallback when the LLM is unavailable)
+
+Lookups are checked in order: exact registrable domain, reversed-label
+suffix trie, then an Aho-Corasick keyword automaton.
+"""
+import json
+from collections import deque
+from flask import current_app, has_app_context
+
+
+DEFAULT_CATEGORY = 'other'
+
+# Bound on memoized results per classifier (cleared when full)
+CACHE_MAX_ENTRIES = 50000
+
+# Category order is the keyword priority: when keywords from several
+# categories match, the category listed first wins.
+DEFAULT_RULES = [
+    {
+        'name': 'work',
+        'domains': [],
+        'suffixes': [],
+        'keywords': ['github', 'stackoverflow', 'docs', 'aws', 'google.com/cloud', 'notion', 'trello', 'asana', 'slack']
+    },
+    {
+        'name': 'social',
+        'domains': [],
+        'suffixes': [],
+        'keywords': ['facebook', 'twitter', 'instagram', 'reddit', 'tiktok', 'linkedin']
+    },
+    {
+        'name': 'entertainment',
+        'domains': [],
+        'suffixes': [],
+        'keywords': ['youtube', 'netflix', 'twitch', 'spotify', 'hulu']
+    },
+    {
+        'name': 'shopping',
+        'domains': [],
+        'suffixes': [],
+        'keywords': ['amazon', 'ebay', 'shopify', 'etsy']
+    },
+    {
+        'name': 'news',
+        'domains': [],
+        'suffixes': [],
+        'keywords': ['news', 'bbc', 'cnn', 'nytimes', 'reuters']
+    }
+]
+
+# Second-level labels under which registrations happen one level deeper
+# (example.co.uk). Not a full public suffix list, but covers common cases.
+MULTI_LABEL_SUFFIXES = {
+    'co.uk', 'org.uk', 'ac.uk', 'gov.uk', 'com.au', 'net.au', 'org.au',
+    'co.jp', 'co.nz', 'co.in', 'com.br', 'com.cn', 'com.mx', 'co.za'
+}
+
+
+def normalize_domain(domain):
+    """Lowercase a domain and strip scheme, path, port and a leading www."""
+    host = (domain or '').strip().lower()
+    
+    if '://' in host:
+        host = host.split('://', 1)[1]
+    host = host.split('/', 1)[0].split(':', 1)[0].rstrip('.')
+    
+    if host.startswith('www.'):
+        host = host[4:]
+    
+    return host
+
+
+def registrable_domain(host):
+    """Return the registrable part of a normalized host (docs.github.com -> github.com)"""
+    labels = host.split('.')
+    
+    if len(labels) > 2 and '.'.join(labels[-2:]) in MULTI_LABEL_SUFFIXES:
+        return '.'.join(labels[-3:])
+    
+    return '.'.join(labels[-2:])
+
+
+class DomainClassifier:
+    """Multi-pattern domain classifier compiled from category rules"""
+    
+    def __init__(self, rules=None):
+        rules = rules if rules is not None else DEFAULT_RULES
+        
+        self.categories = [rule['name'] for rule in rules]
+        self._cache = {}
+        self._exact = {}
+        self._suffix_trie = {}
+        
+        keywords = []
+        
+        for priority, rule in enumerate(rules):
+            for domain in rule.get('domains', []):
+                self._exact.setdefault(normalize_domain(domain), priority)
+            
+            for suffix in rule.get('suffixes', []):
+                self._add_suffix(normalize_domain(suffix.lstrip('*.')), priority)
+            
+            for keyword in rule.get('keywords', []):
+                keywords.append((keyword.lower(), priority))
+        
+        self._build_automaton(keywords)
+    
+    @classmethod
+    def from_file(cls, path):
+        """Load rules from a JSON file: {"categories": [{"name", "domains", "suffixes", "keywords"}]}"""
+        with open(path) as f:
+            data = json.load(f)
+        
+        return cls(data['categories'] if isinstance(data, dict) else data)
+    
+    def classify(self, domain):
+        """Classify a single domain or URL into a category name"""
+        if not domain:
+            return DEFAULT_CATEGORY
+        
+        category = self._cache.get(domain)
+        if category is None:
+            if len(self._cache) >= CACHE_MAX_ENTRIES:
+                self._cache.clear()
+            category = self._cache[domain] = self._classify(domain)
+        
+        return category
+    
+    def _classify(self, domain):
+        raw = domain.lower()
+        host = normalize_domain(raw)
+        
+        priority = self._exact.get(registrable_domain(host))
+        if priority is None:
+            priority = self._exact.get(host)
+        if priority is None:
+            priority = self._match_suffix(host)
+        if priority is None:
+            priority = self._match_keywords(raw)
+        
+        return self.categories[priority] if priority is not None else DEFAULT_CATEGORY
+    
+    def classify_many(self, domains):
+        """
+        Classify a batch of domains
+        
+        Repeated domains (the common case for event streams, where a
+        handful of domains dominate) are served from the memo.
+        
+        Returns:
+            list: Category names in the same order as `domains`
+        """
+        classify = self.classify
+        return [classify(domain) for domain in domains]
+    
+    def _add_suffix(self, suffix, priority):
+        node = self._suffix_trie
+        for label in reversed(suffix.split('.')):
+            node = node.setdefault(label, {})
+        node.setdefault(None, priority)
+    
+    def _match_suffix(self, host):
+        """Walk the reversed labels and return the priority of the longest matching suffix"""
+        node = self._suffix_trie
+        match = None
+        
+        for label in reversed(host.split('.')):
+            node = node.get(label)
+            if node is None:
+                break
+            if None in node:
+                match = node[None]
+        
+        return match
+    
+    def _build_automaton(self, keywords):
+        """Compile keywords into an Aho-Corasick automaton"""
+        goto = [{}]
+        best = [None]
+        
+        for keyword, priority in keywords:
+            state = 0
+            for ch in keyword:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    best.append(None)
+                state = nxt
+            if best[state] is None or priority < best[state]:
+                best[state] = priority
+        
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                
+                # Inherit the best category of the failure state's matches
+                inherited = best[fail[nxt]]
+                if inherited is not None and (best[nxt] is None or inherited < best[nxt]):
+                    best[nxt] = inherited
+        
+        self._goto = goto
+        self._fail = fail
+        self._best = best
+    
+    def _match_keywords(self, text):
+        """Scan the text once and return the highest-priority keyword category"""
+        goto, fail, best = self._goto, self._fail, self._best
+        state = 0
+        match = None
+        
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            
+            found = best[state]
+            if found is not None and (match is None or found < match):
+                match = found
+                if match == 0:
+                    break
+        
+        return match
+
+
+# Global instance
+domain_classifier = None
+
+
+def get_domain_classifier(config=None):
+    """Get or create the domain classifier (rules from DOMAIN_CATEGORIES_FILE if set)"""
+    global domain_classifier
+    
+    if domain_classifier is None:
+        if config is None and has_app_context():
+            config = current_app.config
+        path = config.get('DOMAIN_CATEGORIES_FILE') if config is not None else None
+        domain_classifier = DomainClassifier.from_file(path) if path else DomainClassifier()
+    
+    return domain_classifier
@@ -1,31 +1,45 @@
-import google.generativeai as genai
 from flask import current_app
+from app.ai.classifier import get_domain_classifier
+from app.ai.breaker import LLMUnavailableError
+from app.ai.providers import GeminiProvider, create_llm_provider
 from datetime import datetime, timedelta
 import json
 
+# Prompt budget: sections are capped so prompt size is independent of event volume
+PROMPT_MAX_DOMAINS = 10
+PROMPT_MAX_EVENT_TYPES = 10
+PROMPT_MAX_LABEL_LENGTH = 80
+PROMPT_MAX_CHARS = 4000
+
+
+def _clip(label):
+    """Truncate a domain or type label to the prompt budget"""
+    label = str(label)
+    return label if len(label) <= PROMPT_MAX_LABEL_LENGTH else label[:PROMPT_MAX_LABEL_LENGTH] + '...'
+
 
 class GeminiAI:
-    """Gemini AI integration for generating insights"""
+    """AI insight generation on top of a pluggable LLM provider (Gemini by default)"""
     
-    def __init__(self, api_key=None):
-        self.api_key = api_key or current_app.config.get('GEMINI_API_KEY')
-        
-        if self.api_key:
-            genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('gemini-pro')
-        else:
-            self.model = None
+    def __init__(self, api_key=None, provider=None, config=None):
+        if provider is None and api_key:
+            provider = GeminiProvider(api_key)
+        elif provider is None:
+            provider = create_llm_provider(config if config is not None else current_app.config)
+        
+        self.provider = provider
     
     def is_configured(self):
-        """Check if Gemini AI is configured"""
-        return self.model is not None
+        """Check if an LLM provider is configured"""
+        return self.provider is not None
     
-    def generate_daily_summary(self, events_data):
+    def generate_daily_summary(self, daily_stats):
         """
-        Generate daily summary from browsing events
+        Generate daily summary from aggregated browsing stats
         
         Args:
-            events_data: List of event dictionaries with type, domain, timestamp
+            daily_stats: Dict with total_events, top_domains, event_types
+                and hourly_activity (see `_build_daily_summary_prompt`)
         
         Returns:
             str: AI-generated summary
@@ -34,35 +48,61 @@ class GeminiAI:
             return "AI insights not configured. Please add GEMINI_API_KEY to environment."
         
         try:
-            # Prepare data summary
-            domains = {}
-            event_types = {}
+            prompt = self._build_daily_summary_prompt(daily_stats)
+            return self.provider.generate(prompt)
             
-            for event in events_data:
-                # Count domains
-                domain = event.get('domain')
-                if domain:
-                    domains[domain] = domains.get(domain, 0) + 1
-                
-                # Count event types
-                event_type = event.get('type')
-                if event_type:
-                    event_types[event_type] = event_types.get(event_type, 0) + 1
-            
-            # Sort by frequency
-            top_domains = sorted(domains.items(), key=lambda x: x[1], reverse=True)[:10]
+        except LLMUnavailableError:
+            return self._fallback_daily_summary(daily_stats)
+        except Exception as e:
+            return f"Failed to generate summary: {str(e)}"
+    
+    def stream_daily_summary(self, daily_stats):
+        """
+        Stream daily summary chunks as they are generated
+        
+        Args:
+            daily_stats: Dict of aggregated stats, as for `generate_daily_summary`
+        
+        Yields:
+            str: Text chunks of the AI-generated summary
+        """
+        if not self.is_configured():
+            yield "AI insights not configured. Please add GEMINI_API_KEY to environment."
+            return
+        
+        try:
+            prompt = self._build_daily_summary_prompt(daily_stats)
+            yield from self._stream_or_fallback(prompt, lambda: self._fallback_daily_summary(daily_stats))
             
-            # Create prompt
-            prompt = f"""
+        except Exception as e:
+            yield f"Failed to generate summary: {str(e)}"
+    
+    def _build_daily_summary_prompt(self, daily_stats):
+        """
+        Build the daily summary prompt from pre-aggregated stats
+        
+        Expects `top_domains` as [{'domain', 'count'}], `event_types` as
+        [{'type', 'count'}] and `hourly_activity` as [{'hour', 'count'}].
+        Every section is capped so the prompt size does not depend on how
+        many events the day had.
+        """
+        top_domains = daily_stats.get('top_domains', [])[:PROMPT_MAX_DOMAINS]
+        event_types = daily_stats.get('event_types', [])[:PROMPT_MAX_EVENT_TYPES]
+        hourly = daily_stats.get('hourly_activity', [])[:24]
+        
+        prompt = f"""
             Analyze this browsing activity data and provide a concise daily summary (3-4 sentences):
             
-            Total Events: {len(events_data)}
+            Total Events: {daily_stats.get('total_events', 0)}
             
             Top Domains Visited:
-            {chr(10).join([f"- {domain}: {count} visits" for domain, count in top_domains])}
+            {chr(10).join([f"- {_clip(d['domain'])}: {d['count']} visits" for d in top_domains])}
             
             Event Types:
-            {chr(10).join([f"- {etype}: {count}" for etype, count in event_types.items()])}
+            {chr(10).join([f"- {_clip(t['type'])}: {t['count']}" for t in event_types])}
+            
+            Activity by Hour:
+            {', '.join([f"{h['hour']}:00={h['count']}" for h in hourly])}
             
             Provide insights about:
             1. Main focus areas (work, entertainment, social media, etc.)
@@ -71,12 +111,8 @@ class GeminiAI:
             
             Keep it friendly and actionable.
             """
-            
-            response = self.model.generate_content(prompt)
-            return response.text
-            
-        except Exception as e:
-            return f"Failed to generate summary: {str(e)}"
+        
+        return prompt[:PROMPT_MAX_CHARS]
     
     def generate_productivity_insights(self, time_spent_data, productivity_score):
         """
@@ -93,16 +129,51 @@ class GeminiAI:
             return "AI insights not configured."
         
         try:
-            # Prepare data
-            top_sites = sorted(time_spent_data.items(), key=lambda x: x[1], reverse=True)[:10]
+            prompt = self._build_productivity_prompt(time_spent_data, productivity_score)
+            return self.provider.generate(prompt)
             
-            prompt = f"""
+        except LLMUnavailableError:
+            return self._fallback_productivity_insights(time_spent_data, productivity_score)
+        except Exception as e:
+            return f"Failed to generate insights: {str(e)}"
+    
+    def stream_productivity_insights(self, time_spent_data, productivity_score):
+        """
+        Stream productivity insight chunks as they are generated
+        
+        Args:
+            time_spent_data: Dict of {domain: minutes}
+            productivity_score: Float between 0-100
+        
+        Yields:
+            str: Text chunks of the AI-generated insights
+        """
+        if not self.is_configured():
+            yield "AI insights not configured."
+            return
+        
+        try:
+            prompt = self._build_productivity_prompt(time_spent_data, productivity_score)
+            yield from self._stream_or_fallback(
+                prompt, lambda: self._fallback_productivity_insights(time_spent_data, productivity_score)
+            )
+            
+        except Exception as e:
+            yield f"Failed to generate insights: {str(e)}"
+    
+    def _build_productivity_prompt(self, time_spent_data, productivity_score):
+        """Build the productivity insights prompt"""
+        
+        # Prepare data
+        top_sites = sorted(time_spent_data.items(), key=lambda x: x[1], reverse=True)[:PROMPT_MAX_DOMAINS]
+        
+        return f"""
             Analyze this productivity data and provide actionable insights (3-4 sentences):
             
             Productivity Score: {productivity_score}/100
             
             Time Spent on Sites:
-            {chr(10).join([f"- {domain}: {round(minutes/60, 2)} hours" for domain, minutes in top_sites])}
+            {chr(10).join([f"- {_clip(domain)}: {round(minutes/60, 2)} hours" for domain, minutes in top_sites])}
             
             Provide:
             1. Assessment of productivity level
@@ -110,13 +181,7 @@ class GeminiAI:
             3. Positive reinforcement for good habits
             
             Be encouraging and specific.
-            """
-            
-            response = self.model.generate_content(prompt)
-            return response.text
-            
-        except Exception as e:
-            return f"Failed to generate insights: {str(e)}"
+            """[:PROMPT_MAX_CHARS]
     
     def categorize_domain(self, domain, title=None):
         """
@@ -150,8 +215,7 @@ class GeminiAI:
             Respond with ONLY the category name in lowercase.
             """
             
-            response = self.model.generate_content(prompt)
-            category = response.text.strip().lower()
+            category = self.provider.generate(prompt).strip().lower()
             
             # Validate category
             valid_categories = ['work', 'learning', 'social', 'entertainment', 'shopping', 'news', 'other']
@@ -162,27 +226,7 @@ class GeminiAI:
     
     def _simple_categorize(self, domain):
         """Simple rule-based categorization fallback"""
-        
-        work_keywords = ['github', 'stackoverflow', 'docs', 'aws', 'google.com/cloud', 'notion', 'trello', 'asana', 'slack']
-        social_keywords = ['facebook', 'twitter', 'instagram', 'reddit', 'tiktok', 'linkedin']
-        entertainment_keywords = ['youtube', 'netflix', 'twitch', 'spotify', 'hulu']
-        shopping_keywords = ['amazon', 'ebay', 'shopify', 'etsy']
-        news_keywords = ['news', 'bbc', 'cnn', 'nytimes', 'reuters']
-        
-        domain_lower = domain.lower()
-        
-        if any(kw in domain_lower for kw in work_keywords):
-            return 'work'
-        elif any(kw in domain_lower for kw in social_keywords):
-            return 'social'
-        elif any(kw in domain_lower for kw in entertainment_keywords):
-            return 'entertainment'
-        elif any(kw in domain_lower for kw in shopping_keywords):
-            return 'shopping'
-        elif any(kw in domain_lower for kw in news_keywords):
-            return 'news'
-        else:
-            return 'other'
+        return get_domain_classifier().classify(domain)
     
     def detect_patterns(self, events_by_hour, events_by_day):
         """
@@ -216,9 +260,15 @@ class GeminiAI:
             Be specific and actionable.
             """
             
-            response = self.model.generate_content(prompt)
-            return response.text
+            return self.provider.generate(prompt)
             
+        except LLMUnavailableError:
+            peak_hour = max(events_by_hour.items(), key=lambda x: x[1])[0] if events_by_hour else None
+            peak_day = max(events_by_day.items(), key=lambda x: x[1])[0] if events_by_day else None
+            return (
+                f"Most activity happens around {peak_hour}:00 and on {peak_day}. "
+                "(AI analysis is temporarily unavailable.)"
+            ) if peak_hour is not None else "AI pattern detection is temporarily unavailable."
         except Exception as e:
             return f"Failed to detect patterns: {str(e)}"
     
@@ -258,37 +308,88 @@ class GeminiAI:
             }}
             """
             
-            response = self.model.generate_content(prompt)
+            text = self.provider.generate(prompt)
             
             # Try to parse JSON response
             try:
-                report = json.loads(response.text)
+                report = json.loads(text)
                 return report
             except json.JSONDecodeError:
                 # Fallback if AI doesn't return valid JSON
                 return {
-                    'summary': response.text[:200],
+                    'summary': text[:200],
                     'highlights': [],
                     'recommendations': []
                 }
             
+        except LLMUnavailableError:
+            return {
+                'summary': (
+                    f"{weekly_data.get('total_events', 0)} events this week with a productivity score of "
+                    f"{weekly_data.get('productivity_score', 0)}/100. (AI report is temporarily unavailable.)"
+                ),
+                'highlights': [
+                    f"{d['domain']}: {d['count']} events"
+                    for d in weekly_data.get('top_domains', [])[:3]
+                ],
+                'recommendations': []
+            }
         except Exception as e:
             return {
                 'summary': f'Failed to generate report: {str(e)}',
                 'highlights': [],
                 'recommendations': []
             }
+    
+    def _stream_or_fallback(self, prompt, fallback):
+        """Stream from the provider, switching to the rule-based text if it is unavailable"""
+        started = False
+        
+        try:
+            for chunk in self.provider.stream(prompt):
+                started = True
+                yield chunk
+                
+        except LLMUnavailableError:
+            yield " (response cut short: AI timed out)" if started else fallback()
+    
+    def _fallback_daily_summary(self, daily_stats):
+        """Rule-based daily summary used while the LLM is unavailable"""
+        top = ', '.join(f"{d['domain']} ({d['count']})" for d in daily_stats.get('top_domains', [])[:3])
+        hourly = daily_stats.get('hourly_activity', [])
+        peak = max(hourly, key=lambda h: h['count'])['hour'] if hourly else None
+        
+        summary = f"You recorded {daily_stats.get('total_events', 0)} events today."
+        if top:
+            summary += f" Most visited: {top}."
+        if peak is not None:
+            summary += f" Your busiest hour was {peak}:00."
+        
+        return summary + " (AI summary is temporarily unavailable.)"
+    
+    def _fallback_productivity_insights(self, time_spent_data, productivity_score):
+        """Rule-based productivity insights used while the LLM is unavailable"""
+        top_sites = sorted(time_spent_data.items(), key=lambda x: x[1], reverse=True)[:3]
+        
+        text = f"Your productivity score is {round(productivity_score, 2)}/100."
+        if top_sites:
+            text += " Most time went to " + ', '.join(
+                f"{self._simple_categorize(domain)} site {domain} ({round(minutes / 60, 2)}h)"
+                for domain, minutes in top_sites
+            ) + "."
+        
+        return text + " (AI insights are temporarily unavailable.)"
 
 
 # Global instance
 gemini_ai = None
 
 
-def get_gemini_ai():
-    """Get or create Gemini AI instance"""
+def get_gemini_ai(config=None):
+    """Get or create Gemini AI instance (from `config`, or the Flask app config)"""
     global gemini_ai
     
     if gemini_ai is None:
-        gemini_ai = GeminiAI()
+        gemini_ai = GeminiAI(config=config)
     
     return gemini_ai
\ No newline at end of file
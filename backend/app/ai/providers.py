@@ -0,0 +1,382 @@
+import hashlib
+import json
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from app.ai.breaker import CircuitBreaker, CircuitOpenError, LLMTimeoutError, LLMUnavailableError
+from app.ai.singleflight import SingleFlight
+from app.metrics import observe_llm_call
+
+
+class LLMProvider:
+    """Interface for text generation backends"""
+    
+    name = 'base'
+    
+    def generate(self, prompt):
+        """Return the full completion text for a prompt"""
+        raise NotImplementedError
+    
+    def stream(self, prompt):
+        """Yield completion text chunks as they are produced"""
+        yield self.generate(prompt)
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini via google.generativeai"""
+    
+    name = 'gemini'
+    
+    def __init__(self, api_key, model_name='gemini-pro'):
+        # Imported on first use: the SDK takes most of a second to import and is
+        # not needed at all when AI is disabled or a fake provider is configured
+        import google.generativeai as genai
+        
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+    
+    def generate(self, prompt):
+        response = self.model.generate_content(prompt)
+        return response.text
+    
+    def stream(self, prompt):
+        response = self.model.generate_content(prompt, stream=True)
+        
+        for chunk in response:
+            text = getattr(chunk, 'text', '')
+            if text:
+                yield text
+
+
+class FakeProvider(LLMProvider):
+    """
+    Deterministic offline backend for tests and benchmarks
+    
+    The same prompt always produces the same text. Prompts asking for a
+    category or JSON get answers in that shape, so callers exercise the
+    same parsing paths as with a real model. `latency_ms` simulates
+    upstream time, spread across chunks when streaming.
+    """
+    
+    name = 'fake'
+    
+    CATEGORIES = ['work', 'learning', 'social', 'entertainment', 'shopping', 'news', 'other']
+    
+    def __init__(self, latency_ms=0, chunk_count=8):
+        self.latency = latency_ms / 1000
+        self.chunk_count = chunk_count
+        self.calls = 0
+    
+    def generate(self, prompt):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return self._complete(prompt)
+    
+    def stream(self, prompt):
+        self.calls += 1
+        words = self._complete(prompt).split(' ')
+        size = max(1, -(-len(words) // self.chunk_count))
+        
+        for i in range(0, len(words), size):
+            if self.latency:
+                time.sleep(self.latency / self.chunk_count)
+            yield ' '.join(words[i:i + size]) + (' ' if i + size < len(words) else '')
+    
+    def _complete(self, prompt):
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        
+        if 'ONLY the category name' in prompt:
+            return self.CATEGORIES[int(digest[:8], 16) % len(self.CATEGORIES)]
+        
+        if 'ONLY valid JSON' in prompt:
+            return json.dumps({
+                'summary': f'Fake weekly summary {digest[:8]}.',
+                'highlights': [f'Highlight {digest[i:i + 4]}' for i in (0, 4, 8)],
+                'recommendations': [f'Recommendation {digest[i:i + 4]}' for i in (12, 16, 20)]
+            })
+        
+        return (
+            f'Fake insight {digest[:8]}: activity looks steady with a clear focus block. '
+            f'Consider batching distractions and protecting your peak hours. '
+            f'Keep up the good habits ({len(prompt)} prompt chars).'
+        )
+
+
+class MeteredProvider(LLMProvider):
+    """Record upstream call latency and outcome for each generate/stream call"""
+    
+    def __init__(self, provider):
+        self.provider = provider
+        self.name = provider.name
+    
+    def generate(self, prompt):
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            text = self.provider.generate(prompt)
+            outcome = 'success'
+            return text
+        finally:
+            observe_llm_call(self.name, 'generate', outcome, time.perf_counter() - start)
+    
+    def stream(self, prompt):
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            yield from self.provider.stream(prompt)
+            outcome = 'success'
+        except GeneratorExit:
+            outcome = 'abandoned'
+            raise
+        finally:
+            observe_llm_call(self.name, 'stream', outcome, time.perf_counter() - start)
+
+
+class GuardedProvider(LLMProvider):
+    """
+    Enforce deadlines and a circuit breaker around a provider
+    
+    Upstream calls run on a bounded thread pool so the request thread can
+    give up at the deadline. A call that was given up on keeps its worker
+    (and its place in `max_concurrency`) until upstream returns, so stuck
+    calls make new ones fail fast instead of queueing behind them. When
+    the circuit is open or a call fails, the last good answer for the same
+    prompt is served if one is cached; otherwise the error propagates for
+    the caller's rule-based fallback.
+    """
+    
+    _DONE = object()
+    
+    def __init__(self, provider, timeout=20, stream_timeout=60, max_concurrency=8,
+                 breaker=None, fallback_cache_size=256):
+        self.provider = provider
+        self.name = provider.name
+        self.timeout = timeout
+        self.stream_timeout = stream_timeout
+        self.max_concurrency = max_concurrency
+        self.breaker = breaker or CircuitBreaker()
+        self.fallback_cache_size = fallback_cache_size
+        self.cache_hits = 0
+        self.saturated = 0
+        
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='llm')
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+    
+    def generate(self, prompt):
+        if not self.breaker.allow():
+            return self._cached_or_raise(prompt, CircuitOpenError('LLM circuit is open'))
+        
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            return self._cached_or_raise(prompt, self._saturated_error())
+        future = self._submit(self.provider.generate, prompt)
+        
+        try:
+            text = future.result(timeout=max(0, start + self.timeout - time.monotonic()))
+        except FutureTimeoutError:
+            future.cancel()
+            self.breaker.record_failure(timeout=True)
+            return self._cached_or_raise(prompt, LLMTimeoutError(f'LLM call exceeded {self.timeout}s'))
+        except Exception as e:
+            self.breaker.record_failure()
+            return self._cached_or_raise(prompt, LLMUnavailableError(f'LLM call failed: {e}'))
+        
+        self.breaker.record_success(time.monotonic() - start)
+        self._remember(prompt, text)
+        return text
+    
+    def stream(self, prompt):
+        if not self.breaker.allow():
+            yield self._cached_or_raise(prompt, CircuitOpenError('LLM circuit is open'))
+            return
+        
+        start = time.monotonic()
+        deadline = start + self.stream_timeout
+        if not self._slots.acquire(timeout=self.timeout):
+            yield self._cached_or_raise(prompt, self._saturated_error())
+            return
+        
+        chunks = queue.Queue()
+        stop = threading.Event()
+        received = []
+        first_chunk = None
+        
+        def pump():
+            upstream = self.provider.stream(prompt)
+            try:
+                for chunk in upstream:
+                    if stop.is_set():
+                        break
+                    chunks.put(chunk)
+                chunks.put(self._DONE)
+            except Exception as e:
+                chunks.put(e)
+            finally:
+                # Ends the upstream request once nobody reads it any more
+                close = getattr(upstream, 'close', None)
+                if close is not None:
+                    close()
+        
+        self._submit(pump)
+        
+        try:
+            while True:
+                # Time to first chunk is bounded by the per-call timeout,
+                # the whole stream by the stream timeout
+                limit = deadline if received else min(deadline, start + self.timeout)
+                try:
+                    item = chunks.get(timeout=max(0, limit - time.monotonic()))
+                except queue.Empty:
+                    self.breaker.record_failure(timeout=True)
+                    if received:
+                        raise LLMTimeoutError('LLM stream exceeded its deadline')
+                    yield self._cached_or_raise(prompt, LLMTimeoutError(f'LLM stream exceeded {self.timeout}s'))
+                    return
+                
+                if item is self._DONE:
+                    break
+                if isinstance(item, Exception):
+                    self.breaker.record_failure()
+                    error = LLMUnavailableError(f'LLM stream failed: {item}')
+                    if received:
+                        raise error
+                    yield self._cached_or_raise(prompt, error)
+                    return
+                
+                if first_chunk is None:
+                    first_chunk = time.monotonic()
+                received.append(item)
+                yield item
+        except GeneratorExit:
+            self.breaker.release()
+            raise
+        finally:
+            stop.set()
+        
+        # A long answer is not a slow upstream: streams are judged by their time to first chunk
+        self.breaker.record_success((first_chunk or time.monotonic()) - start)
+        self._remember(prompt, ''.join(received))
+    
+    def stats(self):
+        """Breaker state and fallback counters"""
+        return {
+            'provider': self.name,
+            'timeout_seconds': self.timeout,
+            'fallback_cache_hits': self.cache_hits,
+            'saturated': self.saturated,
+            'breaker': self.breaker.snapshot()
+        }
+    
+    def _submit(self, func, *args):
+        """Run `func` on the pool in a slot the caller acquired; the slot is freed when `func` returns"""
+        def run():
+            try:
+                return func(*args)
+            finally:
+                self._slots.release()
+        
+        return self._executor.submit(run)
+    
+    def _saturated_error(self):
+        # Upstream was never called: the reservation ends without a verdict
+        self.breaker.release()
+        self.saturated += 1
+        return LLMUnavailableError(f'All {self.max_concurrency} LLM workers are busy')
+    
+    def _remember(self, prompt, text):
+        if not self.fallback_cache_size:
+            return
+        key = self._key(prompt)
+        with self._cache_lock:
+            self._cache[key] = text
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.fallback_cache_size:
+                self._cache.popitem(last=False)
+    
+    def _cached_or_raise(self, prompt, error):
+        with self._cache_lock:
+            text = self._cache.get(self._key(prompt))
+            if text is not None:
+                self.cache_hits += 1
+                return text
+        raise error
+    
+    @staticmethod
+    def _key(prompt):
+        return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+
+class CoalescingProvider(LLMProvider):
+    """Wrap a provider so concurrent identical prompts share one upstream call"""
+    
+    def __init__(self, provider):
+        self.provider = provider
+        self.name = provider.name
+        self.flights = SingleFlight()
+    
+    def generate(self, prompt):
+        return self.flights.do(self._key(prompt), lambda: self.provider.generate(prompt))
+    
+    def stream(self, prompt):
+        return self.flights.stream(self._key(prompt), lambda: self.provider.stream(prompt))
+    
+    def stats(self):
+        inner = self.provider.stats() if hasattr(self.provider, 'stats') else {'provider': self.name}
+        return {
+            **inner,
+            'coalescing': {
+                'executions': self.flights.executions,
+                'coalesced': self.flights.coalesced
+            }
+        }
+    
+    @staticmethod
+    def _key(prompt):
+        return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+
+def create_llm_provider(config):
+    """
+    Build the configured LLM provider
+    
+    Returns None when the selected backend is not configured (e.g. no
+    GEMINI_API_KEY), which callers treat as "AI disabled".
+    """
+    backend = config.get('LLM_PROVIDER', 'gemini')
+    
+    if backend == 'fake':
+        provider = FakeProvider(latency_ms=config.get('LLM_FAKE_LATENCY_MS', 0))
+    elif backend == 'gemini':
+        api_key = config.get('GEMINI_API_KEY')
+        if not api_key:
+            return None
+        provider = GeminiProvider(api_key, config.get('LLM_MODEL', 'gemini-pro'))
+    else:
+        raise ValueError(f"Unknown LLM_PROVIDER: {backend}")
+    
+    if config.get('METRICS_ENABLED'):
+        provider = MeteredProvider(provider)
+    
+    provider = GuardedProvider(
+        provider,
+        timeout=config.get('LLM_TIMEOUT_SECONDS', 20),
+        stream_timeout=config.get('LLM_STREAM_TIMEOUT_SECONDS', 60),
+        max_concurrency=config.get('LLM_MAX_CONCURRENCY', 8),
+        breaker=CircuitBreaker(
+            failure_threshold=config.get('LLM_BREAKER_FAILURE_THRESHOLD', 5),
+            slow_call_seconds=config.get('LLM_BREAKER_SLOW_CALL_SECONDS', 10),
+            reset_timeout=config.get('LLM_BREAKER_RESET_SECONDS', 30)
+        ),
+        fallback_cache_size=config.get('LLM_FALLBACK_CACHE_SIZE', 256)
+    )
+    
+    if config.get('LLM_COALESCE', True):
+        provider = CoalescingProvider(provider)
+    
+    return provider
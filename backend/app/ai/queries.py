@@ -0,0 +1,150 @@
+from datetime import datetime
+from bson import ObjectId
+from app.ai.gemini import PROMPT_MAX_DOMAINS, PROMPT_MAX_EVENT_TYPES
+from app.analytics.queries import range_match, peak_pipeline
+from app.events.queries import HAS_DOMAIN
+
+# Domains counted by the AI productivity score (substring match)
+PRODUCTIVE_DOMAINS = ['github.com', 'stackoverflow.com', 'docs.python.org']
+SOCIAL_DOMAINS = ['facebook.com', 'twitter.com', 'instagram.com', 'youtube.com']
+
+# Weekly report counts these as productive (regex on domain)
+WEEKLY_PRODUCTIVE_PATTERN = 'github|stackoverflow|docs'
+
+
+def day_bounds(target_date):
+    """Return (start, end) datetimes covering a calendar day"""
+    return (
+        datetime.combine(target_date, datetime.min.time()),
+        datetime.combine(target_date, datetime.max.time())
+    )
+
+
+def daily_stats_pipeline(user_id, start_time, end_time):
+    """
+    Aggregate a day's activity for the AI prompt in a single round trip
+    
+    Counting happens in MongoDB, so only a bounded summary (top domains,
+    type counts, hourly profile) is returned regardless of event volume.
+    """
+    return [
+        {
+            '$match': {
+                'userId': ObjectId(user_id),
+                'timestamp': {'$gte': start_time, '$lte': end_time}
+            }
+        },
+        {
+            '$facet': {
+                'total': [{'$count': 'count'}],
+                'top_domains': [
+                    {'$match': {'domain': HAS_DOMAIN}},
+                    {'$group': {'_id': '$domain', 'count': {'$sum': 1}}},
+                    {'$sort': {'count': -1, '_id': 1}},
+                    {'$limit': PROMPT_MAX_DOMAINS}
+                ],
+                'event_types': [
+                    {'$group': {'_id': '$type', 'count': {'$sum': 1}}},
+                    {'$sort': {'count': -1, '_id': 1}},
+                    {'$limit': PROMPT_MAX_EVENT_TYPES}
+                ],
+                'hourly_activity': [
+                    {'$group': {'_id': {'$hour': '$timestamp'}, 'count': {'$sum': 1}}},
+                    {'$sort': {'_id': 1}}
+                ]
+            }
+        }
+    ]
+
+
+def format_daily_stats(result):
+    """Shape the `$facet` result into the stats dict the prompts expect"""
+    result = result or {}
+    total = result.get('total', [])
+    
+    return {
+        'total_events': total[0]['count'] if total else 0,
+        'top_domains': [
+            {'domain': d['_id'], 'count': d['count']}
+            for d in result.get('top_domains', [])
+        ],
+        'event_types': [
+            {'type': t['_id'], 'count': t['count']}
+            for t in result.get('event_types', [])
+        ],
+        'hourly_activity': [
+            {'hour': h['_id'], 'count': h['count']}
+            for h in result.get('hourly_activity', [])
+        ]
+    }
+
+
+def score_productivity(domain_time):
+    """
+    Productivity score (0-100) from minutes per domain
+    
+    Returns:
+        tuple: (score, time_spent) where time_spent has total, productive
+        and social minutes
+    """
+    productive_time = sum(time for domain, time in domain_time.items() if any(pd in domain for pd in PRODUCTIVE_DOMAINS))
+    social_time = sum(time for domain, time in domain_time.items() if any(sd in domain for sd in SOCIAL_DOMAINS))
+    total_time = sum(domain_time.values())
+    
+    if total_time > 0:
+        productivity_score = ((productive_time / total_time) * 100) - ((social_time / total_time) * 25)
+        productivity_score = max(0, min(100, productivity_score))
+    else:
+        productivity_score = 0
+    
+    return productivity_score, {
+        'total_minutes': round(total_time, 2),
+        'productive_minutes': round(productive_time, 2),
+        'social_minutes': round(social_time, 2)
+    }
+
+
+def weekly_top_domains_pipeline(user_id, start_date, end_date):
+    return [
+        {'$match': {**range_match(user_id, start_date, end_date), 'domain': HAS_DOMAIN}},
+        {
+            '$group': {
+                '_id': '$domain',
+                'count': {'$sum': 1}
+            }
+        },
+        {'$sort': {'count': -1}},
+        {'$limit': 10}
+    ]
+
+
+def weekly_productive_query(user_id, start_date, end_date):
+    return {
+        **range_match(user_id, start_date, end_date),
+        'domain': {'$regex': WEEKLY_PRODUCTIVE_PATTERN}
+    }
+
+
+def weekly_peak_hour_pipeline(user_id, start_date, end_date):
+    return peak_pipeline(user_id, start_date, end_date, '$hour')
+
+
+def format_weekly_data(total_events, top_domains, productive_count, peak_hour_data):
+    """Weekly summary handed to the report prompt"""
+    productivity_score = (productive_count / total_events * 100) if total_events > 0 else 0
+    
+    return {
+        'total_events': total_events,
+        'top_domains': [
+            {'domain': d['_id'], 'count': d['count']}
+            for d in top_domains
+        ],
+        'productivity_score': round(productivity_score, 2),
+        'peak_hour': f"{peak_hour_data[0]['_id']}:00" if peak_hour_data else "N/A",
+        'peak_day': 'Weekday'  # Simplified
+    }
+
+
+def history_query(user_id):
+    """Insights for a user (sort by date descending)"""
+    return {'userId': ObjectId(user_id)}
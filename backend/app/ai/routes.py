@@ -1,13 +1,78 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from datetime import datetime, timedelta
-from bson import ObjectId
-from app import get_db
+from datetime import datetime
+import json
 from app.ai.gemini import get_gemini_ai
+from app.ai.classifier import get_domain_classifier
+from app.ai.queries import day_bounds, format_daily_stats, score_productivity, format_weekly_data
+from app.analytics.queries import date_range, compute_domain_time
 from app.models.insight import Insight
+from app.storage import get_storage
 
 ai_bp = Blueprint('ai', __name__)
 
+MAX_BATCH_DOMAINS = 5000
+
+
+def _get_daily_stats(storage, user_id, target_date):
+    """Aggregate a day's activity for the AI prompt; returns (start_time, stats)"""
+    start_time, end_time = day_bounds(target_date)
+    result = storage.events.daily_stats(user_id, start_time, end_time)
+    
+    return start_time, format_daily_stats(result)
+
+
+def _get_productivity_data(storage, user_id, days):
+    """Calculate time per domain and a productivity score for the last N days"""
+    start_date, end_date = date_range(days)
+    
+    # Calculate time spent (simplified version)
+    events = storage.events.activity(user_id, start_date, end_date)
+    
+    domain_time = compute_domain_time(events)
+    productivity_score, time_spent = score_productivity(domain_time)
+    
+    return domain_time, productivity_score, time_spent
+
+
+def _store_insight(storage, user_id, date, insight_type, content, confidence):
+    """Persist a generated insight"""
+    insight = Insight(
+        user_id=user_id,
+        date=date,
+        insights=[
+            Insight.create_insight_object(insight_type, content, confidence=confidence)
+        ]
+    )
+    
+    storage.insights.insert(insight.to_dict())
+
+
+def _sse(data, event=None):
+    """Format a single Server-Sent Events message"""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+
+def _sse_response(generator):
+    """Wrap a generator of SSE messages in a streaming response"""
+    return Response(
+        stream_with_context(generator),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
+def _parse_target_date():
+    """Read the ?date= parameter (default: today)"""
+    date_str = request.args.get('date')
+    if date_str:
+        return datetime.fromisoformat(date_str).date()
+    return datetime.utcnow().date()
+
 
 @ai_bp.route('/daily-summary', methods=['GET'])
 @jwt_required()
@@ -15,63 +80,80 @@ def generate_daily_summary():
     """Generate AI summary for a specific day"""
     try:
         current_user_id = get_jwt_identity()
-        db = get_db()
+        storage = get_storage('analytics', current_user_id)
         
-        # Get date parameter (default: today)
-        date_str = request.args.get('date')
-        if date_str:
-            target_date = datetime.fromisoformat(date_str).date()
-        else:
-            target_date = datetime.utcnow().date()
+        target_date = _parse_target_date()
+        start_time, daily_stats = _get_daily_stats(storage, current_user_id, target_date)
         
-        # Get events for that day
-        start_time = datetime.combine(target_date, datetime.min.time())
-        end_time = datetime.combine(target_date, datetime.max.time())
-        
-        events = list(db.events.find({
-            'userId': ObjectId(current_user_id),
-            'timestamp': {'$gte': start_time, '$lte': end_time}
-        }))
-        
-        if not events:
+        if not daily_stats['total_events']:
             return jsonify({
                 'summary': 'No activity recorded for this day.',
                 'date': target_date.isoformat()
             }), 200
         
-        # Prepare event data for AI
-        events_data = [
-            {
-                'type': e.get('type'),
-                'domain': e.get('domain'),
-                'timestamp': e.get('timestamp').isoformat() if e.get('timestamp') else None
-            }
-            for e in events
-        ]
-        
         # Generate summary using Gemini
         ai = get_gemini_ai()
-        summary = ai.generate_daily_summary(events_data)
+        summary = ai.generate_daily_summary(daily_stats)
         
         # Store insight
-        insight = Insight(
-            user_id=current_user_id,
-            date=start_time,
-            insights=[
-                Insight.create_insight_object('summary', summary, confidence=0.85)
-            ]
-        )
-        
-        db.insights.insert_one(insight.to_dict())
+        _store_insight(storage, current_user_id, start_time, 'summary', summary, 0.85)
         
         return jsonify({
             'summary': summary,
             'date': target_date.isoformat(),
-            'event_count': len(events)
+            'event_count': daily_stats['total_events']
         }), 200
+    
+    except Exception as e:
+        return jsonify({'error': 'Failed to generate summary', 'message': str(e)}), 500
+
+
+@ai_bp.route('/daily-summary/stream', methods=['GET'])
+@jwt_required()
+def stream_daily_summary():
+    """
+    Stream the AI daily summary over Server-Sent Events
+    
+    Emits a `meta` event, one `data` message per text chunk and a final
+    `done` event carrying the full summary once it has been stored.
+    """
+    try:
+        current_user_id = get_jwt_identity()
+        storage = get_storage('analytics', current_user_id)
         
+        target_date = _parse_target_date()
+        start_time, daily_stats = _get_daily_stats(storage, current_user_id, target_date)
+    
     except Exception as e:
         return jsonify({'error': 'Failed to generate summary', 'message': str(e)}), 500
+    
+    def generate():
+        meta = {'date': target_date.isoformat(), 'event_count': daily_stats['total_events']}
+        yield _sse(meta, event='meta')
+        
+        if not daily_stats['total_events']:
+            summary = 'No activity recorded for this day.'
+            yield _sse({'text': summary})
+            yield _sse({'summary': summary, **meta}, event='done')
+            return
+        
+        ai = get_gemini_ai()
+        chunks = []
+        
+        for chunk in ai.stream_daily_summary(daily_stats):
+            chunks.append(chunk)
+            yield _sse({'text': chunk})
+        
+        summary = ''.join(chunks)
+        
+        try:
+            _store_insight(storage, current_user_id, start_time, 'summary', summary, 0.85)
+        except Exception as e:
+            yield _sse({'error': 'Failed to store summary', 'message': str(e)}, event='error')
+        
+        yield _sse({'summary': summary, **meta}, event='done')
+    
+    return _sse_response(generate())
 
 
 @ai_bp.route('/productivity-insights', methods=['GET'])
@@ -80,49 +162,10 @@ def generate_productivity_insights():
     """Generate AI insights about productivity"""
     try:
         current_user_id = get_jwt_identity()
-        db = get_db()
+        storage = get_storage('analytics', current_user_id)
         
-        # Get date range
         days = int(request.args.get('days', 7))
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=days)
-        
-        user_id = ObjectId(current_user_id)
-        
-        # Calculate time spent (simplified version)
-        events = list(db.events.find({
-            'userId': user_id,
-            'type': {'$in': ['TAB_ACTIVATED', 'TAB_UPDATED']},
-            'timestamp': {'$gte': start_date, '$lte': end_date},
-            'domain': {'$ne': None}
-        }).sort('timestamp', 1))
-        
-        # Calculate time per domain
-        domain_time = {}
-        last_event = None
-        
-        for event in events:
-            if last_event:
-                time_diff = (event['timestamp'] - last_event['timestamp']).total_seconds() / 60
-                if time_diff < 30:
-                    domain = last_event.get('domain')
-                    if domain:
-                        domain_time[domain] = domain_time.get(domain, 0) + time_diff
-            last_event = event
-        
-        # Calculate productivity score (simplified)
-        productive_domains = ['github.com', 'stackoverflow.com', 'docs.python.org']
-        social_domains = ['facebook.com', 'twitter.com', 'instagram.com', 'youtube.com']
-        
-        productive_time = sum(time for domain, time in domain_time.items() if any(pd in domain for pd in productive_domains))
-        social_time = sum(time for domain, time in domain_time.items() if any(sd in domain for sd in social_domains))
-        total_time = sum(domain_time.values())
-        
-        if total_time > 0:
-            productivity_score = ((productive_time / total_time) * 100) - ((social_time / total_time) * 25)
-            productivity_score = max(0, min(100, productivity_score))
-        else:
-            productivity_score = 0
+        domain_time, productivity_score, time_spent = _get_productivity_data(storage, current_user_id, days)
         
         # Generate insights using Gemini
         ai = get_gemini_ai()
@@ -131,15 +174,55 @@ def generate_productivity_insights():
         return jsonify({
             'insights': insights_text,
             'productivity_score': round(productivity_score, 2),
-            'time_spent': {
-                'total_minutes': round(total_time, 2),
-                'productive_minutes': round(productive_time, 2),
-                'social_minutes': round(social_time, 2)
-            }
+            'time_spent': time_spent
         }), 200
+    
+    except Exception as e:
+        return jsonify({'error': 'Failed to generate insights', 'message': str(e)}), 500
+
+
+@ai_bp.route('/productivity-insights/stream', methods=['GET'])
+@jwt_required()
+def stream_productivity_insights():
+    """
+    Stream AI productivity insights over Server-Sent Events
+    
+    The final text is stored in `insights` before the `done` event is sent.
+    """
+    try:
+        current_user_id = get_jwt_identity()
+        storage = get_storage('analytics', current_user_id)
         
+        days = int(request.args.get('days', 7))
+        domain_time, productivity_score, time_spent = _get_productivity_data(storage, current_user_id, days)
+    
     except Exception as e:
         return jsonify({'error': 'Failed to generate insights', 'message': str(e)}), 500
+    
+    def generate():
+        meta = {
+            'productivity_score': round(productivity_score, 2),
+            'time_spent': time_spent
+        }
+        yield _sse(meta, event='meta')
+        
+        ai = get_gemini_ai()
+        chunks = []
+        
+        for chunk in ai.stream_productivity_insights(domain_time, productivity_score):
+            chunks.append(chunk)
+            yield _sse({'text': chunk})
+        
+        insights_text = ''.join(chunks)
+        
+        try:
+            _store_insight(storage, current_user_id, datetime.utcnow(), 'recommendation', insights_text, 0.8)
+        except Exception as e:
+            yield _sse({'error': 'Failed to store insights', 'message': str(e)}, event='error')
+        
+        yield _sse({'insights': insights_text, **meta}, event='done')
+    
+    return _sse_response(generate())
 
 
 @ai_bp.route('/categorize', methods=['POST'])
@@ -162,7 +245,36 @@ def categorize_domain():
             'domain': domain,
             'category': category
         }), 200
+    
+    except Exception as e:
+        return jsonify({'error': 'Failed to categorize', 'message': str(e)}), 500
+
+
+@ai_bp.route('/categorize/batch', methods=['POST'])
+@jwt_required()
+def categorize_domains():
+    """Categorize many domains at once with the rule-based classifier"""
+    try:
+        data = request.json
+        
+        if not data or not isinstance(data.get('domains'), list):
+            return jsonify({'error': 'Domains must be an array'}), 400
+        
+        domains = data['domains']
+        if len(domains) > MAX_BATCH_DOMAINS:
+            return jsonify({'error': f'At most {MAX_BATCH_DOMAINS} domains per request'}), 400
+        if not all(isinstance(domain, str) and domain for domain in domains):
+            return jsonify({'error': 'Each domain must be a non-empty string'}), 400
+        
+        categories = get_domain_classifier().classify_many(domains)
         
+        return jsonify({
+            'categories': [
+                {'domain': domain, 'category': category}
+                for domain, category in zip(domains, categories)
+            ]
+        }), 200
+    
     except Exception as e:
         return jsonify({'error': 'Failed to categorize', 'message': str(e)}), 500
 
@@ -173,97 +285,25 @@ def generate_weekly_report():
     """Generate comprehensive weekly report"""
     try:
         current_user_id = get_jwt_identity()
-        db = get_db()
+        storage = get_storage('analytics', current_user_id)
         
         # Get last 7 days
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=7)
-        
-        user_id = ObjectId(current_user_id)
+        start_date, end_date = date_range(7)
         
         # Gather analytics data
-        total_events = db.events.count_documents({
-            'userId': user_id,
-            'timestamp': {'$gte': start_date, '$lte': end_date}
-        })
-        
-        # Top domains
-        domain_pipeline = [
-            {
-                '$match': {
-                    'userId': user_id,
-                    'timestamp': {'$gte': start_date, '$lte': end_date},
-                    'domain': {'$ne': None}
-                }
-            },
-            {
-                '$group': {
-                    '_id': '$domain',
-                    'count': {'$sum': 1}
-                }
-            },
-            {'$sort': {'count': -1}},
-            {'$limit': 10}
-        ]
-        
-        top_domains = [
-            {'domain': d['_id'], 'count': d['count']}
-            for d in db.events.aggregate(domain_pipeline)
-        ]
-        
-        # Calculate productivity score (simplified)
-        productive_count = db.events.count_documents({
-            'userId': user_id,
-            'timestamp': {'$gte': start_date, '$lte': end_date},
-            'domain': {'$regex': 'github|stackoverflow|docs'}
-        })
-        
-        productivity_score = (productive_count / total_events * 100) if total_events > 0 else 0
-        
-        # Peak activity
-        hour_pipeline = [
-            {
-                '$match': {
-                    'userId': user_id,
-                    'timestamp': {'$gte': start_date, '$lte': end_date}
-                }
-            },
-            {
-                '$group': {
-                    '_id': {'$hour': '$timestamp'},
-                    'count': {'$sum': 1}
-                }
-            },
-            {'$sort': {'count': -1}},
-            {'$limit': 1}
-        ]
-        
-        peak_hour_data = list(db.events.aggregate(hour_pipeline))
-        peak_hour = f"{peak_hour_data[0]['_id']}:00" if peak_hour_data else "N/A"
+        total_events, top_domains, productive_count, peak_hour_data = storage.events.weekly_stats(
+            current_user_id, start_date, end_date
+        )
         
         # Prepare data for AI
-        weekly_data = {
-            'total_events': total_events,
-            'top_domains': top_domains,
-            'productivity_score': round(productivity_score, 2),
-            'peak_hour': peak_hour,
-            'peak_day': 'Weekday'  # Simplified
-        }
+        weekly_data = format_weekly_data(total_events, top_domains, productive_count, peak_hour_data)
         
         # Generate report using Gemini
         ai = get_gemini_ai()
         report = ai.generate_weekly_report(weekly_data)
         
         # Store insight
-        insight = Insight(
-            user_id=current_user_id,
-            date=start_date,
-            insights=[
-                Insight.create_insight_object('weekly_report', report, confidence=0.9)
-            ]
-        )
-        
-        db.insights.insert_one(insight.to_dict())
+        _store_insight(storage, current_user_id, start_date, 'weekly_report', report, 0.9)
         
         return jsonify({
             'report': report,
@@ -273,24 +313,40 @@ def generate_weekly_report():
                 'end': end_date.isoformat()
             }
         }), 200
-        
+    
     except Exception as e:
         return jsonify({'error': 'Failed to generate report', 'message': str(e)}), 500
 
 
+@ai_bp.route('/status', methods=['GET'])
+@jwt_required()
+def get_ai_status():
+    """Get LLM provider, circuit breaker and coalescing state"""
+    try:
+        ai = get_gemini_ai()
+        
+        if not ai.is_configured():
+            return jsonify({'configured': False}), 200
+        
+        stats = ai.provider.stats() if hasattr(ai.provider, 'stats') else {'provider': ai.provider.name}
+        
+        return jsonify({'configured': True, **stats}), 200
+    
+    except Exception as e:
+        return jsonify({'error': 'Failed to get AI status', 'message': str(e)}), 500
+
+
 @ai_bp.route('/insights/history', methods=['GET'])
 @jwt_required()
 def get_insights_history():
     """Get historical insights"""
     try:
         current_user_id = get_jwt_identity()
-        db = get_db()
+        storage = get_storage('analytics', current_user_id)
         
         limit = int(request.args.get('limit', 10))
         
-        insights = list(db.insights.find({
-            'userId': ObjectId(current_user_id)
-        }).sort('date', -1).limit(limit))
+        insights = storage.insights.history(current_user_id, limit)
         
         insights_json = [Insight.from_dict(i).to_json() for i in insights]
         
@@ -298,6 +354,6 @@ def get_insights_history():
             'insights': insights_json,
             'count': len(insights_json)
         }), 200
-        
+    
     except Exception as e:
         return jsonify({'error': 'Failed to get insights', 'message': str(e)}), 500
\ No newline at end of file
@@ -0,0 +1,166 @@
+import threading
+
+
+class _Call:
+    """An in-flight call shared by every caller with the same key"""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _SharedStream:
+    """
+    An in-flight stream shared by every caller with the same key
+    
+    Whichever caller runs out of chunks first pulls the next one from
+    upstream (one at a time) and publishes it to the rest, so any of them
+    can go away without cutting the stream short for the others.
+    """
+    
+    def __init__(self, fn):
+        self.cond = threading.Condition()
+        self.fn = fn
+        self.upstream = None
+        self.chunks = []
+        self.callers = 1
+        self.fetching = False
+        self.finished = False
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls into a single execution
+    
+    The first caller for a key runs the function; callers that arrive while
+    it is in flight block and receive the same result (or exception).
+    Coalescing is per process, so each gunicorn worker makes at most one
+    upstream call per key at a time.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._streams = {}
+        self.executions = 0
+        self.coalesced = 0
+    
+    def do(self, key, fn):
+        """Run fn() once for all concurrent callers with the same key"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+                leader = True
+        
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+    
+    def stream(self, key, fn):
+        """
+        Share one upstream stream between concurrent callers
+        
+        Every caller replays the chunks published so far; the first to need
+        a new one pulls it from fn()'s iterator for all of them. Nothing is
+        registered until the stream is first iterated, so a stream that is
+        never consumed cannot hold its key. Upstream is closed early only
+        once every caller has gone away.
+        """
+        with self._lock:
+            shared = self._streams.get(key)
+            if shared is not None:
+                self.coalesced += 1
+                with shared.cond:
+                    shared.callers += 1
+            else:
+                shared = self._streams[key] = _SharedStream(fn)
+                self.executions += 1
+        
+        index = 0
+        try:
+            while True:
+                with shared.cond:
+                    while index >= len(shared.chunks) and not shared.finished and shared.fetching:
+                        shared.cond.wait()
+                    chunks = shared.chunks[index:]
+                    finished = shared.finished
+                    fetch = not chunks and not finished
+                    if fetch:
+                        shared.fetching = True
+                
+                if fetch:
+                    self._fetch(key, shared)
+                    continue
+                
+                for chunk in chunks:
+                    yield chunk
+                index += len(chunks)
+                
+                if finished:
+                    if shared.error is not None:
+                        raise shared.error
+                    return
+        finally:
+            self._leave(key, shared)
+    
+    def _fetch(self, key, shared):
+        """Pull the next chunk from upstream, ending the stream on exhaustion or error"""
+        try:
+            if shared.upstream is None:
+                shared.upstream = iter(shared.fn())
+            chunk = next(shared.upstream)
+        except StopIteration:
+            self._finish(key, shared)
+        except Exception as e:
+            self._finish(key, shared, e)
+        else:
+            with shared.cond:
+                shared.chunks.append(chunk)
+        finally:
+            with shared.cond:
+                shared.fetching = False
+                shared.cond.notify_all()
+    
+    def _finish(self, key, shared, error=None):
+        with self._lock:
+            if self._streams.get(key) is shared:
+                del self._streams[key]
+        with shared.cond:
+            shared.error = error
+            shared.finished = True
+            shared.cond.notify_all()
+    
+    def _leave(self, key, shared):
+        """A caller is done with the stream; the last one to go closes an unfinished upstream"""
+        with self._lock:
+            with shared.cond:
+                shared.callers -= 1
+                abandoned = shared.callers == 0 and not shared.finished
+                if abandoned:
+                    shared.finished = True
+                    if self._streams.get(key) is shared:
+                        del self._streams[key]
+        
+        close = getattr(shared.upstream, 'close', None)
+        if abandoned and close is not None:
+            close()
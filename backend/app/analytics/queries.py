@@ -0,0 +1,332 @@
+from datetime import datetime, timedelta
+from bson import ObjectId
+from app.events.queries import HAS_DOMAIN, expired_query
+
+# Events used to approximate time spent (tab switches and navigations)
+ACTIVITY_EVENT_TYPES = ['TAB_ACTIVATED', 'TAB_UPDATED']
+
+# Gaps longer than this are treated as idle time
+MAX_ACTIVE_GAP_MINUTES = 30
+
+# Simple domain categorization
+PRODUCTIVE_DOMAINS = [
+    'github.com', 'stackoverflow.com', 'docs.python.org',
+    'developer.mozilla.org', 'aws.amazon.com', 'cloud.google.com',
+    'notion.so', 'trello.com', 'asana.com', 'linkedin.com'
+]
+
+SOCIAL_DOMAINS = [
+    'facebook.com', 'twitter.com', 'instagram.com', 'tiktok.com',
+    'reddit.com', 'youtube.com', 'twitch.tv'
+]
+
+# Day of week mapping ($dayOfWeek is 1 = Sunday)
+DAYS_MAP = {1: 'Sunday', 2: 'Monday', 3: 'Tuesday', 4: 'Wednesday',
+            5: 'Thursday', 6: 'Friday', 7: 'Saturday'}
+
+
+def date_range(days):
+    """Return (start, end) covering the last N days"""
+    end_date = datetime.utcnow()
+    start_date = end_date - timedelta(days=days)
+    return start_date, end_date
+
+
+def range_match(user_id, start_date, end_date):
+    """Base filter: one user's events within a time range"""
+    return {
+        'userId': ObjectId(user_id),
+        'timestamp': {'$gte': start_date, '$lte': end_date}
+    }
+
+
+def dashboard_pipelines(user_id, start_date, end_date):
+    """Aggregations behind /analytics/dashboard, keyed by response section"""
+    match = range_match(user_id, start_date, end_date)
+    
+    return {
+        # Events by day
+        'daily_events': [
+            {'$match': match},
+            {
+                '$group': {
+                    '_id': {
+                        '$dateToString': {
+                            'format': '%Y-%m-%d',
+                            'date': '$timestamp'
+                        }
+                    },
+                    'count': {'$sum': 1}
+                }
+            },
+            {'$sort': {'_id': 1}}
+        ],
+        # Top domains
+        'top_domains': [
+            {'$match': {**match, 'domain': HAS_DOMAIN}},
+            {
+                '$group': {
+                    '_id': '$domain',
+                    'count': {'$sum': 1}
+                }
+            },
+            {'$sort': {'count': -1}},
+            {'$limit': 10}
+        ],
+        # Event types distribution
+        'event_types': [
+            {'$match': match},
+            {
+                '$group': {
+                    '_id': '$type',
+                    'count': {'$sum': 1}
+                }
+            },
+            {'$sort': {'count': -1}}
+        ],
+        # Hourly activity (heatmap data)
+        'hourly_activity': [
+            {'$match': match},
+            {
+                '$group': {
+                    '_id': {'$hour': '$timestamp'},
+                    'count': {'$sum': 1}
+                }
+            },
+            {'$sort': {'_id': 1}}
+        ]
+    }
+
+
+def format_dashboard(start_date, end_date, days, total_events, results):
+    """Shape dashboard aggregation results into the API response"""
+    return {
+        'period': {
+            'start': start_date.isoformat(),
+            'end': end_date.isoformat(),
+            'days': days
+        },
+        'total_events': total_events,
+        'daily_events': [
+            {'date': d['_id'], 'count': d['count']}
+            for d in results['daily_events']
+        ],
+        'top_domains': [
+            {'domain': d['_id'], 'count': d['count']}
+            for d in results['top_domains']
+        ],
+        'event_types': [
+            {'type': t['_id'], 'count': t['count']}
+            for t in results['event_types']
+        ],
+        'hourly_activity': [
+            {'hour': h['_id'], 'count': h['count']}
+            for h in results['hourly_activity']
+        ]
+    }
+
+
+def time_spent_query(user_id, start_date, end_date, skip=None):
+    """
+    Tab activity events used for the time-spent approximation (sort by timestamp)
+    
+    `skip` leaves out events already folded into sessions or archived, as in partials_pipeline().
+    """
+    query = {
+        **range_match(user_id, start_date, end_date),
+        'type': {'$in': ACTIVITY_EVENT_TYPES},
+        'domain': HAS_DOMAIN
+    }
+    if skip is not None:
+        query['$nor'] = [expired_query(user_id, *skip)]
+    return query
+
+
+# Only these fields are needed to compute time spent
+TIME_SPENT_PROJECTION = {'timestamp': 1, 'domain': 1, '_id': 0}
+
+
+def compute_domain_time(events):
+    """
+    Attribute the gap between consecutive tab events to the earlier domain
+    
+    Args:
+        events: Iterable of dicts with timestamp and domain, sorted by timestamp.
+            A dict with `minutes` is a domain's time in a compacted session
+            (app/retention.py), already attributed.
+    
+    Returns:
+        dict: {domain: minutes}
+    """
+    domain_time = {}
+    last_event = None
+    
+    for event in events:
+        if 'minutes' in event:
+            domain_time[event['domain']] = domain_time.get(event['domain'], 0) + event['minutes']
+            last_event = None
+            continue
+        
+        if last_event:
+            # Calculate time difference (in minutes)
+            time_diff = (event['timestamp'] - last_event['timestamp']).total_seconds() / 60
+            
+            # Only count if less than 30 minutes (assume user was active)
+            if time_diff < MAX_ACTIVE_GAP_MINUTES:
+                domain = last_event.get('domain')
+                if domain:
+                    domain_time[domain] = domain_time.get(domain, 0) + time_diff
+        
+        last_event = event
+    
+    return domain_time
+
+
+def format_time_spent(domain_time):
+    """Top 20 domains by time with the overall total"""
+    time_spent = [
+        {
+            'domain': domain,
+            'minutes': round(minutes, 2),
+            'hours': round(minutes / 60, 2)
+        }
+        for domain, minutes in domain_time.items()
+    ]
+    
+    time_spent.sort(key=lambda x: x['minutes'], reverse=True)
+    
+    return {
+        'time_spent': time_spent[:20],  # Top 20 domains
+        'total_minutes': round(sum(domain_time.values()), 2)
+    }
+
+
+def productivity_queries(user_id, start_date, end_date):
+    """Count filters for (productive, social, total) events"""
+    match = range_match(user_id, start_date, end_date)
+    
+    return (
+        {**match, 'domain': {'$in': PRODUCTIVE_DOMAINS}},
+        {**match, 'domain': {'$in': SOCIAL_DOMAINS}},
+        {**match, 'domain': HAS_DOMAIN}
+    )
+
+
+def format_productivity(productive_count, social_count, total_count):
+    """Productivity score (0-100) and category breakdown"""
+    if total_count == 0:
+        score = 0
+    else:
+        productive_ratio = productive_count / total_count
+        social_ratio = social_count / total_count
+        score = round((productive_ratio * 100) - (social_ratio * 25), 2)
+        score = max(0, min(100, score))  # Clamp between 0-100
+    
+    return {
+        'score': score,
+        'productive_events': productive_count,
+        'social_events': social_count,
+        'total_events': total_count,
+        'productive_percentage': round((productive_count / total_count * 100), 2) if total_count > 0 else 0,
+        'social_percentage': round((social_count / total_count * 100), 2) if total_count > 0 else 0
+    }
+
+
+def peak_pipeline(user_id, start_date, end_date, group_by):
+    """Most active bucket for a date operator such as '$hour' or '$dayOfWeek'"""
+    return [
+        {'$match': range_match(user_id, start_date, end_date)},
+        {
+            '$group': {
+                '_id': {group_by: '$timestamp'},
+                'count': {'$sum': 1}
+            }
+        },
+        {'$sort': {'count': -1}},
+        {'$limit': 1}
+    ]
+
+
+def partials_pipeline(user_id, start_date, end_date=None, skip=None):
+    """
+    A range's counts by day, hour, weekday, type and domain, in one round trip
+    
+    The hot tier's half of an archive-federated query (app/archive.py):
+    these add up with the archive's counts before any top-N cut. `skip`
+    (expired_query()'s arguments after the user) leaves out events
+    already folded into rollups or archived.
+    """
+    timestamp = {}
+    if start_date is not None:
+        timestamp['$gte'] = start_date
+    if end_date is not None:
+        timestamp['$lte'] = end_date
+    
+    match = {'userId': ObjectId(user_id)}
+    if timestamp:
+        match['timestamp'] = timestamp
+    if skip is not None:
+        match['$nor'] = [expired_query(user_id, *skip)]
+    
+    return [
+        {'$match': match},
+        {
+            '$facet': {
+                'days': [{'$group': {'_id': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$timestamp'}},
+                                     'count': {'$sum': 1}}}],
+                'hours': [{'$group': {'_id': {'$hour': '$timestamp'}, 'count': {'$sum': 1}}}],
+                'weekdays': [{'$group': {'_id': {'$dayOfWeek': '$timestamp'}, 'count': {'$sum': 1}}}],
+                'types': [{'$group': {'_id': '$type', 'count': {'$sum': 1}}}],
+                'domains': [
+                    {'$match': {'domain': HAS_DOMAIN}},
+                    {'$group': {'_id': '$domain', 'count': {'$sum': 1}, 'lastVisit': {'$max': '$timestamp'}}}
+                ]
+            }
+        }
+    ]
+
+
+def rollup_partials_pipeline(user_id, start_date, end_date=None):
+    """
+    partials_pipeline() over hourly rollups (app/retention.py): each hour's
+    count goes to its day, hour and weekday, its types and domains add up
+    """
+    query = {'userId': ObjectId(user_id)}
+    if start_date is not None or end_date is not None:
+        query['hour'] = {}
+        if start_date is not None:
+            query['hour']['$gte'] = start_date
+        if end_date is not None:
+            query['hour']['$lte'] = end_date
+    
+    return [
+        {'$match': query},
+        {
+            '$facet': {
+                'days': [{'$group': {'_id': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$hour'}},
+                                     'count': {'$sum': '$count'}}}],
+                'hours': [{'$group': {'_id': {'$hour': '$hour'}, 'count': {'$sum': '$count'}}}],
+                'weekdays': [{'$group': {'_id': {'$dayOfWeek': '$hour'}, 'count': {'$sum': '$count'}}}],
+                'types': [
+                    {'$unwind': '$types'},
+                    {'$group': {'_id': '$types._id', 'count': {'$sum': '$types.count'}}}
+                ],
+                'domains': [
+                    {'$unwind': '$domains'},
+                    {'$group': {'_id': '$domains._id', 'count': {'$sum': '$domains.count'},
+                                'lastVisit': {'$max': '$domains.lastVisit'}}}
+                ]
+            }
+        }
+    ]
+
+
+def format_patterns(most_active_hour, most_active_day):
+    return {
+        'most_active_hour': most_active_hour[0]['_id'] if most_active_hour else None,
+        'most_active_day': DAYS_MAP.get(most_active_day[0]['_id']) if most_active_day else None,
+        'patterns': {
+            'peak_hour': most_active_hour[0] if most_active_hour else None,
+            'peak_day': most_active_day[0] if most_active_day else None
+        }
+    }
@@ -0,0 +1,389 @@
+import json
+import os
+import re
+import threading
+from collections import Counter
+from datetime import datetime
+from bson import ObjectId, json_util
+from app.ai.gemini import PROMPT_MAX_DOMAINS, PROMPT_MAX_EVENT_TYPES
+from app.ai.queries import WEEKLY_PRODUCTIVE_PATTERN
+from app.analytics.queries import ACTIVITY_EVENT_TYPES, PRODUCTIVE_DOMAINS, SOCIAL_DOMAINS
+from app.events.queries import expired_query
+from app.models.event import expand_document
+
+# Optional: the archive is only available with pyarrow installed
+try:
+    import pyarrow
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pyarrow = None
+
+# Per-user file recording how far the archive reaches (events before it are cold)
+MANIFEST = 'manifest.json'
+
+# Grouped counts a range is reduced to on each tier; they add up across tiers
+PARTIAL_FIELDS = ('days', 'hours', 'weekdays', 'types', 'domains')
+
+
+def month_key(timestamp):
+    return timestamp.strftime('%Y-%m')
+
+
+class Partials:
+    """
+    A range's events reduced to mergeable counts
+    
+    Both tiers produce the same facet-shaped rows (`partials()` on an
+    event repository, `EventArchive.partials` on the archive); adding them
+    gives exact counts for the whole range. Top-N lists are cut only after
+    merging, so a domain that is second on each tier is still ranked right.
+    """
+    
+    def __init__(self, facets=None):
+        self.counts = {field: Counter() for field in PARTIAL_FIELDS}
+        self.last_visit = {}
+        if facets:
+            self.add(facets)
+    
+    def add(self, facets):
+        for field in PARTIAL_FIELDS:
+            for row in facets.get(field, []):
+                self.counts[field][row['_id']] += row['count']
+        for row in facets.get('domains', []):
+            if row.get('lastVisit') and (row['_id'] not in self.last_visit or row['lastVisit'] > self.last_visit[row['_id']]):
+                self.last_visit[row['_id']] = row['lastVisit']
+        return self
+    
+    @property
+    def total(self):
+        return sum(self.counts['days'].values())
+    
+    def rows(self, field, limit=None, by_key=False):
+        """{_id, count} rows, most frequent first (ties by key) or in key order"""
+        order = lambda value: (value is not None, value)  # ties by value, nulls first, as SQLite and MongoDB sort
+        key = (lambda item: order(item[0])) if by_key else (lambda item: (-item[1], order(item[0])))
+        items = sorted(self.counts[field].items(), key=key)
+        return [{'_id': value, 'count': count} for value, count in items[:limit]]
+    
+    def dashboard(self):
+        return self.total, {
+            'daily_events': self.rows('days', by_key=True),
+            'top_domains': self.rows('domains', 10),
+            'event_types': self.rows('types'),
+            'hourly_activity': self.rows('hours', by_key=True)
+        }
+    
+    def productivity_counts(self):
+        domains = self.counts['domains']
+        return (
+            sum(domains[domain] for domain in PRODUCTIVE_DOMAINS),
+            sum(domains[domain] for domain in SOCIAL_DOMAINS),
+            sum(domains.values())
+        )
+    
+    def peaks(self):
+        return self.rows('hours', 1), self.rows('weekdays', 1)
+    
+    def daily_stats(self):
+        total = self.total
+        return {
+            'total': [{'count': total}] if total else [],
+            'top_domains': self.rows('domains', PROMPT_MAX_DOMAINS),
+            'event_types': self.rows('types', PROMPT_MAX_EVENT_TYPES),
+            'hourly_activity': self.rows('hours', by_key=True)
+        }
+    
+    def weekly_stats(self):
+        pattern = re.compile(WEEKLY_PRODUCTIVE_PATTERN)
+        productive = sum(count for domain, count in self.counts['domains'].items() if pattern.search(domain))
+        return self.total, self.rows('domains', 10), productive, self.rows('hours', 1)
+    
+    def top_domains(self, limit):
+        return [{**row, 'lastVisit': self.last_visit.get(row['_id'])} for row in self.rows('domains', limit or None)]
+    
+    def type_stats(self):
+        return self.total, self.rows('types')
+
+
+class EventArchive:
+    """
+    Cold events as Parquet files: <directory>/<user id>/<YYYY-MM>.parquet
+    
+    Files hold a month of one user's events sorted by time, compressed
+    column by column, so an analytics scan reads only the timestamp, type
+    and domain columns of the months it covers. A user's manifest holds
+    the watermark and when the run that set it started: events before the
+    watermark stored before that run are served from here, and all other
+    events from the hot tier, including ones synced late below the
+    watermark. A range is never counted twice, even while an archive run
+    is between writing files and deleting the hot copies. Writes go to a
+    temporary file that replaces the old one.
+    """
+    
+    def __init__(self, directory, compression='zstd'):
+        if pyarrow is None:
+            raise RuntimeError('The event archive needs pyarrow (pip install pyarrow)')
+        
+        self.directory = directory
+        self.compression = compression
+        self.schema = pyarrow.schema([
+            ('id', pyarrow.string()),
+            ('timestamp', pyarrow.timestamp('ms')),
+            ('type', pyarrow.string()),
+            ('domain', pyarrow.string()),
+            ('url', pyarrow.string()),
+            ('title', pyarrow.string()),
+            ('payload', pyarrow.string())
+        ])
+        self._cutoffs = {}  # manifest path -> (manifest mtime, (watermark, archived until))
+        self._lock = threading.Lock()
+    
+    def user_dir(self, user_id):
+        # ObjectId() rejects anything that is not a user id, so it is safe in a path
+        return os.path.join(self.directory, str(ObjectId(user_id)))
+    
+    def _replace(self, path, write):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f'{path}.{os.getpid()}.tmp'
+        write(temporary)
+        with open(temporary, 'rb+') as f:
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+    
+    def cutoff(self, user_id):
+        """
+        (watermark, archived until) from the user's manifest, or None when nothing is archived
+        
+        The archive holds the events before the watermark that were stored
+        before `archived until`; without it (a manifest written by hand or
+        by an older run) it holds all of them.
+        """
+        path = os.path.join(self.user_dir(user_id), MANIFEST)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        
+        cached = self._cutoffs.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        
+        with open(path) as f:
+            manifest = json.load(f)
+        until = manifest.get('archived_until')
+        cutoff = (datetime.fromisoformat(manifest['archived_before']), datetime.fromisoformat(until) if until else None)
+        with self._lock:
+            self._cutoffs[path] = (mtime, cutoff)
+        return cutoff
+    
+    def watermark(self, user_id):
+        """Datetime before which the user's events are archived (None: nothing archived)"""
+        cutoff = self.cutoff(user_id)
+        return cutoff[0] if cutoff else None
+    
+    def set_watermark(self, user_id, watermark, until=None):
+        """
+        Move the watermark forward (never back: older data is already archived)
+        
+        `until` is when the run that archived up to it started: events
+        stored since stay hot even below the watermark.
+        """
+        current = self.watermark(user_id)
+        if current is not None and current > watermark:
+            return current
+        
+        def write(path):
+            manifest = {'archived_before': watermark.isoformat(), 'updated_at': datetime.utcnow().isoformat()}
+            if until is not None:
+                manifest['archived_until'] = until.isoformat()
+            with open(path, 'w') as f:
+                json.dump(manifest, f)
+        
+        self._replace(os.path.join(self.user_dir(user_id), MANIFEST), write)
+        return watermark
+    
+    def months(self, user_id):
+        try:
+            names = os.listdir(self.user_dir(user_id))
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-len('.parquet')] for name in names if name.endswith('.parquet'))
+    
+    def write_month(self, user_id, month, documents):
+        """
+        Add events to a month's file, skipping ones already in it
+        
+        Files keep the full payload whichever layout the events were stored
+        in; Parquet's column encoding already folds the repeats away.
+        
+        Returns:
+            int: events added
+        """
+        path = os.path.join(self.user_dir(user_id), f'{month}.parquet')
+        existing = pq.read_table(path, schema=self.schema) if os.path.exists(path) else self.schema.empty_table()
+        archived = set(existing['id'].to_pylist())
+        
+        rows = [
+            {
+                'id': str(document['_id']),
+                'timestamp': document['timestamp'],
+                'type': document.get('type'),
+                'domain': document.get('domain'),
+                'url': document.get('url'),
+                'title': document.get('title'),
+                'payload': json_util.dumps(document.get('payload'))
+            }
+            for document in map(expand_document, documents)
+            if str(document['_id']) not in archived
+        ]
+        if not rows:
+            return 0
+        
+        table = pyarrow.concat_tables([existing, pyarrow.Table.from_pylist(rows, schema=self.schema)])
+        table = table.sort_by('timestamp')
+        self._replace(path, lambda temporary: pq.write_table(table, temporary, compression=self.compression))
+        return len(rows)
+    
+    def _table(self, user_id, start_date, end_date, before, until, columns, filters=()):
+        """Archived events with start_date <= timestamp <= end_date and timestamp < before, stored before `until`"""
+        filters = [('timestamp', '<', before), *filters]
+        if until is not None:
+            # Hex ObjectIds sort by their creation second
+            filters.append(('id', '<', str(ObjectId.from_datetime(until))))
+        if start_date is not None:
+            filters.append(('timestamp', '>=', start_date))
+        if end_date is not None:
+            filters.append(('timestamp', '<=', end_date))
+        
+        first = month_key(start_date) if start_date is not None else ''
+        last = month_key(min(end_date, before) if end_date is not None else before)
+        tables = [
+            pq.read_table(os.path.join(self.user_dir(user_id), f'{month}.parquet'),
+                          columns=columns, filters=filters, schema=self.schema)
+            for month in self.months(user_id)
+            if first <= month <= last
+        ]
+        return pyarrow.concat_tables(tables) if tables else self.schema.empty_table().select(columns)
+    
+    def partials(self, user_id, start_date, end_date, before, until=None):
+        """The range's archived events as facet rows (see Partials)"""
+        table = self._table(user_id, start_date, end_date, before, until, ['timestamp', 'type', 'domain'])
+        timestamps = table['timestamp']
+        
+        def counts(values):
+            return [{'_id': row['values'], 'count': row['counts']} for row in pc.value_counts(values).to_pylist()]
+        
+        with_domain = table.filter(pc.is_valid(table['domain']))
+        domains = with_domain.group_by('domain').aggregate([('timestamp', 'count'), ('timestamp', 'max')])
+        
+        return {
+            'days': counts(pc.strftime(timestamps, format='%Y-%m-%d')),
+            'hours': counts(pc.hour(timestamps)),
+            'weekdays': counts(pc.day_of_week(timestamps, count_from_zero=False, week_start=7)),
+            'types': counts(table['type']),
+            'domains': [
+                {'_id': row['domain'], 'count': row['timestamp_count'], 'lastVisit': row['timestamp_max']}
+                for row in domains.to_pylist()
+            ]
+        }
+    
+    def activity(self, user_id, start_date, end_date, before, until=None):
+        """Archived tab activity ({timestamp, domain}), oldest first, as the time-spent estimate reads it"""
+        table = self._table(
+            user_id, start_date, end_date, before, until, ['timestamp', 'domain'],
+            filters=[('type', 'in', ACTIVITY_EVENT_TYPES)]
+        )
+        return table.filter(pc.is_valid(table['domain'])).sort_by('timestamp').to_pylist()
+    
+    def stats(self):
+        users = files = size = 0
+        for entry in os.scandir(self.directory) if os.path.isdir(self.directory) else []:
+            if entry.is_dir():
+                months = self.months(entry.name)
+                users += 1
+                files += len(months)
+                size += sum(os.path.getsize(os.path.join(entry.path, f'{month}.parquet')) for month in months)
+        return {'users': users, 'files': files, 'bytes': size}
+
+
+def archive_user(archive, db, user_id, before, batch_size=1000, strings=None):
+    """
+    Move one user's events older than `before` from a MongoDB database into the archive
+    
+    `strings` (a StringDictionary, app/interning.py) resolves interned urls
+    and titles, which the archive keeps as strings.
+    
+    Only events stored before the run started are archived. Months are
+    written first, then the manifest (the watermark and that start), then
+    the hot copies are deleted by _id, so events synced meanwhile are never
+    lost. Re-running after a failure is safe: archived events are skipped
+    and the delete is repeated. Events synced later with a timestamp before
+    the watermark stay hot, where federated ranges still count them, until
+    the next run archives them: a run never archives less than the current
+    watermark.
+    
+    Returns:
+        tuple: (events archived, hot copies deleted)
+    """
+    now = datetime.utcnow()
+    before = max(before, archive.watermark(user_id) or before)
+    cursor = db.events.find(expired_query(user_id, before, inserted_before=now)).sort('timestamp', 1)
+    archived = 0
+    ids = []
+    month, documents = None, []
+    
+    def write(month, documents):
+        if strings is not None:
+            strings.resolve_documents(documents)
+        return archive.write_month(user_id, month, documents)
+    
+    for document in cursor:
+        if month_key(document['timestamp']) != month:
+            if documents:
+                archived += write(month, documents)
+            month, documents = month_key(document['timestamp']), []
+        documents.append(document)
+        ids.append(document['_id'])
+    if documents:
+        archived += write(month, documents)
+    
+    archive.set_watermark(user_id, before, now)
+    
+    deleted = 0
+    for i in range(0, len(ids), batch_size):
+        deleted += db.events.delete_many({'_id': {'$in': ids[i:i + batch_size]}}).deleted_count
+    
+    return archived, deleted
+
+
+def archive_events(archive, databases, before, limit=None, batch_size=1000, log=print, strings=None, skip=None):
+    """
+    Archive events older than `before` for every user that has some, across databases (shards)
+    
+    `skip` (user id -> bool) leaves users alone this run, e.g. ones moving
+    between shards (app.sharding.move_in_progress).
+    
+    Returns:
+        dict: users processed, events archived and hot copies deleted
+    """
+    result = {'users': 0, 'archived': 0, 'deleted': 0}
+    
+    for name, db in databases:
+        pipeline = [
+            {'$match': {'timestamp': {'$lt': before}}},
+            {'$group': {'_id': '$userId', 'events': {'$sum': 1}}}
+        ]
+        for row in db.events.aggregate(pipeline):
+            if limit and result['users'] >= limit:
+                return result
+            if skip is not None and skip(str(row['_id'])):
+                log(f"  {row['_id']} ({name}): skipped (moving between shards)")
+                continue
+            archived, deleted = archive_user(archive, db, row['_id'], before, batch_size, strings)
+            result['users'] += 1
+            result['archived'] += archived
+            result['deleted'] += deleted
+            log(f"  {row['_id']} ({name}): {archived} archived, {deleted} deleted")
+    
+    return result
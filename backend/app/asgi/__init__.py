@@ -0,0 +1,3 @@
+from .app import create_asgi_app
+
+__all__ = ['create_asgi_app']
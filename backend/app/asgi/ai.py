@@ -0,0 +1,352 @@
+import json
+from datetime import datetime
+from starlette.concurrency import run_in_threadpool, iterate_in_threadpool
+from starlette.responses import StreamingResponse
+from starlette.routing import Route
+from app.asgi.responses import JSONResponse
+from app.asgi.auth import jwt_required, get_jwt_identity
+from app.asgi.storage import user_storage
+from app.ai.gemini import get_gemini_ai
+from app.ai.classifier import get_domain_classifier
+from app.ai.queries import day_bounds, format_daily_stats, score_productivity, format_weekly_data
+from app.ai.routes import MAX_BATCH_DOMAINS
+from app.analytics.queries import date_range, compute_domain_time
+from app.models.insight import Insight
+
+
+async def _get_daily_stats(storage, user_id, target_date):
+    """Aggregate a day's activity for the AI prompt; returns (start_time, stats)"""
+    start_time, end_time = day_bounds(target_date)
+    result = await storage.events.daily_stats(user_id, start_time, end_time)
+    
+    return start_time, format_daily_stats(result)
+
+
+async def _get_productivity_data(storage, user_id, days):
+    """Calculate time per domain and a productivity score for the last N days"""
+    start_date, end_date = date_range(days)
+    
+    events = await storage.events.activity(user_id, start_date, end_date)
+    
+    domain_time = compute_domain_time(events)
+    productivity_score, time_spent = score_productivity(domain_time)
+    
+    return domain_time, productivity_score, time_spent
+
+
+async def _store_insight(storage, user_id, date, insight_type, content, confidence):
+    """Persist a generated insight"""
+    insight = Insight(
+        user_id=user_id,
+        date=date,
+        insights=[
+            Insight.create_insight_object(insight_type, content, confidence=confidence)
+        ]
+    )
+    
+    await storage.insights.insert(insight.to_dict())
+
+
+def _sse(data, event=None):
+    """Format a single Server-Sent Events message"""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+
+def _sse_response(generator):
+    """Wrap an async generator of SSE messages in a streaming response"""
+    return StreamingResponse(
+        generator,
+        media_type='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
+def _parse_target_date(request):
+    """Read the ?date= parameter (default: today)"""
+    date_str = request.query_params.get('date')
+    if date_str:
+        return datetime.fromisoformat(date_str).date()
+    return datetime.utcnow().date()
+
+
+def _get_ai(request):
+    return get_gemini_ai(request.app.state.config)
+
+
+@jwt_required
+async def generate_daily_summary(request):
+    """Generate AI summary for a specific day"""
+    try:
+        current_user_id = get_jwt_identity(request)
+        storage = await user_storage('analytics', current_user_id)
+        
+        target_date = _parse_target_date(request)
+        start_time, daily_stats = await _get_daily_stats(storage, current_user_id, target_date)
+        
+        if not daily_stats['total_events']:
+            return JSONResponse({
+                'summary': 'No activity recorded for this day.',
+                'date': target_date.isoformat()
+            })
+        
+        # The LLM client blocks, so it runs on the threadpool rather than the event loop
+        summary = await run_in_threadpool(_get_ai(request).generate_daily_summary, daily_stats)
+        
+        await _store_insight(storage, current_user_id, start_time, 'summary', summary, 0.85)
+        
+        return JSONResponse({
+            'summary': summary,
+            'date': target_date.isoformat(),
+            'event_count': daily_stats['total_events']
+        })
+    
+    except Exception as e:
+        return JSONResponse({'error': 'Failed to generate summary', 'message': str(e)}, status_code=500)
+
+
+@jwt_required
+async def stream_daily_summary(request):
+    """Stream the AI daily summary over Server-Sent Events (meta, text chunks, done)"""
+    try:
+        current_user_id = get_jwt_identity(request)
+        storage = await user_storage('analytics', current_user_id)
+        
+        target_date = _parse_target_date(request)
+        start_time, daily_stats = await _get_daily_stats(storage, current_user_id, target_date)
+    
+    except Exception as e:
+        return JSONResponse({'error': 'Failed to generate summary', 'message': str(e)}, status_code=500)
+    
+    ai = _get_ai(request)
+    
+    async def generate():
+        meta = {'date': target_date.isoformat(), 'event_count': daily_stats['total_events']}
+        yield _sse(meta, event='meta')
+        
+        if not daily_stats['total_events']:
+            summary = 'No activity recorded for this day.'
+            yield _sse({'text': summary})
+            yield _sse({'summary': summary, **meta}, event='done')
+            return
+        
+        chunks = []
+        
+        async for chunk in iterate_in_threadpool(ai.stream_daily_summary(daily_stats)):
+            chunks.append(chunk)
+            yield _sse({'text': chunk})
+        
+        summary = ''.join(chunks)
+        
+        try:
+            await _store_insight(storage, current_user_id, start_time, 'summary', summary, 0.85)
+        except Exception as e:
+            yield _sse({'error': 'Failed to store summary', 'message': str(e)}, event='error')
+        
+        yield _sse({'summary': summary, **meta}, event='done')
+    
+    return _sse_response(generate())
+
+
+@jwt_required
+async def generate_productivity_insights(request):
+    """Generate AI insights about productivity"""
+    try:
+        current_user_id = get_jwt_identity(request)
+        storage = await user_storage('analytics', current_user_id)
+        
+        days = int(request.query_params.get('days', 7))
+        domain_time, productivity_score, time_spent = await _get_productivity_data(storage, current_user_id, days)
+        
+        insights_text = await run_in_threadpool(
+            _get_ai(request).generate_productivity_insights, domain_time, productivity_score
+        )
+        
+        return JSONResponse({
+            'insights': insights_text,
+            'productivity_score': round(productivity_score, 2),
+            'time_spent': time_spent
+        })
+    
+    except Exception as e:
+        return JSONResponse({'error': 'Failed to generate insights', 'message': str(e)}, status_code=500)
+
+
+@jwt_required
+async def stream_productivity_insights(request):
+    """Stream AI productivity insights over Server-Sent Events"""
+    try:
+        current_user_id = get_jwt_identity(request)
+        storage = await user_storage('analytics', current_user_id)
+        
+        days = int(request.query_params.get('days', 7))
+        domain_time, productivity_score, time_spent = await _get_productivity_data(storage, current_user_id, days)
+    
+    except Exception as e:
+        return JSONResponse({'error': 'Failed to generate insights', 'message': str(e)}, status_code=500)
+    
+    ai = _get_ai(request)
+    
+    async def generate():
+        meta = {
+            'productivity_score': round(productivity_score, 2),
+            'time_spent': time_spent
+        }
+        yield _sse(meta, event='meta')
+        
+        chunks = []
+        
+        async for chunk in iterate_in_threadpool(ai.stream_productivity_insights(domain_time, productivity_score)):
+            chunks.append(chunk)
+            yield _sse({'text': chunk})
+        
+        insights_text = ''.join(chunks)
+        
+        try:
+            await _store_insight(storage, current_user_id, datetime.utcnow(), 'recommendation', insights_text, 0.8)
+        except Exception as e:
+            yield _sse({'error': 'Failed to store insights', 'message': str(e)}, event='error')
+        
+        yield _sse({'insights': insights_text, **meta}, event='done')
+    
+    return _sse_response(generate())
+
+
+@jwt_required
+async def categorize_domain(request):
+    """Categorize a domain using AI"""
+    try:
+        data = await request.json()
+        
+        if not data or 'domain' not in data:
+            return JSONResponse({'error': 'Domain is required'}, status_code=400)
+        
+        domain = data['domain']
+        title = data.get('title')
+        
+        get_domain_classifier(request.app.state.config)  # Load custom rules before the fallback needs them
+        category = await run_in_threadpool(_get_ai(request).categorize_domain, domain, title)
+        
+        return JSONResponse({
+            'domain': domain,
+            'category': category
+        })
+    
+    except Exception as e:
+        return JSONResponse({'error': 'Failed to categorize', 'message': str(e)}, status_code=500)
+
+
+@jwt_required
+async def categorize_domains(request):
+    """Categorize many domains at once with the rule-based classifier"""
+    try:
+        data = await request.json()
+        
+        if not data or not isinstance(data.get('domains'), list):
+            return JSONResponse({'error': 'Domains must be an array'}, status_code=400)
+        
+        domains = data['domains']
+        if len(domains) > MAX_BATCH_DOMAINS:
+            return JSONResponse({'error': f'At most {MAX_BATCH_DOMAINS} domains per request'}, status_code=400)
+        if not all(isinstance(domain, str) and domain for domain in domains):
+            return JSONResponse({'error': 'Each domain must be a non-empty string'}, status_code=400)
+        
+        categories = get_domain_classifier(request.app.state.config).classify_many(domains)
+        
+        return JSONResponse({
+            'categories': [
+                {'domain': domain, 'category': category}
+                for domain, category in zip(domains, categories)
+            ]
+        })
+    
+    except Exception as e:
+        return JSONResponse({'error': 'Failed to categorize', 'message': str(e)}, status_code=500)
+
+
+@jwt_required
+async def generate_weekly_report(request):
+    """Generate comprehensive weekly report"""
+    try:
+        current_user_id = get_jwt_identity(request)
+        storage = await user_storage('analytics', current_user_id)
+        
+        # Get last 7 days
+        start_date, end_date = date_range(7)
+        
+        total_events, top_domains, productive_count, peak_hour_data = await storage.events.weekly_stats(
+            current_user_id, start_date, end_date
+        )
+        
+        weekly_data = format_weekly_data(total_events, top_domains, productive_count, peak_hour_data)
+        
+        report = await run_in_threadpool(_get_ai(request).generate_weekly_report, weekly_data)
+        
+        await _store_insight(storage, current_user_id, start_date, 'weekly_report', report, 0.9)
+        
+        return JSONResponse({
+            'report': report,
+            'data': weekly_data,
+            'period': {
+                'start': start_date.isoformat(),
+                'end': end_date.isoformat()
+            }
+        })
+    
+    except Exception as e:
+        return JSONResponse({'error': 'Failed to generate report', 'message': str(e)}, status_code=500)
+
+
+@jwt_required
+async def get_ai_status(request):
+    """Get LLM provider, circuit breaker and coalescing state"""
+    try:
+        ai = _get_ai(request)
+        
+        if not ai.is_configured():
+            return JSONResponse({'configured': False})
+        
+        stats = ai.provider.stats() if hasattr(ai.provider, 'stats') else {'provider': ai.provider.name}
+        
+        return JSONResponse({'configured': True, **stats})
+    
+    except Exception as e:
+        return JSONResponse({'error': 'Failed to get AI status', 'message': str(e)}, status_code=500)
+
+
+@jwt_required
+async def get_insights_history(request):
+    """Get historical insights"""
+    try:
+        current_user_id = get_jwt_identity(request)
+        
+        limit = int(request.query_params.get('limit', 10))
+        
+        storage = await user_storage('analytics', current_user_id)
+        insights = await storage.insights.history(current_user_id, limit)
+        
+        insights_json = [Insight.from_dict(i).to_json() for i in insights]
+        
+        return JSONResponse({
+            'insights': insights_json,
+            'count': len(insights_json)
+        })
+    
+    except Exception as e:
+        return JSONResponse({'error': 'Failed to get insights', 'message': str(e)}, status_code=500)
+
+
+routes = [
+    Route('/api/ai/daily-summary', generate_daily_summary, methods=['GET']),
+    Route('/api/ai/daily-summary/stream', stream_daily_summary, methods=['GET']),
+    Route('/api/ai/productivity-insights', generate_productivity_insights, methods=['GET']),
+    Route('/api/ai/productivity-insights/stream', stream_productivity_insights, methods=['GET']),
+    Route('/api/ai/categorize', categorize_domain, methods=['POST']),
+    Route('/api/ai/categorize/batch', categorize_domains, methods=['POST']),
+    Route('/api/ai/weekly-report', generate_weekly_report, methods=['GET']),
+    Route('/api/ai/status', get_ai_status, methods=['GET']),
+    Route('/api/ai/insights/history', get_insights_history, methods=['GET'])
+]
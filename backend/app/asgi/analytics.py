@@ -0,0 +1,92 @@
+from starlette.routing import Route
+from app.asgi.responses import JSONResponse
+from app.asgi.auth import jwt_required, get_jwt_identity
+from app.asgi.storage import user_storage
+from app.analytics.queries import (
+    date_range, format_dashboard, compute_domain_time, format_time_spent,
+    format_productivity, format_patterns
+)
+
+
+@jwt_required
+async def get_dashboard_data(request):
+    """Get comprehensive dashboard data"""
+    try:
+        current_user_id = get_jwt_identity(request)
+        storage = await user_storage('analytics', current_user_id)
+        
+        # Get date range (default: last 7 days)
+        days = int(request.query_params.get('days', 7))
+        start_date, end_date = date_range(days)
+        
+        # Total events and the per-section aggregations
+        total_events, results = await storage.events.dashboard(current_user_id, start_date, end_date)
+        
+        return JSONResponse(format_dashboard(start_date, end_date, days, total_events, results))
+    
+    except Exception as e:
+        return JSONResponse({'error': 'Failed to get dashboard data', 'message': str(e)}, status_code=500)
+
+
+@jwt_required
+async def get_time_spent(request):
+    """Calculate time spent on different domains (from tab switches)"""
+    try:
+        current_user_id = get_jwt_identity(request)
+        
+        days = int(request.query_params.get('days', 7))
+        start_date, end_date = date_range(days)
+        
+        storage = await user_storage('analytics', current_user_id)
+        events = await storage.events.activity(current_user_id, start_date, end_date)
+        
+        return JSONResponse(format_time_spent(compute_domain_time(events)))
+    
+    except Exception as e:
+        return JSONResponse({'error': 'Failed to calculate time spent', 'message': str(e)}, status_code=500)
+
+
+@jwt_required
+async def get_productivity_score(request):
+    """Calculate productivity score based on domain categorization"""
+    try:
+        current_user_id = get_jwt_identity(request)
+        storage = await user_storage('analytics', current_user_id)
+        
+        days = int(request.query_params.get('days', 7))
+        start_date, end_date = date_range(days)
+        
+        productive_count, social_count, total_count = await storage.events.productivity_counts(
+            current_user_id, start_date, end_date
+        )
+        
+        return JSONResponse(format_productivity(productive_count, social_count, total_count))
+    
+    except Exception as e:
+        return JSONResponse({'error': 'Failed to calculate productivity', 'message': str(e)}, status_code=500)
+
+
+@jwt_required
+async def get_usage_patterns(request):
+    """Identify usage patterns"""
+    try:
+        current_user_id = get_jwt_identity(request)
+        storage = await user_storage('analytics', current_user_id)
+        
+        days = int(request.query_params.get('days', 30))
+        start_date, end_date = date_range(days)
+        
+        most_active_hour, most_active_day = await storage.events.peaks(current_user_id, start_date, end_date)
+        
+        return JSONResponse(format_patterns(most_active_hour, most_active_day))
+    
+    except Exception as e:
+        return JSONResponse({'error': 'Failed to get patterns', 'message': str(e)}, status_code=500)
+
+
+routes = [
+    Route('/api/analytics/dashboard', get_dashboard_data, methods=['GET']),
+    Route('/api/analytics/time-spent', get_time_spent, methods=['GET']),
+    Route('/api/analytics/productivity', get_productivity_score, methods=['GET']),
+    Route('/api/analytics/patterns', get_usage_patterns, methods=['GET'])
+]
@@ -0,0 +1,74 @@
+from contextlib import asynccontextmanager
+from a2wsgi import WSGIMiddleware
+from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.routing import Mount
+from app import create_app
+from app.database import client_options, database_options
+from app.asgi import events, analytics, ai
+from app.asgi.metrics import MetricsMiddleware
+from app.asgi.compression import CompressionMiddleware
+
+
+def create_asgi_app(config_name='default'):
+    """
+    ASGI application factory
+    
+    The events, analytics and AI endpoints are served natively on an event
+    loop: token checks use the Motor driver, storage calls go through the
+    same repositories as the Flask routes (on the threadpool, see
+    app/asgi/storage.py) and LLM calls stream without holding a thread
+    between chunks. Sharding, the archive and retention tiers, interning
+    and the shared rate limiter therefore apply to both. Everything else
+    (auth, 404s, method errors) falls through to the Flask app over a WSGI
+    bridge, so URLs, payloads and status codes stay the same as under
+    gunicorn. With the embedded SQLite backend every request goes through
+    Flask.
+    """
+    flask_app = create_app(config_name)
+    config = flask_app.config
+    
+    mongodb = config['STORAGE_BACKEND'] == 'mongodb'
+    
+    @asynccontextmanager
+    async def lifespan(app):
+        if not mongodb:
+            yield
+            return
+        
+        # Motor binds to the running loop, so the client is created here rather than at import.
+        # It only reads revoked tokens from the home database; routes go through the storage layer.
+        client = AsyncIOMotorClient(config['MONGODB_URI'], **client_options(config, 'default'))
+        app.state.db = client.get_database(config['MONGODB_DB_NAME'], **database_options(config, 'default'))
+        try:
+            yield
+        finally:
+            client.close()
+    
+    native_routes = [*events.routes, *analytics.routes, *ai.routes] if mongodb else []
+    routes = [
+        *native_routes,
+        Mount('/', app=WSGIMiddleware(flask_app, workers=config['ASGI_WSGI_THREADS']))
+    ]
+    
+    middleware = [
+        Middleware(
+            CORSMiddleware,
+            allow_origins=config['CORS_ORIGINS'],
+            allow_credentials=True,
+            allow_methods=['*'],
+            allow_headers=['*']
+        )
+    ]
+    if config['COMPRESSION_ENABLED']:
+        middleware.append(Middleware(CompressionMiddleware, config=config))
+    if config['METRICS_ENABLED']:
+        middleware.insert(0, Middleware(MetricsMiddleware, routes=native_routes))
+    
+    app = Starlette(routes=routes, middleware=middleware, lifespan=lifespan)
+    app.state.config = config
+    app.state.flask_app = flask_app
+    
+    return app
@@ -0,0 +1,76 @@
+from starlette.datastructures import Headers, MutableHeaders
+from app.compression import compressible, compression_settings, negotiate, new_encoder
+
+
+class CompressionMiddleware:
+    """
+    Negotiated response compression for the ASGI app
+    
+    Same rules as the Flask hook (app/compression.py): JSON and text only,
+    single-message bodies below COMPRESSION_MIN_SIZE are left alone, and
+    streamed bodies are compressed per message with a flush so SSE events
+    reach the client as they are sent. Responses the Flask mount already
+    encoded pass through untouched.
+    """
+    
+    def __init__(self, app, config):
+        self.app = app
+        self.settings = compression_settings(config)
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] == 'HEAD':
+            await self.app(scope, receive, send)
+            return
+        
+        encoding = negotiate(Headers(scope=scope).get('accept-encoding'), self.settings['encodings'])
+        state = {'start': None, 'encoder': None, 'passthrough': False}
+        
+        def encode(body, more_body):
+            encoder = state['encoder']
+            return encoder.compress(body) + (encoder.flush() if more_body else encoder.finish())
+        
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                # Held back until the first body message shows whether it is worth compressing
+                state['start'] = message
+                return
+            
+            if message['type'] != 'http.response.body' or state['passthrough']:
+                await send(message)
+                return
+            
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+            start, state['start'] = state['start'], None
+            
+            if start is not None:
+                headers = MutableHeaders(raw=start['headers'])
+                
+                if compressible(start['status'], headers.get('content-type'),
+                                headers.get('content-encoding'), headers.get('cache-control')):
+                    headers.add_vary_header('Accept-Encoding')
+                    # Declared length if any (the Flask mount sends bodies in several messages)
+                    length = headers.get('content-length')
+                    size = int(length) if length else (None if more_body else len(body))
+                    if encoding is not None and (size is None or size >= self.settings['min_size']):
+                        state['encoder'] = new_encoder(encoding, self.settings)
+                        headers['Content-Encoding'] = encoding
+                
+                if state['encoder'] is None:
+                    state['passthrough'] = True
+                    await send(start)
+                    await send(message)
+                    return
+                
+                data = encode(body, more_body)
+                if more_body:
+                    del headers['Content-Length']
+                else:
+                    headers['Content-Length'] = str(len(data))
+                await send(start)
+                await send({'type': 'http.response.body', 'body': data, 'more_body': more_body})
+                return
+            
+            await send({'type': 'http.response.body', 'body': encode(body, more_body), 'more_body': more_body})
+        
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,209 @@
+import logging
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import Route
+from app.asgi.responses import JSONResponse
+from app.asgi.auth import jwt_required, get_jwt_identity
+from app.asgi.storage import user_storage
+from app.models.event import Event
+from app.events.queries import build_event_documents, format_top_domains
+from app.events.ratelimit import get_ingest_limiter, limited_body
+from app.log import StageTimer, log_timed
+from app.metrics import record_events_ingested
+
+logger = logging.getLogger(__name__)
+
+
+@jwt_required
+async def sync_events(request):
+    """Sync events from browser extension"""
+    timer = StageTimer()
+    current_user_id = None
+    
+    try:
+        current_user_id = get_jwt_identity(request)
+        data = await request.json()
+        timer.mark('parse')
+        
+        if not data:
+            log_timed(logger, 'sync rejected', timer, {'user': current_user_id, 'reason': 'no data'})
+            return JSONResponse({'error': 'No data provided'}, status_code=400)
+        
+        if 'events' not in data:
+            log_timed(logger, 'sync rejected', timer, {'user': current_user_id, 'reason': 'no events key'},
+                      {'keys': list(data.keys())})
+            return JSONResponse({'error': 'No events provided'}, status_code=400)
+        
+        events = data['events']
+        
+        if not isinstance(events, list):
+            log_timed(logger, 'sync rejected', timer, {'user': current_user_id, 'reason': 'events not a list'},
+                      {'events_type': type(events).__name__})
+            return JSONResponse({'error': 'Events must be an array'}, status_code=400)
+        
+        limiter = get_ingest_limiter(request.app.state.config)
+        size = len(await request.body())
+        if limiter.store is not None:
+            # The shared buckets are read and swapped through the storage layer
+            retry_after = await run_in_threadpool(limiter.acquire, current_user_id, len(events), size)
+        else:
+            retry_after = limiter.acquire(current_user_id, len(events), size)
+        if retry_after:
+            log_timed(logger, 'sync rejected', timer, {
+                'user': current_user_id, 'reason': 'rate limited', 'received': len(events), 'retry_after': retry_after
+            })
+            return JSONResponse(limited_body(retry_after), status_code=429, headers={'Retry-After': str(retry_after)})
+        
+        storage = await user_storage('ingest', current_user_id)
+        event_documents, errors = build_event_documents(current_user_id, events)
+        timer.mark('build')
+        
+        if not event_documents:
+            record_events_ingested(0, len(errors))
+            log_timed(logger, 'sync rejected', timer,
+                      {'user': current_user_id, 'reason': 'no valid events', 'received': len(events)},
+                      {'errors': errors})
+            return JSONResponse({'error': 'No valid events', 'details': errors}, status_code=400)
+        
+        inserted = await storage.events.insert_many(event_documents)
+        timer.mark('insert')
+        record_events_ingested(inserted, len(errors))
+        
+        log_timed(logger, 'sync', timer, {
+            'user': current_user_id,
+            'received': len(events),
+            'inserted': inserted,
+            'rejected': len(errors)
+        }, {'errors': errors, 'sample_event': events[0] if events else None})
+        
+        return JSONResponse({
+            'success': True,
+            'message': 'Events synced successfully',
+            'received': len(events),
+            'inserted': inserted
+        })
+    
+    except Exception as e:
+        logger.exception('sync failed', extra={'fields': {
+            'user': current_user_id,
+            'stages_ms': timer.stages,
+            'total_ms': timer.total_ms
+        }})
+        return JSONResponse({'error': 'Sync failed', 'message': str(e)}, status_code=500)
+
+
+@jwt_required
+async def get_events(request):
+    """Get events for current user with optional filters"""
+    try:
+        current_user_id = get_jwt_identity(request)
+        storage = await user_storage('analytics', current_user_id)
+        args = request.query_params
+        
+        limit = int(args.get('limit', 100))
+        skip = int(args.get('skip', 0))
+        
+        events = await storage.events.find(current_user_id, args, limit, skip)
+        
+        total = await storage.events.count(current_user_id, args)
+        
+        return JSONResponse({
+            'events': [Event.from_dict(e).to_json() for e in events],
+            'total': total,
+            'limit': limit,
+            'skip': skip
+        })
+    
+    except Exception as e:
+        return JSONResponse({'error': 'Failed to get events', 'message': str(e)}, status_code=500)
+
+
+@jwt_required
+async def get_event_count(request):
+    """Get total event count for current user"""
+    try:
+        current_user_id = get_jwt_identity(request)
+        storage = await user_storage('analytics', current_user_id)
+        
+        count = await storage.events.count(current_user_id)
+        
+        return JSONResponse({'count': count})
+    
+    except Exception as e:
+        return JSONResponse({'error': 'Failed to get count', 'message': str(e)}, status_code=500)
+
+
+@jwt_required
+async def get_recent_events(request):
+    """Get recent events (last 24 hours by default)"""
+    try:
+        current_user_id = get_jwt_identity(request)
+        args = request.query_params
+        
+        hours = int(args.get('hours', 24))
+        limit = int(args.get('limit', 50))
+        
+        storage = await user_storage('analytics', current_user_id)
+        events = await storage.events.recent(current_user_id, hours, limit)
+        
+        events_json = [Event.from_dict(e).to_json() for e in events]
+        
+        return JSONResponse({
+            'events': events_json,
+            'hours': hours,
+            'count': len(events_json)
+        })
+    
+    except Exception as e:
+        return JSONResponse({'error': 'Failed to get recent events', 'message': str(e)}, status_code=500)
+
+
+@jwt_required
+async def get_top_domains(request):
+    """Get top visited domains"""
+    try:
+        current_user_id = get_jwt_identity(request)
+        
+        limit = int(request.query_params.get('limit', 10))
+        
+        storage = await user_storage('analytics', current_user_id)
+        results = await storage.events.top_domains(current_user_id, limit)
+        domains = format_top_domains(results)
+        
+        return JSONResponse({
+            'domains': domains,
+            'total': len(domains)
+        })
+    
+    except Exception as e:
+        return JSONResponse({'error': 'Failed to get domains', 'message': str(e)}, status_code=500)
+
+
+@jwt_required
+async def get_event_stats(request):
+    """Get event statistics"""
+    try:
+        current_user_id = get_jwt_identity(request)
+        storage = await user_storage('analytics', current_user_id)
+        
+        total, type_stats = await storage.events.type_stats(current_user_id, request.query_params)
+        
+        return JSONResponse({
+            'total': total,
+            'by_type': [
+                {'type': s['_id'], 'count': s['count']}
+                for s in type_stats
+            ]
+        })
+    
+    except Exception as e:
+        return JSONResponse({'error': 'Failed to get stats', 'message': str(e)}, status_code=500)
+
+
+routes = [
+    Route('/api/events/sync', sync_events, methods=['POST']),
+    Route('/api/events/', get_events, methods=['GET']),
+    Route('/api/events/count', get_event_count, methods=['GET']),
+    Route('/api/events/recent', get_recent_events, methods=['GET']),
+    Route('/api/events/domains', get_top_domains, methods=['GET']),
+    Route('/api/events/stats', get_event_stats, methods=['GET'])
+]
@@ -0,0 +1,16 @@
+import json
+from flask.json.provider import DefaultJSONProvider
+from starlette.responses import JSONResponse as StarletteJSONResponse
+
+
+class JSONResponse(StarletteJSONResponse):
+    """JSON rendered like Flask's `jsonify` (sorted keys, HTTP dates for datetimes)"""
+    
+    def render(self, content):
+        return json.dumps(
+            content,
+            default=DefaultJSONProvider.default,
+            ensure_ascii=DefaultJSONProvider.ensure_ascii,
+            sort_keys=DefaultJSONProvider.sort_keys,
+            separators=(',', ':')
+        ).encode('utf-8')
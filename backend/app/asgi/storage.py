@@ -0,0 +1,47 @@
+from collections.abc import Iterator
+from starlette.concurrency import run_in_threadpool
+from app.storage import get_storage
+
+
+class AsyncRepository:
+    """
+    A repository whose methods are awaited on the threadpool
+    
+    The storage backends use blocking drivers, so each call runs on a
+    worker thread and the event loop stays free. Lazy results (cursors,
+    chained tiers) are read into a list on that thread too.
+    """
+    
+    def __init__(self, repository):
+        self._repository = repository
+    
+    def __getattr__(self, name):
+        method = getattr(self._repository, name)
+        
+        def call(*args, **kwargs):
+            result = method(*args, **kwargs)
+            return list(result) if isinstance(result, Iterator) else result
+        
+        async def wrapper(*args, **kwargs):
+            return await run_in_threadpool(call, *args, **kwargs)
+        
+        return wrapper
+
+
+class AsyncStorage:
+    """A Storage (app/storage/base.py) with awaitable repositories"""
+    
+    def __init__(self, storage):
+        self.events = AsyncRepository(storage.events)
+        self.users = AsyncRepository(storage.users)
+        self.insights = AsyncRepository(storage.insights)
+        self.sessions = AsyncRepository(storage.sessions)
+        self.tokens = AsyncRepository(storage.tokens)
+        self.rollups = AsyncRepository(storage.rollups)
+        self.strings = storage.strings
+        self.rate_limits = AsyncRepository(storage.rate_limits)
+
+
+async def user_storage(workload, user_id):
+    """get_storage() for the ASGI app: the user's shard, with archive, retention and interning as configured"""
+    return AsyncStorage(await run_in_threadpool(get_storage, workload, user_id))
@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from app.models.user import User
+
+
+class UserCache:
+    """
+    Per-process TTL + LRU cache of users keyed by id
+    
+    Each entry keeps the User and its `to_json()` so `/auth/me` is a dict
+    lookup. Profile updates invalidate the local entry; other workers see
+    the change once their entry expires, so the TTL bounds staleness.
+    """
+    
+    def __init__(self, max_entries=1024, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, user_id):
+        """Return (user, user_json) for a cached user, or None"""
+        key = str(user_id)
+        now = time.monotonic()
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+    
+    def set(self, user_data):
+        """Cache a user document; returns (user, user_json)"""
+        user = User.from_dict(user_data)
+        user_json = user.to_json()
+        
+        if self.max_entries > 0 and self.ttl > 0:
+            with self._lock:
+                self._entries[str(user._id)] = (time.monotonic() + self.ttl, user, user_json)
+                self._entries.move_to_end(str(user._id))
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        
+        return user, user_json
+    
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(str(user_id), None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Global instance
+user_cache = None
+
+
+def get_user_cache():
+    """Get or create the user cache from app config"""
+    global user_cache
+    
+    if user_cache is None:
+        user_cache = UserCache(
+            max_entries=current_app.config.get('USER_CACHE_SIZE', 1024),
+            ttl=current_app.config.get('USER_CACHE_TTL_SECONDS', 30)
+        )
+    
+    return user_cache
@@ -0,0 +1,111 @@
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from flask import current_app
+from app.models.user import User
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when the password pool queue is full; callers should answer 503"""
+
+
+_COST_PATTERN = re.compile(r'^\$2[abxy]?\$(\d{2})\$')
+
+
+def hash_cost(password_hash):
+    """Return the bcrypt cost factor encoded in a hash (None if unrecognised)"""
+    match = _COST_PATTERN.match(password_hash or '')
+    return int(match.group(1)) if match else None
+
+
+class PasswordHasher:
+    """
+    Run bcrypt on a bounded process pool instead of the request thread
+    
+    At most `pool_size` hashes run at once and at most `queue_depth` more
+    may wait; beyond that PasswordPoolBusy is raised immediately rather than
+    letting logins pile up behind each other. With pool_size=0 bcrypt runs
+    inline (tests, single-user setups).
+    """
+    
+    def __init__(self, rounds=12, pool_size=2, queue_depth=32, timeout=10):
+        self.rounds = rounds
+        self.pool_size = pool_size
+        self.timeout = timeout
+        
+        self._slots = threading.BoundedSemaphore(max(pool_size, 1) + queue_depth)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        
+        self.stats = {'hashed': 0, 'verified': 0, 'rejected': 0, 'rehashed': 0}
+    
+    def hash(self, password):
+        """Hash a password at the configured cost"""
+        result = self._run(User.hash_password, password, self.rounds)
+        self.stats['hashed'] += 1
+        return result
+    
+    def verify(self, password, password_hash):
+        """Verify a password against its hash"""
+        result = self._run(User.verify_password, password, password_hash)
+        self.stats['verified'] += 1
+        return result
+    
+    def needs_rehash(self, password_hash):
+        """True if the hash was made with a different cost than configured"""
+        cost = hash_cost(password_hash)
+        return cost is not None and cost != self.rounds
+    
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.stats['rejected'] += 1
+            raise PasswordPoolBusy('Too many password operations in progress')
+        
+        try:
+            if self.pool_size <= 0:
+                return fn(*args)
+            
+            future = self._get_executor().submit(fn, *args)
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeoutError:
+                future.cancel()
+                raise PasswordPoolBusy('Password operation timed out')
+        finally:
+            self._slots.release()
+    
+    def _get_executor(self):
+        # Created lazily and per process, so gunicorn workers never share a pool
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.pool_size)
+                self._pid = os.getpid()
+            return self._executor
+    
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Global instance
+password_hasher = None
+
+
+def get_password_hasher():
+    """Get or create the password hasher from app config"""
+    global password_hasher
+    
+    if password_hasher is None:
+        config = current_app.config
+        password_hasher = PasswordHasher(
+            rounds=config.get('BCRYPT_ROUNDS', 12),
+            pool_size=config.get('BCRYPT_POOL_SIZE', 2),
+            queue_depth=config.get('BCRYPT_QUEUE_DEPTH', 32),
+            timeout=config.get('BCRYPT_TIMEOUT_SECONDS', 10)
+        )
+    
+    return password_hasher
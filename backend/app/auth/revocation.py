@@ -0,0 +1,133 @@
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from flask import current_app
+from pymongo.errors import PyMongoError
+from app.storage import get_storage
+from app.storage.mongo import revoked_query
+
+logger = logging.getLogger(__name__)
+
+
+class RevocationList:
+    """
+    Revoked JWT ids, mirrored from `revoked_tokens` into a per-worker set
+    
+    Lookups are a set membership test. Every `refresh_interval` seconds one
+    request thread pulls only the rows revoked since the last pull (indexed
+    on revokedAt), so other workers see a logout within that interval while
+    the revoking worker sees it immediately. Rows expire from storage (a
+    TTL index with MongoDB) once the token itself would have expired, and
+    from memory on the same schedule, so the set stays proportional to
+    recent logouts.
+    """
+    
+    # Re-read a little before the last sync to tolerate clock skew between workers
+    SYNC_OVERLAP = timedelta(seconds=5)
+    PROJECTION = {'jti': 1, 'expiresAt': 1, '_id': 0}
+    
+    # Storage errors that leave the current set in place until the next refresh
+    STORAGE_ERRORS = (PyMongoError, sqlite3.Error)
+    
+    def __init__(self, refresh_interval=5):
+        self.refresh_interval = refresh_interval
+        self.refreshes = 0
+        
+        self._revoked = {}  # jti -> expiresAt
+        self._lock = threading.Lock()
+        self._next_refresh = 0
+        self._last_sync = None
+    
+    def is_revoked(self, jti):
+        if time.monotonic() >= self._next_refresh:
+            self._refresh()
+        return jti in self._revoked
+    
+    def revoke(self, jwt_payload):
+        """Persist a token's jti until the token would have expired anyway"""
+        jti = jwt_payload['jti']
+        expires_at = datetime.utcfromtimestamp(jwt_payload['exp']) if 'exp' in jwt_payload else datetime.utcnow() + timedelta(days=30)
+        
+        get_storage().tokens.revoke({
+            'jti': jti,
+            'userId': ObjectId(jwt_payload['sub']) if ObjectId.is_valid(jwt_payload.get('sub', '')) else None,
+            'type': jwt_payload.get('type'),
+            'revokedAt': datetime.utcnow(),
+            'expiresAt': expires_at
+        })
+        
+        with self._lock:
+            self._revoked[jti] = expires_at
+    
+    async def is_revoked_async(self, jti, db):
+        """`is_revoked` for the ASGI app, refreshing through an async (Motor) database"""
+        if time.monotonic() >= self._next_refresh and self._lock.acquire(blocking=False):
+            try:
+                now = datetime.utcnow()
+                rows = await db.revoked_tokens.find(revoked_query(now, self._since()), self.PROJECTION).to_list(None)
+                self._apply(rows, now)
+            except PyMongoError as e:
+                logger.warning(f"Failed to refresh revoked tokens: {str(e)}")
+            finally:
+                self._next_refresh = time.monotonic() + self.refresh_interval
+                self._lock.release()
+        
+        return jti in self._revoked
+    
+    def _refresh(self):
+        # Only one thread refreshes; the others keep using the current set
+        if not self._lock.acquire(blocking=False):
+            return
+        
+        try:
+            now = datetime.utcnow()
+            rows = get_storage().tokens.revoked_since(now, self._since())
+            self._apply(rows, now)
+        except self.STORAGE_ERRORS as e:
+            # Keep serving the current set; the next refresh catches up
+            current_app.logger.warning(f"Failed to refresh revoked tokens: {str(e)}")
+        finally:
+            self._next_refresh = time.monotonic() + self.refresh_interval
+            self._lock.release()
+    
+    def _since(self):
+        """Revocation time to pull from (None on the first pull: all unexpired ones)"""
+        return self._last_sync - self.SYNC_OVERLAP if self._last_sync is not None else None
+    
+    def _apply(self, rows, now):
+        revoked = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+        for row in rows:
+            revoked[row['jti']] = row['expiresAt']
+        
+        # Swap in a new dict so readers never see a partially pruned one
+        self._revoked = revoked
+        self._last_sync = now
+        self.refreshes += 1
+    
+    def __len__(self):
+        return len(self._revoked)
+
+
+# Global instance
+revocation_list = None
+
+
+def get_revocation_list(config=None):
+    """Get or create the revocation list from `config` (default: the Flask app config)"""
+    global revocation_list
+    
+    if revocation_list is None:
+        config = config if config is not None else current_app.config
+        revocation_list = RevocationList(
+            refresh_interval=config.get('JWT_REVOCATION_REFRESH_SECONDS', 5)
+        )
+    
+    return revocation_list
+
+
+def is_token_revoked(jwt_header, jwt_payload):
+    """`token_in_blocklist_loader` callback"""
+    return get_revocation_list().is_revoked(jwt_payload['jti'])
@@ -2,12 +2,19 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import (
     create_access_token,
     create_refresh_token,
+    decode_token,
     jwt_required,
+    get_jwt,
     get_jwt_identity
 )
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
 from marshmallow import Schema, fields, ValidationError
 from app.models.user import User
-from app import get_db
+from app.auth.cache import get_user_cache
+from app.auth.passwords import get_password_hasher, PasswordPoolBusy
+from app.auth.revocation import get_revocation_list
+from app.storage import get_storage
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -24,6 +31,13 @@ class LoginSchema(Schema):
     password = fields.Str(required=True)
 
 
+def _busy_response():
+    """503 returned when the password pool is saturated"""
+    response = jsonify({'error': 'Server busy', 'message': 'Too many login attempts in progress, please retry'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+
 # Routes
 @auth_bp.route('/register', methods=['POST'])
 def register():
@@ -33,10 +47,10 @@ def register():
         schema = RegisterSchema()
         data = schema.load(request.json)
         
-        db = get_db()
+        storage = get_storage()
         
         # Check if user already exists
-        existing_user = db.users.find_one({'email': data['email']})
+        existing_user = storage.users.find_by_email(data['email'])
         if existing_user:
             return jsonify({'error': 'User already exists'}), 400
         
@@ -44,12 +58,11 @@ def register():
         user = User(
             email=data['email'],
             name=data['name'],
-            password_hash=User.hash_password(data['password'])
+            password_hash=get_password_hasher().hash(data['password'])
         )
         
-        # Insert into database
-        result = db.users.insert_one(user.to_dict())
-        user._id = result.inserted_id
+        # Insert into database (and, with MongoDB, pin the user to a shard)
+        user._id = storage.users.insert(user.to_dict())
         
         # Create tokens
         access_token = create_access_token(identity=str(user._id))
@@ -61,9 +74,11 @@ def register():
             'access_token': access_token,
             'refresh_token': refresh_token
         }), 201
-        
+    
     except ValidationError as err:
         return jsonify({'error': 'Validation error', 'messages': err.messages}), 400
+    except PasswordPoolBusy:
+        return _busy_response()
     except Exception as e:
         return jsonify({'error': 'Registration failed', 'message': str(e)}), 500
 
@@ -76,19 +91,31 @@ def login():
         schema = LoginSchema()
         data = schema.load(request.json)
         
-        db = get_db()
+        storage = get_storage()
         
         # Find user
-        user_data = db.users.find_one({'email': data['email']})
+        user_data = storage.users.find_by_email(data['email'])
         if not user_data:
             return jsonify({'error': 'Invalid credentials'}), 401
         
         user = User.from_dict(user_data)
         
         # Verify password
-        if not user.password_hash or not User.verify_password(data['password'], user.password_hash):
+        hasher = get_password_hasher()
+        if not user.password_hash or not hasher.verify(data['password'], user.password_hash):
             return jsonify({'error': 'Invalid credentials'}), 401
         
+        # Transparently upgrade hashes made with a different bcrypt cost
+        if hasher.needs_rehash(user.password_hash):
+            try:
+                storage.users.replace_password_hash(user._id, user.password_hash, hasher.hash(data['password']))
+                hasher.stats['rehashed'] += 1
+            except PasswordPoolBusy:
+                pass  # Try again on a later login
+        
+        # Warm the cache for the /auth/me call that follows a login
+        get_user_cache().set(user_data)
+        
         # Create tokens
         access_token = create_access_token(identity=str(user._id))
         refresh_token = create_refresh_token(identity=str(user._id))
@@ -99,9 +126,11 @@ def login():
             'access_token': access_token,
             'refresh_token': refresh_token
         }), 200
-        
+    
     except ValidationError as err:
         return jsonify({'error': 'Validation error', 'messages': err.messages}), 400
+    except PasswordPoolBusy:
+        return _busy_response()
     except Exception as e:
         return jsonify({'error': 'Login failed', 'message': str(e)}), 500
 
@@ -117,7 +146,7 @@ def refresh():
         return jsonify({
             'access_token': access_token
         }), 200
-        
+    
     except Exception as e:
         return jsonify({'error': 'Token refresh failed', 'message': str(e)}), 500
 
@@ -128,20 +157,23 @@ def get_current_user():
     """Get current user information"""
     try:
         current_user_id = get_jwt_identity()
-        db = get_db()
+        cache = get_user_cache()
+        
+        cached = cache.get(current_user_id)
+        if cached:
+            return jsonify({'user': cached[1]}), 200
         
-        from bson import ObjectId
-        user_data = db.users.find_one({'_id': ObjectId(current_user_id)})
+        user_data = get_storage().users.find_by_id(current_user_id)
         
         if not user_data:
             return jsonify({'error': 'User not found'}), 404
         
-        user = User.from_dict(user_data)
+        _, user_json = cache.set(user_data)
         
         return jsonify({
-            'user': user.to_json()
+            'user': user_json
         }), 200
-        
+    
     except Exception as e:
         return jsonify({'error': 'Failed to get user', 'message': str(e)}), 500
 
@@ -149,9 +181,30 @@ def get_current_user():
 @auth_bp.route('/logout', methods=['POST'])
 @jwt_required()
 def logout():
-    """Logout user (client-side token removal)"""
-    # In a production app, you might want to blacklist the token
-    return jsonify({'message': 'Logout successful'}), 200
+    """
+    Logout user by revoking the access token
+    
+    Send {"refresh_token": "..."} in the body to revoke the refresh token too.
+    """
+    try:
+        # Decoded before anything is revoked, so a bad token leaves the session as it was
+        data = request.get_json(silent=True) or {}
+        refresh_payload = None
+        if data.get('refresh_token'):
+            try:
+                refresh_payload = decode_token(str(data['refresh_token']), allow_expired=True)
+            except (PyJWTError, JWTExtendedException) as e:
+                return jsonify({'error': 'Invalid refresh token', 'message': str(e)}), 400
+        
+        revocations = get_revocation_list()
+        revocations.revoke(get_jwt())
+        if refresh_payload is not None and refresh_payload.get('sub') == get_jwt_identity():
+            revocations.revoke(refresh_payload)
+        
+        return jsonify({'message': 'Logout successful'}), 200
+    
+    except Exception as e:
+        return jsonify({'error': 'Logout failed', 'message': str(e)}), 500
 
 
 @auth_bp.route('/update-profile', methods=['PUT'])
@@ -160,7 +213,7 @@ def update_profile():
     """Update user profile"""
     try:
         current_user_id = get_jwt_identity()
-        db = get_db()
+        storage = get_storage()
         
         data = request.json
         update_fields = {}
@@ -174,23 +227,21 @@ def update_profile():
         if not update_fields:
             return jsonify({'error': 'No valid fields to update'}), 400
         
-        from bson import ObjectId
-        result = db.users.update_one(
-            {'_id': ObjectId(current_user_id)},
-            {'$set': update_fields}
-        )
+        # None for a no-op update as well as for a missing user
+        user_data = storage.users.update_profile(current_user_id, update_fields)
+        
+        cache = get_user_cache()
+        cache.invalidate(current_user_id)
         
-        if result.modified_count == 0:
+        if user_data is None:
             return jsonify({'error': 'No changes made'}), 400
         
-        # Get updated user
-        user_data = db.users.find_one({'_id': ObjectId(current_user_id)})
-        user = User.from_dict(user_data)
+        _, user_json = cache.set(user_data)
         
         return jsonify({
             'message': 'Profile updated successfully',
-            'user': user.to_json()
+            'user': user_json
         }), 200
-        
+    
     except Exception as e:
         return jsonify({'error': 'Update failed', 'message': str(e)}), 500
\ No newline at end of file
@@ -0,0 +1,348 @@
+import json
+from datetime import datetime, timedelta
+import click
+from bson import ObjectId
+from flask import current_app
+from flask.cli import AppGroup
+from app.archive import archive_events
+from app.database import get_db, get_router, get_shard_db
+from app.storage import get_storage
+from app.migrations import (
+    INDEX_MIGRATIONS, current_version, latest_version, plan, migrate,
+    event_layout_checkpoint, event_layout_state, migrate_event_layout
+)
+from app.query_audit import DEFAULT_MAX_RATIO, audit, report_lines, sample_user
+from app.retention import EPOCH, compact_events, floor_hour, noisy_types, policy
+from app.sharding import (
+    DIRECTORY, HOME, MOVING_QUERY, USER_COLLECTIONS, move_in_progress, move_users, parse_shards, plan_moves
+)
+from app.storage.mongo import MongoEventRepository
+
+indexes_cli = AppGroup('indexes', help='Manage MongoDB indexes.')
+shards_cli = AppGroup('shards', help='Inspect and rebalance user shards.')
+archive_cli = AppGroup('archive', help='Move old events to the Parquet archive.')
+retention_cli = AppGroup('retention', help='Compact old raw events into rollups and sessions.')
+events_cli = AppGroup('events', help='Migrate stored events to the compact layout.')
+
+shard_option = click.option('--shard', default=None, help='Only this shard (default: every shard).')
+
+
+def _shards(only=None):
+    """(name, database) of every configured shard, home first"""
+    locations, _ = parse_shards(current_app.config)
+    if only is not None and only not in locations:
+        raise click.ClickException(f"Unknown shard: {only} (configured: {', '.join(locations)})")
+    return [(name, get_shard_db(name)) for name in locations if only in (None, name)]
+
+
+@indexes_cli.command('status')
+@shard_option
+def indexes_status(shard):
+    """Show the applied index version and what is pending."""
+    for name, db in _shards(shard):
+        applied = current_version(db)
+        
+        click.echo(f"Database: {db.name} (shard {name})")
+        click.echo(f"Applied version: {applied} (latest {latest_version()})")
+        
+        for version, collection, keys, options, action in plan(db):
+            click.echo(f"  v{version} {action:<8} {collection} {keys} {options or ''}")
+
+
+@indexes_cli.command('migrate')
+@click.option('--target', type=int, default=None, help='Stop at this version (default: latest).')
+@click.option('--dry-run', is_flag=True, help='Report what would be created without building.')
+@shard_option
+def indexes_migrate(target, dry_run, shard):
+    """Build missing indexes for pending versions, on every shard."""
+    conflicts = False
+    
+    for name, db in _shards(shard):
+        click.echo(f"Shard {name} ({db.name}):")
+        result = migrate(db, target=target, dry_run=dry_run, log=click.echo)
+        click.echo(json.dumps(result, indent=2))
+        conflicts = conflicts or bool(result['conflicts'])
+    
+    if conflicts:
+        raise SystemExit(1)
+
+
+@indexes_cli.command('list')
+def indexes_list():
+    """List every index version and its definitions."""
+    for migration in INDEX_MIGRATIONS:
+        click.echo(f"v{migration['version']}: {migration['description']}")
+        for collection, keys, options in migration['indexes']:
+            click.echo(f"  {collection} {keys} {options or ''}")
+        for collection, keys in migration.get('drop', []):
+            click.echo(f"  drop {collection} {keys}")
+
+
+@indexes_cli.command('audit')
+@click.option('--user-id', default=None, help='User whose data to query (default: the latest event\'s).')
+@click.option('--days', type=int, default=7, show_default=True, help='Range used by the analytics queries.')
+@click.option('--max-ratio', type=float, default=DEFAULT_MAX_RATIO, show_default=True,
+              help='Flag queries examining more keys/documents than this per result.')
+@click.option('--json', 'as_json', is_flag=True, help='Print the findings as JSON.')
+@click.option('--strict', is_flag=True, help='Exit 1 when any query shape is flagged.')
+def indexes_audit(user_id, days, max_ratio, as_json, strict):
+    """Explain every route query and flag scans, sorts and high examined ratios."""
+    user_id = user_id or sample_user(get_db())
+    if user_id is None:
+        raise click.ClickException('No events to audit against; load some data or pass --user-id.')
+    
+    # The user's own shard, where its events are
+    db = get_db(user_id=user_id)
+    findings = audit(db, user_id, days=days, max_ratio=max_ratio)
+    
+    if as_json:
+        click.echo(json.dumps(findings, indent=2, default=str))
+    else:
+        click.echo(f"Database: {db.name}, user {user_id}, "
+                   f"index version {current_version(db)}")
+        for line in report_lines(findings):
+            click.echo(line)
+    
+    if strict and any(finding['flags'] for finding in findings):
+        raise SystemExit(1)
+
+
+
+@shards_cli.command('status')
+def shards_status():
+    """Show each shard's share of the ring, users placed on it and documents held."""
+    router = get_router()
+    shares = router.ring.shares()
+    home = get_db()
+    placed = {row['_id']: row['users'] for row in home[DIRECTORY].aggregate(
+        [{'$group': {'_id': '$shard', 'users': {'$sum': 1}}}]
+    )}
+    # Users without a directory entry predate sharding and are at home
+    placed[HOME] = placed.get(HOME, 0) + home.users.estimated_document_count() - sum(placed.values())
+    moving = home[DIRECTORY].count_documents(MOVING_QUERY)
+    
+    click.echo(f"Ring: {', '.join(router.ring.shards)} ({router.ring.vnodes} vnodes each)")
+    click.echo(f"{'shard':<12}{'database':<28}{'ring':>8}{'users':>10}"
+               + ''.join(f"{collection:>12}" for collection in USER_COLLECTIONS))
+    for name, db in _shards():
+        share = f"{shares[name]:.1%}" if name in shares else '-'
+        click.echo(f"{name:<12}{db.name:<28}{share:>8}{placed.get(name, 0):>10}"
+                   + ''.join(f"{db[collection].estimated_document_count():>12}" for collection in USER_COLLECTIONS))
+    if moving:
+        click.echo(f"{moving} users mid-move (run flask shards rebalance to finish)")
+
+
+@shards_cli.command('locate')
+@click.argument('user_id')
+def shards_locate(user_id):
+    """Show where a user's data is and where the ring puts it."""
+    router = get_router()
+    entry = get_db()[DIRECTORY].find_one({'_id': ObjectId(user_id)}) or {}
+    
+    click.echo(f"Shard: {entry.get('shard', HOME)}{'' if entry else ' (no directory entry)'}")
+    click.echo(f"Ring owner: {router.owner(user_id)}")
+    for field in ('movingTo', 'movedFrom'):
+        if field in entry:
+            click.echo(f"{field}: {entry[field]}")
+
+
+@shards_cli.command('rebalance')
+@click.option('--limit', type=int, default=None, help='Move at most this many users.')
+@click.option('--batch-size', type=int, default=1000, show_default=True, help='Documents per insert.')
+@click.option('--grace', type=float, default=None,
+              help='Seconds to wait before deleting source copies (default: cache TTL + 5).')
+@click.option('--dry-run', is_flag=True, help='List the moves without making them.')
+def shards_rebalance(limit, batch_size, grace, dry_run):
+    """Move users whose shard is not their ring owner, while the app keeps serving."""
+    router = get_router()
+    home = get_db()
+    moves = plan_moves(router, home, limit=limit)
+    
+    summary = {}
+    for _, source, target in moves:
+        summary[(source, target)] = summary.get((source, target), 0) + 1
+    for (source, target), users in sorted(summary.items()):
+        click.echo(f"{source} -> {target}: {users} users")
+    
+    if dry_run:
+        return
+    
+    result = move_users(router, home, dict(_shards()), moves, grace_seconds=grace,
+                        batch_size=batch_size, log=click.echo)
+    click.echo(json.dumps(result, indent=2))
+    
+    if result['unverified']:
+        raise SystemExit(1)
+
+
+def _moving(user_id):
+    # Retention and archive runs leave users mid-move alone; `shards rebalance` carries their changes over
+    return move_in_progress(get_db(), user_id)
+
+
+def _archive():
+    archive = current_app.extensions.get('event_archive')
+    if archive is None:
+        # Archiving without federation would hide the moved events from analytics
+        raise click.ClickException('Set ARCHIVE_ENABLED=True (and install pyarrow) first')
+    if current_app.config['STORAGE_BACKEND'] != 'mongodb':
+        raise click.ClickException('Archiving moves events out of MongoDB; STORAGE_BACKEND is not mongodb')
+    return archive
+
+
+@archive_cli.command('run')
+@click.option('--older-than-days', type=int, default=None,
+              help='Archive events older than this (default: ARCHIVE_AFTER_DAYS).')
+@click.option('--limit', type=int, default=None, help='Archive at most this many users.')
+@click.option('--batch-size', type=int, default=1000, show_default=True, help='Hot copies deleted per request.')
+@click.option('--dry-run', is_flag=True, help='Count what would be archived without moving it.')
+@shard_option
+def archive_run(older_than_days, limit, batch_size, dry_run, shard):
+    """Move events older than the hot window into per-user, per-month Parquet files."""
+    archive = _archive()
+    days = older_than_days if older_than_days is not None else current_app.config['ARCHIVE_AFTER_DAYS']
+    before = datetime.utcnow() - timedelta(days=days)
+    click.echo(f"Archiving events before {before.isoformat()} to {archive.directory}")
+    
+    if dry_run:
+        for name, db in _shards(shard):
+            query = {'timestamp': {'$lt': before}}
+            click.echo(f"{name}: {db.events.count_documents(query)} events "
+                       f"of {len(db.events.distinct('userId', query))} users")
+        return
+    
+    result = archive_events(archive, _shards(shard), before, limit=limit, batch_size=batch_size, log=click.echo,
+                            strings=get_storage().strings, skip=_moving)
+    click.echo(json.dumps(result, indent=2))
+
+
+@archive_cli.command('status')
+@click.option('--user-id', default=None, help='Show one user\'s watermark and months.')
+def archive_status(user_id):
+    """Show archive size, or one user's watermark and archived months."""
+    archive = _archive()
+    
+    if user_id:
+        watermark = archive.watermark(user_id)
+        click.echo(f"Archived before: {watermark.isoformat() if watermark else 'nothing archived'}")
+        click.echo(f"Months: {', '.join(archive.months(user_id)) or '-'}")
+        return
+    
+    stats = archive.stats()
+    click.echo(f"{archive.directory}: {stats['users']} users, {stats['files']} files, {stats['bytes'] / 1e6:.1f} MB")
+
+
+def _retention_users(user_id):
+    if not current_app.config['RETENTION_ENABLED']:
+        # Compacting without federation would drop the folded events from analytics
+        raise click.ClickException('Set RETENTION_ENABLED=True first')
+    if user_id:
+        user = get_storage().users.find_by_id(user_id)
+        if user is None:
+            raise click.ClickException(f"Unknown user: {user_id}")
+        return [(user['_id'], user.get('settings') or {})]
+    return get_storage().users.settings()
+
+
+@retention_cli.command('compact')
+@click.option('--user-id', default=None, help='Only this user.')
+@click.option('--limit', type=int, default=None, help='Compact at most this many users.')
+@click.option('--batch-size', type=int, default=None, help='Raw events deleted per batch (default: RETENTION_BATCH_SIZE).')
+@click.option('--pause-ms', type=int, default=None,
+              help='Pause between delete batches (default: RETENTION_BATCH_PAUSE_MS).')
+@click.option('--dry-run', is_flag=True, help='Count expired events without compacting them.')
+def retention_compact(user_id, limit, batch_size, pause_ms, dry_run):
+    """Fold expired raw events into hourly rollups and sessions, then delete them."""
+    config = current_app.config
+    users = _retention_users(user_id)
+    
+    if dry_run:
+        noisy = noisy_types(config)
+        now = datetime.utcnow()
+        for uid, settings in users:
+            days, noisy_days = policy(config, settings)
+            if days is None and noisy_days is None:
+                continue
+            before = floor_hour(now - timedelta(days=days)) if days else EPOCH
+            noisy_before = max(floor_hour(now - timedelta(days=noisy_days)) if noisy_days else EPOCH, before)
+            expired = sum(1 for _ in get_storage('default', str(uid)).events.expired(str(uid), before, noisy, noisy_before))
+            if expired:
+                click.echo(f"{uid}: {expired} expired events (retention {days or '-'} days, noisy {noisy_days or '-'} days)")
+        return
+    
+    result = compact_events(
+        lambda uid: get_storage('default', uid), users, config, limit=limit,
+        batch_size=batch_size or config['RETENTION_BATCH_SIZE'],
+        pause=(pause_ms if pause_ms is not None else config['RETENTION_BATCH_PAUSE_MS']) / 1000,
+        log=click.echo, skip=_moving if config['STORAGE_BACKEND'] == 'mongodb' else None
+    )
+    click.echo(json.dumps(result, indent=2))
+
+
+@retention_cli.command('status')
+@click.option('--user-id', default=None, help='Only this user.')
+def retention_status(user_id):
+    """Show each compacted user's watermarks and rollup count."""
+    for uid, settings in _retention_users(user_id):
+        storage = get_storage('default', str(uid))
+        state = storage.rollups.state(str(uid))
+        if state is None:
+            if user_id:
+                click.echo(f"{uid}: not compacted yet")
+            continue
+        
+        days, noisy_days = policy(current_app.config, settings)
+        click.echo(
+            f"{uid}: compacted before {state['compactedBefore'].isoformat() if state['compactedBefore'] > EPOCH else '-'}, "
+            f"noisy before {state['noisyBefore'].isoformat() if state['noisyBefore'] > EPOCH else '-'} "
+            f"({storage.rollups.count(str(uid))} rollups; retention {days or '-'} days, noisy {noisy_days or '-'} days)"
+        )
+
+
+def _event_stores(shard):
+    """(name, event repository, database) wherever events are stored: every shard, or the SQLite file"""
+    if current_app.config['STORAGE_BACKEND'] != 'mongodb':
+        if shard is not None:
+            raise click.ClickException('--shard only applies to MongoDB')
+        return [('sqlite', get_storage().events, None)]
+    strings = get_storage().strings
+    return [(name, MongoEventRepository(db, strings), db) for name, db in _shards(shard)]
+
+
+@events_cli.command('migrate')
+@click.option('--batch-size', type=int, default=1000, show_default=True, help='Events rewritten per batch.')
+@click.option('--pause-ms', type=int, default=50, show_default=True, help='Pause between batches.')
+@click.option('--dry-run', is_flag=True, help='Count events in the old layout without rewriting them.')
+@shard_option
+def events_migrate(batch_size, pause_ms, dry_run, shard):
+    """Rewrite events stored in the old layout in the compact one, while serving."""
+    result = {}
+    for name, events, db in _event_stores(shard):
+        if dry_run:
+            click.echo(f"{name}: {events.count_legacy()} events in the old layout")
+            continue
+        
+        # MongoDB records how far a run got; SQLite rescans, skipping rows already rewritten
+        state = event_layout_state(db) if db is not None else None
+        after = state.get('after') if state else None
+        click.echo(f"{name}: {f'resuming after {after}' if after else 'from the first event'}")
+        result[name] = migrate_event_layout(
+            events, after, batch_size, pause_ms / 1000,
+            checkpoint=event_layout_checkpoint(db) if db is not None else None, log=click.echo
+        )
+    
+    if not dry_run:
+        click.echo(json.dumps(result, indent=2))
+
+
+@events_cli.command('status')
+@shard_option
+def events_status(shard):
+    """Show how many events are still in the old layout."""
+    for name, events, db in _event_stores(shard):
+        state = event_layout_state(db) if db is not None else None
+        progress = ''
+        if state:
+            progress = (f"; layout v{state['version']}, {state.get('rewritten', 0)} rewritten, "
+                        f"{'resumes after ' + str(state['after']) if state.get('after') else 'last pass complete'}")
+        click.echo(f"{name}: {events.count_legacy()} events in the old layout{progress}")
@@ -0,0 +1,192 @@
+import zlib
+from flask import request
+
+# Optional codecs: without them only gzip is offered
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Content types worth compressing: JSON and text (SSE included)
+COMPRESSIBLE_TYPES = ('application/json', 'text/')
+
+
+class GzipEncoder:
+    def __init__(self, level):
+        # wbits 31: gzip container
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    
+    def compress(self, data):
+        return self._compressor.compress(data)
+    
+    def flush(self):
+        """Emit everything buffered so far, so the client can decode it now"""
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+    
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+    
+    def compress(self, data):
+        return self._compressor.process(data)
+    
+    def flush(self):
+        return self._compressor.flush()
+    
+    def finish(self):
+        return self._compressor.finish()
+
+
+class ZstdEncoder:
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    
+    def compress(self, data):
+        return self._compressor.compress(data)
+    
+    def flush(self):
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+    
+    def finish(self):
+        return self._compressor.flush()
+
+
+# Content-Encoding token -> (encoder, config key of its level)
+ENCODERS = {'gzip': (GzipEncoder, 'COMPRESSION_GZIP_LEVEL')}
+if brotli is not None:
+    ENCODERS['br'] = (BrotliEncoder, 'COMPRESSION_BROTLI_LEVEL')
+if zstandard is not None:
+    ENCODERS['zstd'] = (ZstdEncoder, 'COMPRESSION_ZSTD_LEVEL')
+
+
+def compression_settings(config):
+    """Offered encodings (server preference order, installed codecs only), levels and size threshold"""
+    encodings = [name.strip() for name in config.get('COMPRESSION_ENCODINGS', 'gzip').split(',')]
+    encodings = [name for name in encodings if name in ENCODERS]
+    
+    return {
+        'encodings': encodings,
+        'levels': {name: config.get(ENCODERS[name][1]) for name in encodings},
+        'min_size': config.get('COMPRESSION_MIN_SIZE', 1024)
+    }
+
+
+def new_encoder(encoding, settings):
+    encoder, _ = ENCODERS[encoding]
+    return encoder(settings['levels'][encoding])
+
+
+def negotiate(accept_encoding, offered):
+    """
+    Pick the encoding for a response from the request's Accept-Encoding
+    
+    The client's q-values win; ties go to the earlier entry in `offered`.
+    `*` covers codings the client did not list, and q=0 refuses one.
+    
+    Returns:
+        str: a Content-Encoding token from `offered`, or None for identity
+    """
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+    
+    wildcard = accepted.get('*', 0.0)
+    best, best_quality = None, 0.0
+    for coding in offered:
+        quality = accepted.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    
+    return best
+
+
+def compressible(status, content_type, content_encoding, cache_control):
+    """Whether a response may be re-encoded at all (before size and negotiation)"""
+    return (
+        200 <= status and status not in (204, 304)
+        and not content_encoding
+        and 'no-transform' not in (cache_control or '')
+        and (content_type or '').startswith(COMPRESSIBLE_TYPES)
+    )
+
+
+def compress_chunks(chunks, encoder, close=None):
+    """Compress a stream chunk by chunk, flushing each so streamed events are not held back"""
+    try:
+        for chunk in chunks:
+            if chunk:
+                yield encoder.compress(chunk) + encoder.flush()
+        yield encoder.finish()
+    finally:
+        if close is not None:
+            close()
+
+
+def init_compression(app):
+    """
+    Compress JSON and text responses with the best encoding the client accepts
+    
+    Buffered responses smaller than COMPRESSION_MIN_SIZE go out as they
+    are; streamed ones (SSE) are always compressed, flushed per chunk.
+    Register after init_metrics: after_request hooks run in reverse order,
+    so the metrics hook sees the bytes actually sent.
+    """
+    
+    if not app.config.get('COMPRESSION_ENABLED'):
+        return
+    
+    settings = compression_settings(app.config)
+    
+    @app.after_request
+    def compress_response(response):
+        if request.method == 'HEAD' or response.direct_passthrough or not compressible(
+            response.status_code,
+            response.mimetype,
+            response.headers.get('Content-Encoding'),
+            response.headers.get('Cache-Control')
+        ):
+            return response
+        
+        response.vary.add('Accept-Encoding')
+        encoding = negotiate(request.headers.get('Accept-Encoding'), settings['encodings'])
+        if encoding is None:
+            return response
+        
+        if response.is_streamed:
+            original = response.response
+            response.response = compress_chunks(
+                response.iter_encoded(), new_encoder(encoding, settings), getattr(original, 'close', None)
+            )
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < settings['min_size']:
+                return response
+            
+            encoder = new_encoder(encoding, settings)
+            response.set_data(encoder.compress(data) + encoder.finish())
+        
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -12,9 +12,76 @@ class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
     DEBUG = os.getenv('DEBUG', 'True') == 'True'
     
+    # Storage backend: 'mongodb', or 'sqlite' for a single-node install without MongoDB
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'mongodb')
+    SQLITE_PATH = os.getenv('SQLITE_PATH', 'tracker.db')
+    # How long a write waits for another worker's transaction before failing
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    
+    # Cold tier: events older than ARCHIVE_AFTER_DAYS move (flask archive run) to per-user, per-month
+    # Parquet files under ARCHIVE_DIR, and analytics ranges reaching past that include them
+    ARCHIVE_ENABLED = os.getenv('ARCHIVE_ENABLED', 'False') == 'True'
+    ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', 'archive')
+    ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 30))
+    ARCHIVE_COMPRESSION = os.getenv('ARCHIVE_COMPRESSION', 'zstd')
+    
+    # Retention: `flask retention compact` folds raw events older than RETENTION_DAYS (a user's
+    # settings.retention_days overrides it) into hourly rollups and sessions, then deletes them.
+    # Noisy types only matter in aggregate and go after RETENTION_NOISY_DAYS. 0 keeps events raw.
+    RETENTION_ENABLED = os.getenv('RETENTION_ENABLED', 'False') == 'True'
+    RETENTION_DAYS = int(os.getenv('RETENTION_DAYS', 90))
+    RETENTION_NOISY_DAYS = int(os.getenv('RETENTION_NOISY_DAYS', 7))
+    RETENTION_NOISY_TYPES = [
+        name.strip() for name in os.getenv('RETENTION_NOISY_TYPES', 'WINDOW_FOCUS_CHANGED,IDLE_STATE_CHANGED').split(',')
+        if name.strip()
+    ]
+    # Raw events deleted per batch, and the pause between batches
+    RETENTION_BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', 1000))
+    RETENTION_BATCH_PAUSE_MS = int(os.getenv('RETENTION_BATCH_PAUSE_MS', 100))
+    
+    # Interning: new events store 64-bit ids of their url and title, each string kept once in a
+    # `strings` dictionary; each worker resolves its STRING_CACHE_SIZE hottest strings from memory
+    STRING_INTERNING_ENABLED = os.getenv('STRING_INTERNING_ENABLED', 'False') == 'True'
+    STRING_CACHE_SIZE = int(os.getenv('STRING_CACHE_SIZE', 100000))
+    
+    # Ingest admission control: per-user token buckets on /events/sync, refilled at these rates up to
+    # INGEST_RATE_BURST_SECONDS of them (0 turns a limit off); over the limit a sync gets 429 + Retry-After.
+    # 'memory' keeps the buckets in each worker (each admits the full rate), 'shared' in the database.
+    INGEST_RATE_LIMIT_ENABLED = os.getenv('INGEST_RATE_LIMIT_ENABLED', 'False') == 'True'
+    INGEST_RATE_EVENTS_PER_SECOND = float(os.getenv('INGEST_RATE_EVENTS_PER_SECOND', 100))
+    INGEST_RATE_BYTES_PER_SECOND = float(os.getenv('INGEST_RATE_BYTES_PER_SECOND', 262144))
+    INGEST_RATE_BURST_SECONDS = float(os.getenv('INGEST_RATE_BURST_SECONDS', 60))
+    INGEST_RATE_LIMIT_STORE = os.getenv('INGEST_RATE_LIMIT_STORE', 'memory')
+    INGEST_RATE_LIMIT_MAX_USERS = int(os.getenv('INGEST_RATE_LIMIT_MAX_USERS', 100000))
+    
     # MongoDB
     MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
     MONGODB_DB_NAME = os.getenv('MONGODB_DB_NAME', 'browser_telemetry')
+    # Connection pool, per worker process (0 = driver default for the timeouts)
+    MONGODB_MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', 50))
+    MONGODB_MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', 0))
+    MONGODB_MAX_IDLE_TIME_MS = int(os.getenv('MONGODB_MAX_IDLE_TIME_MS', 300000))
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS', 0))
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', 5000))
+    # Workload classes get separate clients (pools) per worker; False shares the default one
+    MONGODB_WORKLOAD_ISOLATION = os.getenv('MONGODB_WORKLOAD_ISOLATION', 'True') == 'True'
+    # Ingest (/events/sync): pool and write concern ('' = server default, '1', 'majority', ...)
+    MONGODB_INGEST_MAX_POOL_SIZE = int(os.getenv('MONGODB_INGEST_MAX_POOL_SIZE', 20))
+    MONGODB_INGEST_WRITE_CONCERN = os.getenv('MONGODB_INGEST_WRITE_CONCERN', '')
+    MONGODB_INGEST_WTIMEOUT_MS = int(os.getenv('MONGODB_INGEST_WTIMEOUT_MS', 0))
+    # Analytics (event reads, analytics, AI data): pool, read preference, time limit (0 = none)
+    MONGODB_ANALYTICS_MAX_POOL_SIZE = int(os.getenv('MONGODB_ANALYTICS_MAX_POOL_SIZE', 20))
+    MONGODB_ANALYTICS_READ_PREFERENCE = os.getenv('MONGODB_ANALYTICS_READ_PREFERENCE', 'secondaryPreferred')
+    MONGODB_ANALYTICS_MAX_TIME_MS = int(os.getenv('MONGODB_ANALYTICS_MAX_TIME_MS', 30000))
+    # Apply pending index migrations in the background at app start (else: flask indexes migrate)
+    MONGODB_CREATE_INDEXES = os.getenv('MONGODB_CREATE_INDEXES', 'False') == 'True'
+    # Shards for users' events/insights: 'name=uri;...' ('home' alone = MONGODB_URI); empty = home only
+    MONGODB_SHARDS = os.getenv('MONGODB_SHARDS', '')
+    # Shards (comma-separated) that take no new users; flask shards rebalance empties them
+    MONGODB_SHARDS_DRAINING = os.getenv('MONGODB_SHARDS_DRAINING', '')
+    MONGODB_SHARD_VNODES = int(os.getenv('MONGODB_SHARD_VNODES', 128))
+    # How long a worker trusts a cached user -> shard lookup (bounds how long a move takes to be seen)
+    MONGODB_SHARD_CACHE_TTL_SECONDS = float(os.getenv('MONGODB_SHARD_CACHE_TTL_SECONDS', 30))
     
     # JWT
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'dev-jwt-secret-key-change-in-production')
@@ -23,6 +90,18 @@ class Config:
     JWT_TOKEN_LOCATION = ['headers']
     JWT_HEADER_NAME = 'Authorization'
     JWT_HEADER_TYPE = 'Bearer'
+    # How often each worker pulls new revocations (logout propagation delay)
+    JWT_REVOCATION_REFRESH_SECONDS = float(os.getenv('JWT_REVOCATION_REFRESH_SECONDS', 5))
+    
+    # Password hashing (bcrypt on a bounded process pool; 0 = inline)
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+    BCRYPT_POOL_SIZE = int(os.getenv('BCRYPT_POOL_SIZE', 2))
+    BCRYPT_QUEUE_DEPTH = int(os.getenv('BCRYPT_QUEUE_DEPTH', 32))
+    BCRYPT_TIMEOUT_SECONDS = float(os.getenv('BCRYPT_TIMEOUT_SECONDS', 10))
+    
+    # In-process user cache for /auth/me (0 disables)
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 1024))
+    USER_CACHE_TTL_SECONDS = float(os.getenv('USER_CACHE_TTL_SECONDS', 30))
     
     # CORS
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:3000').split(',')
@@ -30,25 +109,75 @@ class Config:
     # Gemini AI
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
     
+    # LLM backend ('gemini' or 'fake' for offline tests/benchmarks)
+    LLM_PROVIDER = os.getenv('LLM_PROVIDER', 'gemini')
+    LLM_MODEL = os.getenv('LLM_MODEL', 'gemini-pro')
+    LLM_COALESCE = os.getenv('LLM_COALESCE', 'True') == 'True'
+    LLM_FAKE_LATENCY_MS = int(os.getenv('LLM_FAKE_LATENCY_MS', 0))
+    
+    # LLM deadlines and circuit breaker
+    LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', 20))
+    LLM_STREAM_TIMEOUT_SECONDS = float(os.getenv('LLM_STREAM_TIMEOUT_SECONDS', 60))
+    LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 8))
+    LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv('LLM_BREAKER_FAILURE_THRESHOLD', 5))
+    LLM_BREAKER_SLOW_CALL_SECONDS = float(os.getenv('LLM_BREAKER_SLOW_CALL_SECONDS', 10))
+    LLM_BREAKER_RESET_SECONDS = float(os.getenv('LLM_BREAKER_RESET_SECONDS', 30))
+    LLM_FALLBACK_CACHE_SIZE = int(os.getenv('LLM_FALLBACK_CACHE_SIZE', 256))
+    
+    # Rule-based domain categories (JSON file; built-in rules if unset)
+    DOMAIN_CATEGORIES_FILE = os.getenv('DOMAIN_CATEGORIES_FILE', '')
+    
     # Server
     HOST = os.getenv('HOST', '0.0.0.0')
     PORT = int(os.getenv('PORT', 5000))
+    
+    # ASGI mode (asgi.py): threads for the Flask routes bridged over WSGI
+    ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', 10))
+    
+    # Logging: one writer thread per worker; hot paths are sampled, slow requests always logged
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')  # 'text' or 'json'
+    LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', 1.0))
+    LOG_SLOW_REQUEST_MS = float(os.getenv('LOG_SLOW_REQUEST_MS', 1000))
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+    
+    # Prometheus metrics at GET /metrics (multi-worker: set PROMETHEUS_MULTIPROC_DIR)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+    
+    # Response compression, negotiated from Accept-Encoding (br/zstd need brotli/zstandard)
+    COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'True') == 'True'
+    COMPRESSION_ENCODINGS = os.getenv('COMPRESSION_ENCODINGS', 'zstd,br,gzip')  # server preference order
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))  # bytes; smaller bodies are sent as is
+    COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', 6))
+    COMPRESSION_BROTLI_LEVEL = int(os.getenv('COMPRESSION_BROTLI_LEVEL', 4))
+    COMPRESSION_ZSTD_LEVEL = int(os.getenv('COMPRESSION_ZSTD_LEVEL', 3))
 
 
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
+    MONGODB_MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', 10))
+    MONGODB_CREATE_INDEXES = os.getenv('MONGODB_CREATE_INDEXES', 'True') == 'True'
 
 
 class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
+    # Keep a few warm connections per worker and fail fast when the pool is exhausted
+    MONGODB_MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', 2))
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS', 2000))
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+    LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', 0.01))
 
 
 class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     MONGODB_DB_NAME = 'browser_telemetry_test'
+    MONGODB_MAX_POOL_SIZE = 10
+    LLM_PROVIDER = 'fake'
+    BCRYPT_ROUNDS = 4
+    BCRYPT_POOL_SIZE = 0
 
 
 # Configuration dictionary
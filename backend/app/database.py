@@ -0,0 +1,394 @@
+import os
+import re
+import threading
+import time
+from pymongo import MongoClient, ReadPreference, WriteConcern
+from pymongo.monitoring import ConnectionPoolListener
+from app.metrics import MONGODB_POOL_IN_USE, MONGODB_POOL_MAX_SIZE, MONGODB_POOL_WAIT_SECONDS, command_metrics
+from app.sharding import DIRECTORY, HOME, ShardRouter, parse_shards
+
+# Upper bounds (ms) of the pool wait-time histogram buckets
+WAIT_BUCKETS_MS = [1, 5, 10, 50, 100, 500, 1000, float('inf')]
+
+# Workload classes. Each gets its own client, and so its own connection pool,
+# per process: a 90-day dashboard aggregation cannot take the connections
+# /events/sync needs. Routes pick theirs with get_db(workload).
+WORKLOADS = ('default', 'ingest', 'analytics')
+
+
+class PoolMetrics(ConnectionPoolListener):
+    """
+    Connection pool counters for this process
+    
+    Wait time is measured from check-out start to the connection being
+    handed over (or the check-out failing), i.e. how long a request queued
+    for a connection. A growing wait with `in_use` pinned at maxPoolSize
+    means the pool is too small for the worker's concurrency.
+    """
+    
+    def __init__(self, workload='default'):
+        self.workload = workload
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.checkout_failures = {}
+            self.in_use = 0
+            self.connections_open = 0
+            self.connections_created = 0
+            self.connections_closed = 0
+            self.pool_clears = 0
+            self.wait_total_ms = 0.0
+            self.wait_max_ms = 0.0
+            self.wait_buckets = [0] * len(WAIT_BUCKETS_MS)
+        MONGODB_POOL_IN_USE.labels(self.workload).set(0)
+    
+    def _wait_started(self):
+        self._local.started = time.perf_counter()
+    
+    def _wait_ended(self):
+        started = getattr(self._local, 'started', None)
+        self._local.started = None
+        return (time.perf_counter() - started) * 1000 if started is not None else 0.0
+    
+    def connection_check_out_started(self, event):
+        self._wait_started()
+    
+    def connection_checked_out(self, event):
+        waited = self._wait_ended()
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.wait_total_ms += waited
+            self.wait_max_ms = max(self.wait_max_ms, waited)
+            for i, bound in enumerate(WAIT_BUCKETS_MS):
+                if waited <= bound:
+                    self.wait_buckets[i] += 1
+                    break
+        MONGODB_POOL_IN_USE.labels(self.workload).inc()
+        MONGODB_POOL_WAIT_SECONDS.labels(self.workload).observe(waited / 1000)
+    
+    def connection_check_out_failed(self, event):
+        self._wait_ended()
+        with self._lock:
+            reason = str(event.reason)
+            self.checkout_failures[reason] = self.checkout_failures.get(reason, 0) + 1
+    
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use = max(0, self.in_use - 1)
+        MONGODB_POOL_IN_USE.labels(self.workload).dec()
+    
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+            self.connections_open += 1
+    
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_closed += 1
+            self.connections_open = max(0, self.connections_open - 1)
+    
+    def connection_ready(self, event):
+        pass
+    
+    def pool_created(self, event):
+        pass
+    
+    def pool_ready(self, event):
+        pass
+    
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+    
+    def pool_closed(self, event):
+        pass
+    
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'checkout_failures': dict(self.checkout_failures),
+                'in_use': self.in_use,
+                'connections_open': self.connections_open,
+                'connections_created': self.connections_created,
+                'connections_closed': self.connections_closed,
+                'pool_clears': self.pool_clears,
+                'wait_ms': {
+                    'total': round(self.wait_total_ms, 3),
+                    'avg': round(self.wait_total_ms / self.checkouts, 3) if self.checkouts else 0,
+                    'max': round(self.wait_max_ms, 3),
+                    'buckets': [
+                        {'le': 'inf' if bound == float('inf') else bound, 'count': count}
+                        for bound, count in zip(WAIT_BUCKETS_MS, self.wait_buckets)
+                    ]
+                }
+            }
+
+
+def workload_settings(config, workload='default'):
+    """
+    Pool size, read preference, write concern and time limit of a workload class
+    
+    ingest: MONGODB_INGEST_* pool and write concern (empty: server default).
+    analytics: MONGODB_ANALYTICS_* pool, read preference and time limit.
+    default (auth, status, CLI): MONGODB_MAX_POOL_SIZE, primary, no limit.
+    """
+    settings = {
+        'max_pool_size': config.get('MONGODB_MAX_POOL_SIZE', 100),
+        'read_preference': 'primary',
+        'write_concern': '',
+        'max_time_ms': 0
+    }
+    
+    if workload == 'ingest':
+        settings['max_pool_size'] = config.get('MONGODB_INGEST_MAX_POOL_SIZE', settings['max_pool_size'])
+        settings['write_concern'] = config.get('MONGODB_INGEST_WRITE_CONCERN', '')
+    elif workload == 'analytics':
+        settings['max_pool_size'] = config.get('MONGODB_ANALYTICS_MAX_POOL_SIZE', settings['max_pool_size'])
+        settings['read_preference'] = config.get('MONGODB_ANALYTICS_READ_PREFERENCE', 'primary')
+        settings['max_time_ms'] = config.get('MONGODB_ANALYTICS_MAX_TIME_MS', 0)
+    elif workload != 'default':
+        raise ValueError(f"Unknown workload class: {workload}")
+    
+    return settings
+
+
+def client_options(config, workload='default'):
+    """MongoClient / AsyncIOMotorClient keyword arguments from app config"""
+    settings = workload_settings(config, workload)
+    options = {
+        'maxPoolSize': settings['max_pool_size'],
+        'minPoolSize': config.get('MONGODB_MIN_POOL_SIZE', 0),
+        'serverSelectionTimeoutMS': config.get('MONGODB_SERVER_SELECTION_TIMEOUT_MS', 5000),
+        'event_listeners': [pool_metrics[workload]]
+    }
+    
+    if config.get('METRICS_ENABLED'):
+        options['event_listeners'].append(command_metrics)
+    
+    # 0 leaves the driver default (no limit)
+    if config.get('MONGODB_MAX_IDLE_TIME_MS'):
+        options['maxIdleTimeMS'] = config['MONGODB_MAX_IDLE_TIME_MS']
+    if config.get('MONGODB_WAIT_QUEUE_TIMEOUT_MS'):
+        options['waitQueueTimeoutMS'] = config['MONGODB_WAIT_QUEUE_TIMEOUT_MS']
+    # Client-side operation timeout; the server gets the remainder as maxTimeMS
+    if settings['max_time_ms']:
+        options['timeoutMS'] = settings['max_time_ms']
+    
+    return options
+
+
+def database_options(config, workload='default'):
+    """get_database() keyword arguments (read preference, write concern) for a workload class"""
+    settings = workload_settings(config, workload)
+    # 'secondaryPreferred' -> ReadPreference.SECONDARY_PREFERRED
+    mode = re.sub(r'(?<!^)([A-Z])', r'_\1', settings['read_preference']).upper()
+    options = {'read_preference': getattr(ReadPreference, mode)}
+    
+    w = settings['write_concern']
+    if w:
+        wtimeout = config.get('MONGODB_INGEST_WTIMEOUT_MS', 0) if workload == 'ingest' else 0
+        options['write_concern'] = WriteConcern(w=int(w) if w.isdigit() else w, wtimeout=wtimeout or None)
+    
+    return options
+
+
+# Global state: settings are recorded at app creation, clients are created per process on first use
+pool_metrics = {workload: PoolMetrics(workload) for workload in WORKLOADS}
+router = None
+_settings = None
+_clients = {}  # (owner workload, uri) -> MongoClient
+_dbs = {}  # (workload, shard) -> Database
+_pid = None
+_lock = threading.Lock()
+
+
+def init_db(app):
+    """
+    Record connection settings; the clients themselves are created lazily
+    
+    Nothing here connects, so `create_app` neither blocks on MongoDB nor
+    leaves a client to be inherited across a gunicorn fork: each worker
+    creates its clients on first use. Indexes are managed out of band
+    (`flask indexes migrate`); with MONGODB_CREATE_INDEXES on, pending
+    index versions are applied on a background thread instead, on every
+    shard.
+    """
+    global _settings, router
+    
+    locations, members = parse_shards(app.config)
+    router = ShardRouter(
+        members,
+        locations,
+        vnodes=app.config.get('MONGODB_SHARD_VNODES', 128),
+        cache_ttl=app.config.get('MONGODB_SHARD_CACHE_TTL_SECONDS', 30)
+    )
+    _settings = {
+        'shards': locations,
+        'uri': app.config['MONGODB_URI'],
+        'db_name': app.config['MONGODB_DB_NAME'],
+        'isolated': app.config.get('MONGODB_WORKLOAD_ISOLATION', True),
+        'options': {workload: client_options(app.config, workload) for workload in WORKLOADS},
+        'databases': {workload: database_options(app.config, workload) for workload in WORKLOADS},
+        'workloads': {workload: workload_settings(app.config, workload) for workload in WORKLOADS}
+    }
+    close_db()
+    
+    if app.config.get('MONGODB_CREATE_INDEXES'):
+        from app.migrations import migrate_in_background
+        
+        migrate_in_background(
+            [(location['uri'], location['db_name']) for location in locations.values()],
+            app.logger,
+            app.config.get('MONGODB_SERVER_SELECTION_TIMEOUT_MS', 5000)
+        )
+
+
+def _owner(workload):
+    """Workload whose client serves `workload` (all share 'default' without isolation)"""
+    return workload if _settings['isolated'] else 'default'
+
+
+def get_db(workload='default', user_id=None):
+    """
+    Get database instance for a workload class
+    
+    Without `user_id` this is the home database (users, tokens, the shard
+    directory). With it, the shard holding that user's events and insights.
+    Creates this process's client for the class on first use. Without
+    MONGODB_WORKLOAD_ISOLATION every class shares the default client but
+    keeps its read preference and write concern.
+    """
+    if user_id is None or _settings is None:
+        return get_shard_db(HOME, workload)
+    return get_shard_db(router.locate(user_id, get_shard_db(HOME)[DIRECTORY]), workload)
+
+
+def get_shard_db(shard, workload='default'):
+    """Get a shard's database instance for a workload class"""
+    global _pid
+    
+    db = _dbs.get((workload, shard))
+    if db is not None and _pid == os.getpid():
+        return db
+    
+    with _lock:
+        if _pid != os.getpid():
+            # Inherited from the parent: never reuse (or close) another process's clients
+            _clients.clear()
+            _dbs.clear()
+            _pid = os.getpid()
+        
+        if (workload, shard) not in _dbs:
+            if _settings is None:
+                return None
+            
+            # Shards on the same deployment share a client (and pool)
+            location = _settings['shards'][shard]
+            key = (_owner(workload), location['uri'])
+            if key not in _clients:
+                _clients[key] = MongoClient(location['uri'], **_settings['options'][key[0]])
+                MONGODB_POOL_MAX_SIZE.labels(key[0]).inc(_settings['options'][key[0]]['maxPoolSize'])
+            _dbs[(workload, shard)] = _clients[key].get_database(
+                location['db_name'], **_settings['databases'][workload]
+            )
+    
+    return _dbs[(workload, shard)]
+
+
+def get_client(workload='default'):
+    """Get this process's MongoClient of the home database for a workload class"""
+    get_db(workload)
+    return _clients.get((_owner(workload), _settings['uri'])) if _settings else None
+
+
+def get_router():
+    """The shard router set up by init_db"""
+    return router
+
+
+def assign_shard(user_id):
+    """Place a new user on its ring owner (home when sharding is off)"""
+    return router.assign(user_id, get_db()[DIRECTORY])
+
+
+def close_db():
+    """Close this process's clients"""
+    global _pid
+    
+    with _lock:
+        if _pid == os.getpid():
+            for client in _clients.values():
+                client.close()
+            for workload in WORKLOADS:
+                MONGODB_POOL_MAX_SIZE.labels(workload).set(0)
+        _clients.clear()
+        _dbs.clear()
+        _pid = None
+
+
+def reset_after_fork():
+    """
+    Forget state inherited from the parent process
+    
+    A MongoClient must not be used (or closed) across fork, and a lock held
+    by another parent thread at fork time would never be released, so the
+    child starts from scratch and connects on its first query.
+    """
+    global _pid, _lock
+    
+    _lock = threading.Lock()
+    _clients.clear()
+    _dbs.clear()
+    _pid = None
+    for workload, metrics in pool_metrics.items():
+        metrics.__init__(workload)
+        MONGODB_POOL_MAX_SIZE.labels(workload).set(0)
+    if router is not None:
+        router.reset_after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_after_fork)
+
+
+def pool_stats():
+    """Pool settings and metrics for this worker process, per workload class"""
+    workloads = {}
+    
+    for workload in WORKLOADS:
+        options = _settings['options'][workload] if _settings else {}
+        settings = _settings['workloads'][workload] if _settings else {}
+        owner = _owner(workload) if _settings else workload
+        workloads[workload] = {
+            'connected': any(key[0] == workload for key in _dbs) and _pid == os.getpid(),
+            'client': owner,
+            'max_pool_size': options.get('maxPoolSize'),
+            'min_pool_size': options.get('minPoolSize'),
+            'max_idle_time_ms': options.get('maxIdleTimeMS'),
+            'wait_queue_timeout_ms': options.get('waitQueueTimeoutMS'),
+            'read_preference': settings.get('read_preference'),
+            'write_concern': settings.get('write_concern') or None,
+            'max_time_ms': settings.get('max_time_ms') or None,
+            **pool_metrics[workload].snapshot()
+        }
+        if options.get('maxPoolSize'):
+            # One pool per shard deployment the class has connected to
+            clients = sum(1 for key in _clients if key[0] == owner) if _pid == os.getpid() else 0
+            capacity = options['maxPoolSize'] * max(clients, 1)
+            workloads[workload]['saturation'] = round(workloads[workload]['in_use'] / capacity, 3)
+    
+    return {
+        'pid': os.getpid(),
+        'isolated': _settings['isolated'] if _settings else None,
+        'workloads': workloads,
+        'shards': {
+            **router.stats(),
+            'connected': sorted({shard for _, shard in _dbs}) if _pid == os.getpid() else []
+        } if router else None
+    }
@@ -0,0 +1,168 @@
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+from bson import ObjectId
+from app.models.event import SCHEMA_VERSION, compact_payload
+
+# Events with a domain. extract_domain() stores a host string or None, and
+# unlike `$ne: None` this matches the partial domain index's filter exactly.
+HAS_DOMAIN = {'$type': 'string'}
+
+# On a host whose clock is UTC all year (the usual server setup),
+# datetime.fromtimestamp() gives naive UTC, so an extension event's ts is
+# already its stored timestamp in milliseconds
+UTC_CLOCK = time.timezone == 0 and time.altzone == 0
+
+# Events stored before the compact layout (app/models/event.py) have no version field
+LEGACY_QUERY = {'v': {'$exists': False}}
+
+
+def extract_domain(url):
+    """Host part of a URL (None when missing or unparseable)"""
+    if not url:
+        return None
+    
+    try:
+        # urlparse() would only split ;params off the path as well
+        return urlsplit(url).netloc or None
+    except ValueError:
+        return None
+
+
+def build_event_documents(user_id, events):
+    """
+    Convert extension events into MongoDB documents, in the compact layout (app/models/event.py)
+    
+    Returns:
+        tuple: (documents, errors) where errors describe skipped events
+    """
+    user_oid = ObjectId(user_id)
+    event_documents = []
+    errors = []
+    
+    for i, ext_event in enumerate(events):
+        try:
+            # Simple direct conversion
+            ts = ext_event.get('ts', 0)
+            timestamp_ms = None
+            if ts:
+                timestamp = datetime.fromtimestamp(ts / 1000)
+                if UTC_CLOCK and type(ts) is int:
+                    timestamp_ms = ts
+            else:
+                timestamp = datetime.utcnow()
+            
+            payload = ext_event.get('payload', {})
+            
+            # Built in the compact layout directly rather than by compacting a version 1 document
+            event_doc = compact_payload({
+                'userId': user_oid,
+                'type': ext_event.get('type', 'UNKNOWN'),
+                'timestamp': timestamp,
+                'domain': extract_domain(payload.get('url')),
+                'v': SCHEMA_VERSION
+            }, payload, timestamp_ms)
+            event_documents.append(event_doc)
+        
+        except Exception as e:
+            errors.append(f"Event {i+1} failed: {str(e)}")
+    
+    return event_documents, errors
+
+
+def apply_date_filter(query, args):
+    """Add a timestamp range from ?start_date= / ?end_date= to a query"""
+    start_date = args.get('start_date')
+    end_date = args.get('end_date')
+    
+    if start_date or end_date:
+        query['timestamp'] = {}
+        if start_date:
+            query['timestamp']['$gte'] = datetime.fromisoformat(start_date)
+        if end_date:
+            query['timestamp']['$lte'] = datetime.fromisoformat(end_date)
+    
+    return query
+
+
+def events_query(user_id, args):
+    """Filter for GET /events/ (date range, type and domain)"""
+    query = apply_date_filter({'userId': ObjectId(user_id)}, args)
+    
+    event_type = args.get('type')
+    if event_type:
+        query['type'] = event_type
+    
+    domain = args.get('domain')
+    if domain:
+        query['domain'] = domain
+    
+    return query
+
+
+def recent_query(user_id, hours):
+    """Filter for events in the last N hours"""
+    threshold = datetime.utcnow() - timedelta(hours=hours)
+    
+    return {
+        'userId': ObjectId(user_id),
+        'timestamp': {'$gte': threshold}
+    }
+
+
+def top_domains_pipeline(user_id, limit):
+    """All-time top domains with last visit"""
+    return [
+        {'$match': {
+            'userId': ObjectId(user_id),
+            'domain': HAS_DOMAIN
+        }},
+        {'$group': {
+            '_id': '$domain',
+            'count': {'$sum': 1},
+            'lastVisit': {'$max': '$timestamp'}
+        }},
+        {'$sort': {'count': -1}},
+        {'$limit': limit}
+    ]
+
+
+def format_top_domains(results):
+    return [
+        {
+            'domain': r['_id'],
+            'count': r['count'],
+            'lastVisit': r['lastVisit'].isoformat() if r['lastVisit'] else None
+        }
+        for r in results
+    ]
+
+
+def expired_query(user_id, before, noisy_types=(), noisy_before=None, inserted_before=None):
+    """
+    Filter for events a retention run folds into rollups (app/retention.py)
+    
+    Everything older than `before`, plus noisy types older than
+    `noisy_before`; with `inserted_before`, only events stored before it
+    (an ObjectId holds its creation second).
+    """
+    expired = [{'timestamp': {'$lt': before}}]
+    if noisy_types and noisy_before is not None:
+        expired.append({'type': {'$in': list(noisy_types)}, 'timestamp': {'$lt': noisy_before}})
+    
+    query = {'userId': ObjectId(user_id), '$or': expired}
+    if inserted_before is not None:
+        query['_id'] = {'$lt': ObjectId.from_datetime(inserted_before)}
+    return query
+
+
+def event_stats_pipeline(match_query):
+    """Event counts by type"""
+    return [
+        {'$match': match_query},
+        {'$group': {
+            '_id': '$type',
+            'count': {'$sum': 1}
+        }},
+        {'$sort': {'count': -1}}
+    ]
@@ -0,0 +1,203 @@
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from flask import current_app
+from pymongo.errors import PyMongoError
+from app.metrics import record_rate_limit
+from app.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+
+class IngestLimiter:
+    """
+    Per-user token buckets on /events/sync: one for events, one for request bytes
+    
+    Each bucket refills at its rate per second, up to `burst_seconds` of
+    it. A sync takes its event count and body size from both buckets or
+    from neither: when either is short, it is refused with the seconds
+    until both would cover it. A batch larger than a bucket passes once
+    the bucket is full and leaves it in debt, so the long-run rate holds
+    whatever the batch size.
+    
+    Buckets live in the worker (an LRU of `max_users`), so each worker
+    admits up to the full rate. With a shared store (a callable returning
+    the storage's RateLimitRepository) every worker takes from the same
+    buckets, by compare-and-swap; when the store fails or stays contended
+    the worker's own buckets decide.
+    """
+    
+    # Compare-and-swap attempts before falling back to the worker's buckets
+    SWAP_ATTEMPTS = 3
+    
+    # Storage errors that fall back to the worker's buckets
+    STORAGE_ERRORS = (PyMongoError, sqlite3.Error)
+    
+    def __init__(self, rates, burst_seconds=60, max_users=100000, store=None):
+        # A rate of 0 turns that limit off
+        self.rates = {name: float(rate) for name, rate in rates.items() if rate and rate > 0}
+        self.capacities = {name: rate * burst_seconds for name, rate in self.rates.items()}
+        self.max_users = max_users
+        self.store = store
+        
+        self._buckets = OrderedDict()  # user id -> (levels, monotonic time)
+        self._lock = threading.Lock()
+    
+    @property
+    def enabled(self):
+        return bool(self.rates)
+    
+    def _take(self, state, costs, now):
+        """
+        Refill a state's buckets to `now` and take `costs` from them
+        
+        Returns:
+            tuple: (new levels, 0, None) or (None, seconds to wait, name of the limit that is short)
+        """
+        levels, at = state if state is not None else ({}, now)
+        elapsed = max(0.0, now - at)
+        taken, waits = {}, {}
+        
+        for name, rate in self.rates.items():
+            capacity = self.capacities[name]
+            level = min(capacity, levels.get(name, capacity) + elapsed * rate)
+            cost = costs.get(name, 0)
+            if level < min(cost, capacity):
+                waits[name] = (min(cost, capacity) - level) / rate
+            taken[name] = level - cost
+        
+        if waits:
+            limit = max(waits, key=waits.get)
+            return None, waits[limit], limit
+        return taken, 0, None
+    
+    def _acquire_local(self, user_id, costs):
+        now = time.monotonic()
+        
+        with self._lock:
+            levels, wait, limit = self._take(self._buckets.get(user_id), costs, now)
+            if levels is not None:
+                self._buckets[user_id] = (levels, now)
+                self._buckets.move_to_end(user_id)
+                while len(self._buckets) > self.max_users:
+                    self._buckets.popitem(last=False)
+        
+        return wait, limit
+    
+    def _full_at(self, levels, now):
+        """When every bucket would be full again: the shared state can expire then"""
+        seconds = max(
+            (self.capacities[name] - level) / self.rates[name] for name, level in levels.items()
+        ) if levels else 0
+        return datetime.utcfromtimestamp(now + seconds)
+    
+    def _acquire_shared(self, user_id, costs):
+        """(seconds to wait, limit) from the shared buckets, or None to fall back to the worker's"""
+        repository = self.store()
+        
+        for _ in range(self.SWAP_ATTEMPTS):
+            current = repository.get(user_id)
+            now = time.time()
+            state = (current['levels'], current['at']) if current else None
+            levels, wait, limit = self._take(state, costs, now)
+            if levels is None:
+                return wait, limit
+            
+            version = current['version'] if current else None
+            if repository.swap(user_id, version, {
+                'levels': levels,
+                'at': now,
+                'version': (version or 0) + 1,
+                'expiresAt': self._full_at(levels, now)
+            }):
+                return 0, None
+        
+        return None
+    
+    def acquire(self, user_id, events, size):
+        """
+        Take a sync of `events` events and `size` bytes from a user's buckets
+        
+        Returns:
+            int: 0 when admitted, else the whole seconds to wait (Retry-After)
+        """
+        if not self.enabled:
+            return 0
+        
+        costs = {'events': events, 'bytes': size}
+        result = None
+        if self.store is not None:
+            try:
+                result = self._acquire_shared(str(user_id), costs)
+            except self.STORAGE_ERRORS as e:
+                logger.warning(f"Rate limit store failed, using this worker's buckets: {str(e)}")
+            if result is None:
+                record_rate_limit('fallback')
+        if result is None:
+            result = self._acquire_local(str(user_id), costs)
+        
+        wait, limit = result
+        if not limit:
+            record_rate_limit('admitted')
+            return 0
+        
+        retry_after = max(1, math.ceil(wait))
+        record_rate_limit('limited', limit, retry_after)
+        return retry_after
+    
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+    
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+
+
+def limited_body(retry_after):
+    """Body of a 429 sync response (sent with a Retry-After header)"""
+    return {
+        'error': 'Too many events',
+        'message': f'Ingest rate limit exceeded; retry in {retry_after}s',
+        'retry_after': retry_after
+    }
+
+
+# Global instance
+ingest_limiter = None
+
+
+def get_ingest_limiter(config=None):
+    """Get or create the ingest limiter from `config` (default: the Flask app config)"""
+    global ingest_limiter
+    
+    if ingest_limiter is None:
+        config = config if config is not None else current_app.config
+        rates = {
+            'events': config.get('INGEST_RATE_EVENTS_PER_SECOND', 0),
+            'bytes': config.get('INGEST_RATE_BYTES_PER_SECOND', 0)
+        }
+        store = config.get('INGEST_RATE_LIMIT_STORE', 'memory')
+        if store not in ('memory', 'shared'):
+            raise ValueError(f"Unknown INGEST_RATE_LIMIT_STORE: {store!r} (expected 'memory' or 'shared')")
+        ingest_limiter = IngestLimiter(
+            rates=rates if config.get('INGEST_RATE_LIMIT_ENABLED') else {},
+            burst_seconds=config.get('INGEST_RATE_BURST_SECONDS', 60),
+            max_users=config.get('INGEST_RATE_LIMIT_MAX_USERS', 100000),
+            store=(lambda: get_storage().rate_limits) if store == 'shared' else None
+        )
+    
+    return ingest_limiter
+
+
+def _reset_after_fork():
+    if ingest_limiter is not None:
+        ingest_limiter.reset_after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
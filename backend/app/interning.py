@@ -0,0 +1,184 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from app.models.event import COMPACT_FIELDS, INTERNED_FIELDS
+
+# Shorter strings stay inline: an id and its dictionary entry would cost more than they save
+MIN_INTERNED_LENGTH = 16
+
+# Inline string key <-> id key of the interned fields
+_ID_KEYS = {COMPACT_FIELDS[field]: key for field, key in INTERNED_FIELDS.items()}
+_STRING_KEYS = {key: inline for inline, key in _ID_KEYS.items()}
+
+
+def string_id(value):
+    """A string's 64-bit id: the first 8 bytes of its BLAKE2b digest, signed so it fits a BSON long"""
+    digest = hashlib.blake2b(value.encode('utf-8', 'surrogatepass'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+class StringCache:
+    """
+    Per-process LRU of interned strings keyed by id
+    
+    The string stored under an id never changes, so entries need no TTL
+    and one cache serves every shard and request of the process.
+    """
+    
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get_many(self, ids):
+        """{id: string} of the ids that are cached"""
+        found = {}
+        
+        with self._lock:
+            for key in ids:
+                value = self._entries.get(key)
+                if value is None:
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(key)
+                self.hits += 1
+                found[key] = value
+        
+        return found
+    
+    def set_many(self, strings):
+        if self.max_entries <= 0:
+            return
+        
+        with self._lock:
+            for key, value in strings.items():
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+    
+    def stats(self):
+        return {
+            'cached_strings': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+# The process's cache and whether new events are interned, set by init_interning()
+string_cache = StringCache()
+_enabled = False
+
+
+def init_interning(config):
+    """Size the string cache and turn interning on or off from the app config"""
+    global string_cache, _enabled
+    
+    string_cache = StringCache(config.get('STRING_CACHE_SIZE', 100000))
+    _enabled = bool(config.get('STRING_INTERNING_ENABLED'))
+
+
+def _reset_after_fork():
+    string_cache.reset_after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class StringDictionary:
+    """
+    Interned URLs and titles: a StringRepository behind the process's StringCache
+    
+    Compact events (app/models/event.py) can store the id of their url and
+    title in place of the string, which is then stored once however many
+    events repeat it. Ids are hashes, so interning needs no round trip to
+    allocate one, and hot strings are resolved without leaving the
+    process. Should two strings ever share an id, the one stored second
+    stays inline in its events.
+    
+    Reads always resolve ids; `enabled` (STRING_INTERNING_ENABLED) only
+    decides whether new events are interned.
+    """
+    
+    def __init__(self, repository, cache=None, enabled=None):
+        self.repository = repository
+        self.cache = cache if cache is not None else string_cache
+        self.enabled = _enabled if enabled is None else enabled
+    
+    def resolve(self, ids):
+        """{id: string} of the ids stored, from the cache where possible"""
+        found = self.cache.get_many(ids)
+        missing = [key for key in ids if key not in found]
+        if missing:
+            stored = self.repository.find(missing)
+            self.cache.set_many(stored)
+            found.update(stored)
+        return found
+    
+    def intern(self, values):
+        """{string: id} of `values`, storing those not stored yet; a string whose id is taken is left out"""
+        ids = {value: string_id(value) for value in values}
+        known = self.resolve(set(ids.values()))
+        
+        new = {key: value for value, key in ids.items() if key not in known}
+        if new:
+            taken = self.repository.insert(new)
+            if taken:
+                # Stored meanwhile by another writer, which may have had another string
+                stored = self.repository.find(list(taken))
+                self.cache.set_many(stored)
+                known.update(stored)
+            stored = {key: value for key, value in new.items() if key not in taken}
+            self.cache.set_many(stored)
+            known.update(stored)
+        
+        return {value: key for value, key in ids.items() if known.get(key) == value}
+    
+    def intern_documents(self, documents):
+        """Swap the long urls and titles of compact event documents for their ids, in place"""
+        if not self.enabled:
+            return documents
+        
+        values = {
+            document[key] for document in documents for key in _ID_KEYS
+            if isinstance(document.get(key), str) and len(document[key]) >= MIN_INTERNED_LENGTH
+        }
+        if not values:
+            return documents
+        
+        ids = self.intern(values)
+        for document in documents:
+            for inline, interned in _ID_KEYS.items():
+                value = document.get(inline)
+                if isinstance(value, str) and value in ids:
+                    del document[inline]
+                    document[interned] = ids[value]
+        return documents
+    
+    def resolve_documents(self, documents):
+        """Put the strings back in place of interned ids in event documents, in place"""
+        ids = {document[key] for document in documents for key in _STRING_KEYS if key in document}
+        if not ids:
+            return documents
+        
+        strings = self.resolve(ids)
+        for document in documents:
+            for interned, inline in _STRING_KEYS.items():
+                if interned in document:
+                    # An id without a string is shown as is rather than dropped
+                    key = document.pop(interned)
+                    document[inline] = strings.get(key, key)
+        return documents
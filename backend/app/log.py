@@ -0,0 +1,218 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from flask import g, request
+from flask.logging import default_handler
+
+# Reserved LogRecord attribute carrying structured fields (`extra={'fields': {...}}`)
+FIELDS_ATTR = 'fields'
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and the record's fields"""
+    
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            **getattr(record, FIELDS_ATTR, {})
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        
+        return json.dumps(entry, default=str)
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Human-readable line with the record's fields appended as key=value"""
+    
+    def __init__(self):
+        super().__init__('[%(asctime)s] %(levelname)s in %(name)s: %(message)s')
+    
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, FIELDS_ATTR, None)
+        if not fields:
+            return line
+        
+        head, sep, tail = line.partition('\n')
+        pairs = ' '.join(f"{key}={json.dumps(value, default=str)}" for key, value in fields.items())
+        return f"{head} {pairs}{sep}{tail}"
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Hand records to the writer thread without ever blocking the caller
+    
+    The queue is bounded; when the writer falls behind, new records are
+    dropped and counted instead of stalling request threads on stdout.
+    """
+    
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+    
+    def prepare(self, record):
+        # Same-process queue: pass the record through, formatting happens on the writer thread
+        return record
+    
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class StageTimer:
+    """Wall time (ms) of consecutive named stages of one request"""
+    
+    def __init__(self):
+        self.started = self._last = time.perf_counter()
+        self.stages = {}
+    
+    def mark(self, stage):
+        """Close the stage that has been running since the previous mark"""
+        now = time.perf_counter()
+        self.stages[stage] = round((now - self._last) * 1000, 3)
+        self._last = now
+    
+    @property
+    def total_ms(self):
+        return round((time.perf_counter() - self.started) * 1000, 3)
+
+
+# Global state (one writer thread per process)
+_settings = {'sample_rate': 1.0, 'slow_ms': 1000}
+_handler = None
+_listener = None
+
+
+def configure_logging(app):
+    """
+    Route the `app` logger tree through a queue to a single writer thread
+    
+    Request threads only enqueue; formatting (JSON or key=value) and the
+    stdout write happen on the writer. Call before anything else logs.
+    """
+    global _handler
+    
+    _settings['sample_rate'] = app.config.get('LOG_SAMPLE_RATE', 1.0)
+    _settings['slow_ms'] = app.config.get('LOG_SLOW_REQUEST_MS', 1000)
+    
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if app.config.get('LOG_FORMAT') == 'json' else KeyValueFormatter())
+    
+    logger = logging.getLogger('app')
+    if _handler is not None:
+        logger.removeHandler(_handler)
+    logger.removeHandler(default_handler)
+    
+    _stop_listener()
+    _handler = DroppingQueueHandler(queue.Queue(app.config.get('LOG_QUEUE_SIZE', 10000)))
+    _start_listener(stream)
+    
+    logger.addHandler(_handler)
+    logger.setLevel(app.config.get('LOG_LEVEL', 'INFO'))
+    logger.propagate = False
+    
+    init_slow_request_log(app)
+
+
+def _start_listener(*handlers):
+    global _listener
+    
+    _listener = QueueListener(_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop_listener():
+    global _listener
+    
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def restart_after_fork():
+    """The writer thread does not survive fork: give the child a fresh queue and writer"""
+    if _listener is None:
+        return
+    
+    _handler.queue = queue.Queue(_handler.queue.maxsize)
+    _handler.dropped = 0
+    _start_listener(*_listener.handlers)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=restart_after_fork)
+
+# Flush what is queued on interpreter exit
+atexit.register(_stop_listener)
+
+
+def dropped_records():
+    return _handler.dropped if _handler is not None else 0
+
+
+def sampled():
+    rate = _settings['sample_rate']
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+def log_timed(logger, message, timer, fields, detail=None):
+    """
+    Log one hot-path request with its stage timings
+    
+    Requests slower than LOG_SLOW_REQUEST_MS are always logged, at WARNING
+    and with `detail` (payload samples, error lists); the rest are logged
+    at INFO for a LOG_SAMPLE_RATE fraction of calls, without detail.
+    """
+    total_ms = timer.total_ms
+    slow = total_ms >= _settings['slow_ms']
+    if not slow and not sampled():
+        return
+    
+    record = {**fields, 'stages_ms': timer.stages, 'total_ms': total_ms}
+    if slow:
+        logger.warning(message, extra={FIELDS_ATTR: {**record, 'slow': True, **(detail or {})}})
+    else:
+        logger.info(message, extra={FIELDS_ATTR: record})
+
+
+def init_slow_request_log(app):
+    """Log every request slower than LOG_SLOW_REQUEST_MS, whatever the route"""
+    
+    logger = logging.getLogger('app.requests')
+    
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+    
+    @app.after_request
+    def log_slow_request(response):
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+        
+        duration_ms = round((time.perf_counter() - started) * 1000, 3)
+        if duration_ms >= _settings['slow_ms']:
+            logger.warning('slow request', extra={FIELDS_ATTR: {
+                'method': request.method,
+                'path': request.path,
+                'query': request.query_string.decode('utf-8', 'replace'),
+                'route': request.url_rule.rule if request.url_rule is not None else None,
+                'status': response.status_code,
+                'duration_ms': duration_ms,
+                'request_bytes': request.content_length or 0,
+                'remote_addr': request.remote_addr
+            }})
+        return response
@@ -0,0 +1,212 @@
+import os
+import time
+from flask import Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess
+)
+from pymongo.monitoring import CommandListener
+
+# Under gunicorn every worker writes its samples to its own files in
+# PROMETHEUS_MULTIPROC_DIR and /metrics merges them, so any worker can
+# answer a scrape. Without the directory, samples stay in process memory.
+
+REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds',
+    'Time spent handling a request, by blueprint and route',
+    ['blueprint', 'route', 'method', 'status']
+)
+REQUEST_BYTES = Counter(
+    'http_request_bytes',
+    'Request body bytes received',
+    ['blueprint', 'route']
+)
+RESPONSE_BYTES = Counter(
+    'http_response_bytes',
+    'Response body bytes sent (streamed WSGI responses are not counted)',
+    ['blueprint', 'route']
+)
+EVENTS_INGESTED = Counter(
+    'events_ingested',
+    'Browser events received by /api/events/sync',
+    ['outcome']
+)
+INGEST_RATE_LIMIT = Counter(
+    'ingest_rate_limit_decisions',
+    'Syncs the per-user rate limiter admitted or refused (by the limit that refused them), '
+    'and shared-store fallbacks',
+    ['outcome', 'limit']
+)
+INGEST_RETRY_AFTER_SECONDS = Histogram(
+    'ingest_rate_limit_retry_after_seconds',
+    'Retry-After sent with refused syncs',
+    buckets=(1, 2, 5, 10, 30, 60, 120, 300, 600)
+)
+MONGODB_COMMAND_SECONDS = Histogram(
+    'mongodb_command_duration_seconds',
+    'MongoDB command round-trip time',
+    ['command', 'collection', 'outcome'],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5)
+)
+MONGODB_DOCS_RETURNED = Histogram(
+    'mongodb_command_docs_returned',
+    'Documents returned per cursor batch or distinct call',
+    ['command', 'collection'],
+    buckets=(0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+)
+MONGODB_POOL_IN_USE = Gauge(
+    'mongodb_pool_connections_in_use',
+    'Connections checked out, by workload class (summed over workers)',
+    ['workload'],
+    multiprocess_mode='livesum'
+)
+MONGODB_POOL_MAX_SIZE = Gauge(
+    'mongodb_pool_max_size',
+    'maxPoolSize of connected clients, by workload class (summed over workers)',
+    ['workload'],
+    multiprocess_mode='livesum'
+)
+MONGODB_POOL_WAIT_SECONDS = Histogram(
+    'mongodb_pool_wait_seconds',
+    'Time spent waiting to check out a connection, by workload class',
+    ['workload'],
+    buckets=(.001, .005, .01, .05, .1, .5, 1, 5)
+)
+LLM_CALL_SECONDS = Histogram(
+    'llm_call_duration_seconds',
+    'Upstream LLM call time (streams: until the last chunk)',
+    ['provider', 'operation', 'outcome'],
+    buckets=(.1, .25, .5, 1, 2.5, 5, 10, 20, 30, 60)
+)
+
+# Label for requests that matched no route, so 404 scans cannot blow up cardinality
+UNMATCHED_ROUTE = '<unmatched>'
+
+
+def observe_request(blueprint, route, method, status, seconds, request_bytes=0, response_bytes=None):
+    """Record one handled request (shared by the Flask hooks and the ASGI middleware)"""
+    REQUEST_SECONDS.labels(blueprint, route, method, str(status)).observe(seconds)
+    if request_bytes:
+        REQUEST_BYTES.labels(blueprint, route).inc(request_bytes)
+    if response_bytes:
+        RESPONSE_BYTES.labels(blueprint, route).inc(response_bytes)
+
+
+def record_events_ingested(inserted, rejected):
+    """Count events stored and events skipped as invalid by one sync"""
+    if inserted:
+        EVENTS_INGESTED.labels('inserted').inc(inserted)
+    if rejected:
+        EVENTS_INGESTED.labels('rejected').inc(rejected)
+
+
+def record_rate_limit(outcome, limit='', retry_after=None):
+    """Count one ingest limiter decision: admitted, limited (by `limit`) or fallback"""
+    INGEST_RATE_LIMIT.labels(outcome, limit).inc()
+    if retry_after is not None:
+        INGEST_RETRY_AFTER_SECONDS.observe(retry_after)
+
+
+def observe_llm_call(provider, operation, outcome, seconds):
+    LLM_CALL_SECONDS.labels(provider, operation, outcome).observe(seconds)
+
+
+class CommandMetrics(CommandListener):
+    """
+    Per-command MongoDB latency and result sizes
+    
+    The collection is only present on the started event, so it is parked
+    by (connection, request id) until the reply arrives. Dict set/pop are
+    atomic, so no lock is taken on the query path.
+    """
+    
+    def __init__(self):
+        self._pending = {}
+    
+    def started(self, event):
+        self._pending[(event.connection_id, event.request_id)] = _collection_name(event)
+    
+    def succeeded(self, event):
+        collection = self._pending.pop((event.connection_id, event.request_id), '')
+        MONGODB_COMMAND_SECONDS.labels(event.command_name, collection, 'success').observe(
+            event.duration_micros / 1e6
+        )
+        
+        docs = _docs_returned(event.reply)
+        if docs is not None:
+            MONGODB_DOCS_RETURNED.labels(event.command_name, collection).observe(docs)
+    
+    def failed(self, event):
+        collection = self._pending.pop((event.connection_id, event.request_id), '')
+        MONGODB_COMMAND_SECONDS.labels(event.command_name, collection, 'failure').observe(
+            event.duration_micros / 1e6
+        )
+
+
+def _collection_name(event):
+    # getMore names its collection in a field; most commands use the command's own value
+    target = event.command.get('collection' if event.command_name == 'getMore' else event.command_name)
+    return target if isinstance(target, str) else ''
+
+
+def _docs_returned(reply):
+    cursor = reply.get('cursor')
+    if isinstance(cursor, dict):
+        batch = cursor.get('firstBatch', cursor.get('nextBatch'))
+        return len(batch) if batch is not None else None
+    if isinstance(reply.get('values'), list):
+        return len(reply['values'])
+    return None
+
+
+command_metrics = CommandMetrics()
+
+
+def render_metrics():
+    """Prometheus text exposition for this process, or all workers in multiprocess mode"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    
+    return generate_latest(registry)
+
+
+def init_metrics(app):
+    """Time every request and serve GET /metrics"""
+    
+    if not app.config.get('METRICS_ENABLED'):
+        return
+    
+    @app.before_request
+    def start_timer():
+        g.metrics_started = time.perf_counter()
+    
+    @app.after_request
+    def record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is None or request.endpoint == 'metrics':
+            return response
+        
+        rule = request.url_rule
+        observe_request(
+            request.blueprint or '',
+            rule.rule if rule is not None else UNMATCHED_ROUTE,
+            request.method,
+            response.status_code,
+            time.perf_counter() - started,
+            request.content_length or 0,
+            None if response.is_streamed else response.calculate_content_length()
+        )
+        return response
+    
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(render_metrics(), content_type=CONTENT_TYPE_LATEST)
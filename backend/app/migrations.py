@@ -0,0 +1,306 @@
+import threading
+import time
+from datetime import datetime
+from pymongo import IndexModel, MongoClient
+from app.models.event import SCHEMA_VERSION
+
+# Applied version is tracked here (one document per migration stream)
+MIGRATIONS_COLLECTION = 'schema_migrations'
+INDEXES_STATE_ID = 'indexes'
+EVENT_LAYOUT_STATE_ID = 'event_layout'
+
+# Versioned index set. Append a new version instead of editing one that has
+# been applied; each entry is (collection, keys, options). A version may also
+# list indexes it supersedes under 'drop' as (collection, keys); they are
+# dropped after the version's new indexes are built.
+INDEX_MIGRATIONS = [
+    {
+        'version': 1,
+        'description': 'Baseline users, events, sessions and insights indexes',
+        'indexes': [
+            ('users', [('email', 1)], {'unique': True}),
+            ('events', [('userId', 1), ('timestamp', -1)], {}),
+            ('events', [('timestamp', 1)], {}),
+            ('events', [('type', 1)], {}),
+            ('events', [('domain', 1)], {}),
+            ('sessions', [('userId', 1), ('startTime', -1)], {}),
+            ('sessions', [('domain', 1)], {}),
+            ('insights', [('userId', 1), ('date', -1)], {}),
+        ]
+    },
+    {
+        'version': 2,
+        'description': 'Revoked tokens: unique jti, incremental sync by revokedAt, TTL on expiry',
+        'indexes': [
+            ('revoked_tokens', [('jti', 1)], {'unique': True}),
+            ('revoked_tokens', [('revokedAt', 1)], {}),
+            ('revoked_tokens', [('expiresAt', 1)], {'expireAfterSeconds': 0}),
+        ]
+    },
+    {
+        'version': 3,
+        'description': 'Events: compound indexes for the route query shapes (flask indexes audit)',
+        'indexes': [
+            # Every range/dashboard/AI query: equality on userId, sort and range on
+            # timestamp; type and domain ride along so the aggregations are covered
+            ('events', [('userId', 1), ('timestamp', -1), ('type', 1), ('domain', 1)], {}),
+            # GET /events/?type= lists rare types without scanning the whole range
+            ('events', [('userId', 1), ('type', 1), ('timestamp', -1)], {}),
+            # All-time top domains: only events that have a domain are indexed
+            ('events', [('userId', 1), ('domain', 1), ('timestamp', -1)],
+             {'partialFilterExpression': {'domain': {'$type': 'string'}}}),
+        ],
+        'drop': [
+            # Prefix of the first index above
+            ('events', [('userId', 1), ('timestamp', -1)]),
+            # No route filters on these without userId
+            ('events', [('timestamp', 1)]),
+            ('events', [('type', 1)]),
+            ('events', [('domain', 1)]),
+        ]
+    },
+    {
+        'version': 4,
+        'description': 'Retention: hourly rollups and per-user compaction state (flask retention compact)',
+        'indexes': [
+            # One rollup per (user, hour, run); federated ranges read by user and hour
+            ('event_rollups', [('userId', 1), ('hour', 1), ('first', 1)], {'unique': True}),
+            ('compaction_state', [('userId', 1)], {'unique': True}),
+        ]
+    },
+    {
+        'version': 5,
+        'description': 'Shared ingest rate limits: expire each state once its buckets are full again',
+        'indexes': [
+            ('rate_limits', [('expiresAt', 1)], {'expireAfterSeconds': 0}),
+        ]
+    }
+]
+
+# Index options that must match for an existing index to count as the same
+_COMPARED_OPTIONS = ['unique', 'sparse', 'expireAfterSeconds', 'partialFilterExpression']
+
+
+def latest_version():
+    return INDEX_MIGRATIONS[-1]['version'] if INDEX_MIGRATIONS else 0
+
+
+def current_version(db):
+    """Index version recorded in the database (0 if never migrated)"""
+    state = db[MIGRATIONS_COLLECTION].find_one({'_id': INDEXES_STATE_ID})
+    return state['version'] if state else 0
+
+
+def _normalize_keys(keys):
+    return [(field, direction) for field, direction in keys]
+
+
+def _compare_options(options):
+    return {name: options[name] for name in _COMPARED_OPTIONS if options.get(name) not in (None, False)}
+
+
+def _find(existing, keys):
+    """Name of the index with this key pattern, or None"""
+    keys = _normalize_keys(keys)
+    
+    for name, info in existing.items():
+        if _normalize_keys(info['key']) == keys:
+            return name
+    
+    return None
+
+
+def _classify(existing, keys, options):
+    """Return 'exists', 'create' or 'conflict' for one wanted index"""
+    name = _find(existing, keys)
+    if name is None:
+        return 'create'
+    
+    # Same key pattern: identical only if the behavioural options agree
+    return 'exists' if _compare_options(existing[name]) == _compare_options(options) else 'conflict'
+
+
+def plan(db, target=None):
+    """
+    Work out what migrating to `target` (default: latest) would do
+    
+    Returns:
+        list: (version, collection, keys, options, action) for every index in
+        the pending versions, where action is 'exists', 'create' or 'conflict',
+        or for superseded indexes 'drop' (present) or 'absent'
+    """
+    applied = current_version(db)
+    target = latest_version() if target is None else target
+    existing = {}
+    steps = []
+    
+    for migration in INDEX_MIGRATIONS:
+        if not applied < migration['version'] <= target:
+            continue
+        
+        for collection, keys, options in migration['indexes']:
+            if collection not in existing:
+                existing[collection] = db[collection].index_information()
+            action = _classify(existing[collection], keys, options)
+            if action == 'create':
+                # Later versions in the same run see it as built
+                existing[collection][f"pending:{keys}"] = {'key': keys, **options}
+            steps.append((migration['version'], collection, keys, options, action))
+        
+        for collection, keys in migration.get('drop', []):
+            if collection not in existing:
+                existing[collection] = db[collection].index_information()
+            name = _find(existing[collection], keys)
+            if name is not None:
+                del existing[collection][name]
+            steps.append((migration['version'], collection, keys, {}, 'drop' if name else 'absent'))
+    
+    return steps
+
+
+def migrate(db, target=None, dry_run=False, log=print):
+    """
+    Apply pending index versions up to `target`
+    
+    Indexes that already match are skipped. Missing ones are created with
+    one createIndexes command per collection, so each collection is scanned
+    once per version; builds are non-blocking on MongoDB 4.2+ (older servers
+    honour `background`). Indexes a version supersedes are dropped only
+    after its new ones are built. A key pattern that exists with different options
+    is a conflict: it is reported, the version is not recorded, and
+    migration stops so it can be resolved by hand.
+    
+    Returns:
+        dict: from/to versions and the created, skipped and conflicting indexes
+    """
+    applied = current_version(db)
+    target = latest_version() if target is None else target
+    result = {'from': applied, 'to': applied, 'created': [], 'dropped': [], 'skipped': [], 'conflicts': []}
+    
+    steps = plan(db, target)
+    
+    for migration in INDEX_MIGRATIONS:
+        version = migration['version']
+        version_steps = [step for step in steps if step[0] == version]
+        if not version_steps:
+            continue
+        
+        conflicts = [step for step in version_steps if step[4] == 'conflict']
+        if conflicts:
+            for _, collection, keys, _, _ in conflicts:
+                log(f"v{version} conflict: {collection} {keys} exists with different options")
+                result['conflicts'].append(f"{collection}:{keys}")
+            break
+        
+        by_collection = {}
+        drops = []
+        for _, collection, keys, options, action in version_steps:
+            label = f"{collection}:{keys}"
+            if action in ('exists', 'absent'):
+                result['skipped'].append(label)
+            elif action == 'drop':
+                drops.append((collection, keys))
+                result['dropped'].append(label)
+            else:
+                by_collection.setdefault(collection, []).append(IndexModel(keys, background=True, **options))
+                result['created'].append(label)
+        
+        log(f"v{version} {migration['description']}: "
+            f"{sum(len(m) for m in by_collection.values())} to create, {len(drops)} to drop, "
+            f"{sum(1 for step in version_steps if step[4] == 'exists')} already present")
+        
+        if dry_run:
+            result['to'] = version
+            continue
+        
+        for collection, models in by_collection.items():
+            db[collection].create_indexes(models)
+        for collection, keys in drops:
+            db[collection].drop_index(keys)
+        
+        db[MIGRATIONS_COLLECTION].update_one(
+            {'_id': INDEXES_STATE_ID},
+            {
+                '$set': {'version': version, 'updatedAt': datetime.utcnow()},
+                '$push': {'history': {'version': version, 'appliedAt': datetime.utcnow()}}
+            },
+            upsert=True
+        )
+        result['to'] = version
+    
+    return result
+
+
+def migrate_in_background(databases, logger, server_selection_timeout_ms=5000):
+    """
+    Apply pending index versions on a daemon thread with short-lived clients
+    
+    `databases` is a list of (uri, db_name), one per shard; each is
+    migrated in turn and a failure on one does not stop the others.
+    """
+    
+    def run():
+        for uri, db_name in databases:
+            client = MongoClient(uri, serverSelectionTimeoutMS=server_selection_timeout_ms)
+            try:
+                result = migrate(client[db_name], log=logger.info)
+                logger.info(f"Index migration ({db_name}): v{result['from']} -> v{result['to']}, "
+                            f"{len(result['created'])} created, {len(result['dropped'])} dropped, "
+                            f"{len(result['skipped'])} skipped")
+            except Exception as e:
+                logger.error(f"Index migration failed ({db_name}): {str(e)}")
+            finally:
+                client.close()
+    
+    thread = threading.Thread(target=run, name='index-migration', daemon=True)
+    thread.start()
+    return thread
+
+
+def event_layout_state(db):
+    """{version, after, rewritten, updatedAt} of the event layout migration, or None before it ran"""
+    return db[MIGRATIONS_COLLECTION].find_one({'_id': EVENT_LAYOUT_STATE_ID})
+
+
+def event_layout_checkpoint(db):
+    """Record migrate_event_layout() progress in a shard's database, so a later run resumes there"""
+    
+    def checkpoint(after, rewritten):
+        db[MIGRATIONS_COLLECTION].update_one(
+            {'_id': EVENT_LAYOUT_STATE_ID},
+            {
+                # The version is recorded once a pass reaches the end
+                '$set': {'version': SCHEMA_VERSION if after is None else 1, 'after': after,
+                         'updatedAt': datetime.utcnow()},
+                '$inc': {'rewritten': rewritten}
+            },
+            upsert=True
+        )
+    
+    return checkpoint
+
+
+def migrate_event_layout(events, after=None, batch_size=1000, pause=0.0, checkpoint=None, log=print):
+    """
+    Rewrite events stored in the version 1 layout in the compact one (app/models/event.py)
+    
+    Online: reads accept both layouts and new events are written compact,
+    so routes and ingest carry on while it runs. Events are rewritten
+    `batch_size` at a time in _id order, sleeping `pause` seconds between
+    batches; `checkpoint(after, rewritten)` is called after each one, so an
+    interrupted run can resume after the last id it reached.
+    
+    Returns:
+        int: events rewritten
+    """
+    total = 0
+    while True:
+        rewritten, after = events.compact_legacy(after, batch_size)
+        total += rewritten
+        if checkpoint is not None:
+            checkpoint(after, rewritten)
+        if after is None:
+            return total
+        
+        log(f"  {total} rewritten, up to {after}")
+        time.sleep(pause)
@@ -1,19 +1,138 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from bson import ObjectId
-from urllib.parse import urlparse
+from urllib.parse import urlsplit
+
+# Stored event layout. Version 1 (no `v`) kept url, title, tabId and
+# windowId at the top level and again in `payload`, the extension's record
+# (which also repeats type and ts). Version 2 keeps each once: the queried
+# fields under their own names, so every index and aggregation reads both
+# layouts, and the rest of the payload under short keys.
+SCHEMA_VERSION = 2
+
+# Payload field -> version 2 key, in the order the extension sends them
+COMPACT_FIELDS = {'tabId': 'tb', 'windowId': 'wi', 'url': 'ur', 'title': 'ti'}
+
+# Version 2 key for what is left of the payload
+EXTRA_FIELD = 'px'
+
+# Payload field -> version 2 key of its interned string id, which takes the
+# place of the string itself (app/interning.py)
+INTERNED_FIELDS = {'url': 'uh', 'title': 'th'}
+
+# Keys only the version 2 layout has
+_COMPACT_KEYS = frozenset([*COMPACT_FIELDS.values(), *INTERNED_FIELDS.values(), 'v', EXTRA_FIELD])
+
+_COMPACT_ITEMS = tuple(COMPACT_FIELDS.items())
+
+# Payload fields a version 2 document can hold without EXTRA_FIELD
+_PAYLOAD_FIELDS = frozenset([*COMPACT_FIELDS, 'type', 'ts'])
+
+_EPOCH = datetime(1970, 1, 1)
+_MILLISECOND = timedelta(milliseconds=1)
+
+
+def _ms(timestamp):
+    """Milliseconds since the epoch of a stored (naive UTC) timestamp, exactly"""
+    return (timestamp - _EPOCH) // _MILLISECOND
+
+
+def compact_payload(document, payload, timestamp_ms=None):
+    """
+    Store an extension payload in a version 2 document, in place
+    
+    The queried fields go under their short keys and the rest under
+    EXTRA_FIELD, less the payload's type and ts when they repeat the
+    document's own; expand_payload() puts them back. `timestamp_ms` is the
+    document's timestamp in milliseconds, when the caller already has it.
+    """
+    get = payload.get
+    for field, key in _COMPACT_ITEMS:
+        value = get(field)
+        if value is not None:
+            document[key] = value
+    
+    event_type = document.get('type')
+    if 'ts' in payload and timestamp_ms is None and isinstance(document.get('timestamp'), datetime):
+        timestamp_ms = _ms(document['timestamp'])
+    
+    # What the extension sends: nothing besides the queried fields, type and ts
+    if (_PAYLOAD_FIELDS.issuperset(payload) and get('type', event_type) == event_type
+            and ('ts' not in payload or timestamp_ms is not None and payload['ts'] == timestamp_ms)):
+        return document
+    
+    extra = {field: value for field, value in payload.items() if field not in COMPACT_FIELDS}
+    if 'type' in extra and extra['type'] == event_type:
+        del extra['type']
+    if 'ts' in extra and timestamp_ms is not None and extra['ts'] == timestamp_ms:
+        del extra['ts']
+    if extra:
+        document[EXTRA_FIELD] = extra
+    
+    return document
+
+
+def compact_document(document):
+    """An event document in the version 2 layout (returned as is if it is one)"""
+    if document.get('v') == SCHEMA_VERSION:
+        return document
+    
+    # Version 1's top-level url, title, tabId and windowId are copies of the payload's
+    compact = {key: value for key, value in document.items() if key not in COMPACT_FIELDS and key != 'payload'}
+    compact['v'] = SCHEMA_VERSION
+    
+    return compact_payload(compact, document.get('payload') or {})
+
+
+def expand_payload(document):
+    """
+    The full extension payload of a version 2 event document
+    
+    Interned ids must be resolved first (StringDictionary.resolve_documents()).
+    """
+    payload = {'type': document.get('type')}
+    timestamp = document.get('timestamp')
+    if isinstance(timestamp, datetime):
+        payload['ts'] = _ms(timestamp)
+    for field, key in _COMPACT_ITEMS:
+        if key in document:
+            value = document[key]
+            if value is not None:
+                payload[field] = value
+    extra = document.get(EXTRA_FIELD)
+    if extra:
+        payload.update(extra)
+    
+    return payload
+
+
+def expand_document(document):
+    """
+    An event document in the version 1 layout, with the full payload (returned as is if it is one)
+    
+    Interned ids must be resolved first (StringDictionary.resolve_documents()).
+    """
+    if document.get('v') != SCHEMA_VERSION:
+        return document
+    
+    expanded = {key: value for key, value in document.items() if key not in _COMPACT_KEYS}
+    for field, key in COMPACT_FIELDS.items():
+        expanded[field] = document.get(key)
+    expanded['payload'] = expand_payload(document)
+    
+    return expanded
 
 
 class Event:
     """Event model for browser telemetry data"""
     
-    def __init__(self, user_id, event_type, timestamp, payload):
+    def __init__(self, user_id, event_type, timestamp, payload, domain=None):
         self.user_id = ObjectId(user_id) if isinstance(user_id, str) else user_id
         self.type = event_type
         self.timestamp = datetime.fromtimestamp(timestamp / 1000) if isinstance(timestamp, int) else timestamp
         self.payload = payload
         
-        # Extract domain from URL if present
-        self.domain = self._extract_domain(payload.get('url'))
+        # Extract domain from URL if present (a stored event already has it)
+        self.domain = domain if domain is not None else self._extract_domain(payload.get('url'))
         
         # Additional metadata
         self.tab_id = payload.get('tabId')
@@ -27,24 +146,20 @@ class Event:
             return None
         
         try:
-            parsed = urlparse(url)
-            return parsed.netloc or None
+            # urlparse() would only split ;params off the path as well
+            return urlsplit(url).netloc or None
         except:
             return None
     
     def to_dict(self):
-        """Convert to dictionary for MongoDB"""
-        return {
+        """Convert to dictionary for MongoDB (stored in the compact layout)"""
+        return compact_payload({
             'userId': self.user_id,
             'type': self.type,
             'timestamp': self.timestamp,
             'domain': self.domain,
-            'tabId': self.tab_id,
-            'windowId': self.window_id,
-            'url': self.url,
-            'title': self.title,
-            'payload': self.payload
-        }
+            'v': SCHEMA_VERSION
+        }, self.payload)
     
     def to_json(self):
         """Convert to JSON-safe dictionary"""
@@ -62,12 +177,15 @@ class Event:
     
     @staticmethod
     def from_dict(data):
-        """Create Event instance from dictionary"""
+        """Create Event instance from a stored document in either layout"""
+        # A version 2 document only needs its payload rebuilt, not the whole version 1 document
+        payload = expand_payload(data) if data.get('v') == SCHEMA_VERSION else data.get('payload', {})
         event = Event(
             user_id=data.get('userId'),
             event_type=data.get('type'),
             timestamp=data.get('timestamp'),
-            payload=data.get('payload', {})
+            payload=payload,
+            domain=data.get('domain')
         )
         
         if '_id' in data:
@@ -42,9 +42,9 @@ class User:
         }
     
     @staticmethod
-    def hash_password(password):
+    def hash_password(password, rounds=12):
         """Hash a password using bcrypt"""
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
     
     @staticmethod
     def verify_password(password, password_hash):
@@ -0,0 +1,276 @@
+from bson import ObjectId
+from app.ai.queries import (
+    day_bounds, daily_stats_pipeline, weekly_top_domains_pipeline,
+    weekly_productive_query, weekly_peak_hour_pipeline, history_query
+)
+from app.analytics.queries import (
+    date_range, range_match, dashboard_pipelines, time_spent_query, TIME_SPENT_PROJECTION,
+    productivity_queries, peak_pipeline
+)
+from app.events.queries import (
+    apply_date_filter, events_query, recent_query, top_domains_pipeline, event_stats_pipeline
+)
+
+# Flag a query that examines more than this many keys or documents per result
+DEFAULT_MAX_RATIO = 10
+
+# Query operators that bound an index scan to a range rather than one value
+_RANGE_OPERATORS = {'$gt', '$gte', '$lt', '$lte', '$ne', '$nin', '$regex', '$type', '$exists'}
+
+
+def route_queries(user_id, days=7, sample_type='TAB_CREATED', sample_domain='github.com'):
+    """
+    Every query shape the routes send, built with the routes' own builders
+    
+    Each shape is a dict with route, collection, op ('find', 'count' or
+    'aggregate') and the filter/sort/limit/projection or pipeline. Counts
+    are explained as the aggregation count_documents() runs.
+    """
+    start_date, end_date = date_range(days)
+    day_start, day_end = day_bounds(end_date.date())
+    week_start, week_end = date_range(7)
+    productive, social, with_domain = productivity_queries(user_id, start_date, end_date)
+    
+    def find(route, query, sort, limit=None, projection=None, collection='events'):
+        return {'route': route, 'collection': collection, 'op': 'find', 'filter': query,
+                'sort': sort, 'limit': limit, 'projection': projection}
+    
+    def count(route, query):
+        return {'route': route, 'collection': 'events', 'op': 'count', 'filter': query}
+    
+    def aggregate(route, pipeline):
+        return {'route': route, 'collection': 'events', 'op': 'aggregate', 'pipeline': pipeline}
+    
+    shapes = [
+        find('GET /events/', events_query(user_id, {}), [('timestamp', -1)], 100),
+        count('GET /events/ (total)', events_query(user_id, {})),
+        find('GET /events/?type=', events_query(user_id, {'type': sample_type}), [('timestamp', -1)], 100),
+        find('GET /events/?domain=', events_query(user_id, {'domain': sample_domain}), [('timestamp', -1)], 100),
+        count('GET /events/count', {'userId': ObjectId(user_id)}),
+        find('GET /events/recent', recent_query(user_id, 24), [('timestamp', -1)], 50),
+        aggregate('GET /events/domains', top_domains_pipeline(user_id, 10)),
+        aggregate('GET /events/stats', event_stats_pipeline(apply_date_filter({'userId': ObjectId(user_id)}, {}))),
+        count('GET /analytics/dashboard (total)', range_match(user_id, start_date, end_date)),
+        *(aggregate(f'GET /analytics/dashboard ({name})', pipeline)
+          for name, pipeline in dashboard_pipelines(user_id, start_date, end_date).items()),
+        find('GET /analytics/time-spent', time_spent_query(user_id, start_date, end_date), [('timestamp', 1)],
+             projection=TIME_SPENT_PROJECTION),
+        count('GET /analytics/productivity (productive)', productive),
+        count('GET /analytics/productivity (social)', social),
+        count('GET /analytics/productivity (total)', with_domain),
+        aggregate('GET /analytics/patterns (hour)', peak_pipeline(user_id, start_date, end_date, '$hour')),
+        aggregate('GET /analytics/patterns (day)', peak_pipeline(user_id, start_date, end_date, '$dayOfWeek')),
+        aggregate('GET /ai/daily-summary', daily_stats_pipeline(user_id, day_start, day_end)),
+        count('GET /ai/weekly-report (total)', range_match(user_id, week_start, week_end)),
+        aggregate('GET /ai/weekly-report (top domains)', weekly_top_domains_pipeline(user_id, week_start, week_end)),
+        count('GET /ai/weekly-report (productive)', weekly_productive_query(user_id, week_start, week_end)),
+        aggregate('GET /ai/weekly-report (peak hour)', weekly_peak_hour_pipeline(user_id, week_start, week_end)),
+        find('GET /ai/insights/history', history_query(user_id), [('date', -1)], 10, collection='insights'),
+    ]
+    return shapes
+
+
+def explain_command(shape):
+    """The command the driver sends for a shape, ready to wrap in `explain`"""
+    collection = shape['collection']
+    
+    if shape['op'] == 'find':
+        command = {'find': collection, 'filter': shape['filter']}
+        if shape.get('sort'):
+            command['sort'] = dict(shape['sort'])
+        if shape.get('projection'):
+            command['projection'] = shape['projection']
+        if shape.get('limit'):
+            command['limit'] = shape['limit']
+        return command
+    
+    if shape['op'] == 'count':
+        # What Collection.count_documents() sends
+        pipeline = [{'$match': shape['filter']}, {'$group': {'_id': 1, 'n': {'$sum': 1}}}]
+    else:
+        pipeline = shape['pipeline']
+    
+    return {'aggregate': collection, 'pipeline': pipeline, 'cursor': {}}
+
+
+def _query_sections(explain):
+    """(queryPlanner, executionStats) pairs, whether or not the plan sits under a $cursor stage"""
+    if 'queryPlanner' in explain:
+        yield explain['queryPlanner'], explain.get('executionStats', {})
+    
+    for stage in explain.get('stages', []):
+        cursor = stage.get('$cursor')
+        if cursor and 'queryPlanner' in cursor:
+            yield cursor['queryPlanner'], cursor.get('executionStats', {})
+
+
+def _walk(plan):
+    """Every stage of a plan tree, root first"""
+    if not plan:
+        return
+    
+    # Slot-based (6.0+) plans wrap the classic tree in `queryPlan`
+    plan = plan.get('queryPlan', plan)
+    yield plan
+    
+    if 'inputStage' in plan:
+        yield from _walk(plan['inputStage'])
+    for child in plan.get('inputStages', []):
+        yield from _walk(child)
+    # Sharded clusters: one winning plan per shard
+    for shard in plan.get('shards', []):
+        yield from _walk(shard.get('winningPlan'))
+
+
+def analyze(explain, matched=None, max_ratio=DEFAULT_MAX_RATIO):
+    """
+    Summarize an executionStats explain and flag what makes it expensive
+    
+    Flags are 'COLLSCAN' (no usable index), 'in-memory sort' (a blocking
+    SORT stage below any grouping, instead of index order) and 'examined N
+    per result' when keys or documents examined exceed `max_ratio` per
+    returned document. For counts and aggregations pass `matched`, the
+    number of documents the filter matches: their nReturned is the grouped
+    output (a single row for a count on newer servers), not what the query
+    layer produced.
+    
+    Returns:
+        dict: stages, indexes used, returned/keys/docs examined, time and flags
+    """
+    stages, indexes = [], []
+    returned = keys_examined = docs_examined = millis = 0
+    
+    for planner, stats in _query_sections(explain):
+        for stage in _walk(planner.get('winningPlan')):
+            stages.append(stage['stage'])
+            if stage.get('indexName'):
+                indexes.append(stage['indexName'])
+        returned += stats.get('nReturned', 0)
+        keys_examined += stats.get('totalKeysExamined', 0)
+        docs_examined += stats.get('totalDocsExamined', 0)
+        millis = max(millis, stats.get('executionTimeMillis', 0))
+    
+    if matched is not None:
+        returned = matched
+    
+    # Stages are listed root first: a SORT above a GROUP only orders the groups
+    below_group = stages[stages.index('GROUP') + 1:] if 'GROUP' in stages else stages
+    
+    flags = []
+    if 'COLLSCAN' in stages:
+        flags.append('COLLSCAN')
+    if 'SORT' in below_group:
+        flags.append('in-memory sort')
+    
+    examined = max(keys_examined, docs_examined)
+    if examined > max_ratio * max(returned, 1):
+        flags.append(f"examined {examined / max(returned, 1):.0f} per result")
+    
+    return {
+        'stages': stages,
+        'indexes': indexes,
+        'returned': returned,
+        'keys_examined': keys_examined,
+        'docs_examined': docs_examined,
+        'millis': millis,
+        'covered': bool(stages) and 'FETCH' not in stages and 'COLLSCAN' not in stages,
+        'flags': flags
+    }
+
+
+def _filter_and_sort(shape):
+    """Filter and index-pushable sort of a shape (a pipeline's leading $match and $sort)"""
+    if shape['op'] != 'aggregate':
+        return shape['filter'], list(shape.get('sort') or [])
+    
+    pipeline = shape['pipeline']
+    query = pipeline[0].get('$match', {}) if pipeline else {}
+    sort = list(pipeline[1]['$sort'].items()) if len(pipeline) > 1 and '$sort' in pipeline[1] else []
+    return query, sort
+
+
+def suggest_index(shape):
+    """
+    Compound index for a shape by the equality, sort, range rule
+    
+    Equality fields (values and `$in`) come first, then the sort keys, then
+    range predicates; fields a find() projects are appended so it can be
+    covered. A `$type` predicate is offered as a partial filter instead.
+    
+    Returns:
+        tuple: (keys, options)
+    """
+    query, sort = _filter_and_sort(shape)
+    equality, ranges, options = [], [], {}
+    
+    for field, condition in query.items():
+        if field.startswith('$'):
+            continue
+        operators = set(condition) if isinstance(condition, dict) else set()
+        if operators & _RANGE_OPERATORS:
+            ranges.append(field)
+            if operators == {'$type'}:
+                options.setdefault('partialFilterExpression', {})[field] = condition
+        else:
+            equality.append(field)
+    
+    keys = [(field, 1) for field in equality]
+    keys += [(field, direction) for field, direction in sort if field not in equality]
+    keys += [(field, 1) for field in ranges if field not in dict(keys)]
+    
+    projection = shape.get('projection') or {}
+    keys += [(field, 1) for field, include in projection.items() if include and field not in dict(keys) and field != '_id']
+    
+    return keys, options
+
+
+def audit(db, user_id, days=7, max_ratio=DEFAULT_MAX_RATIO):
+    """
+    Explain every route query for one user and flag the expensive ones
+    
+    Runs against whatever data `db` holds, so point it at a representative
+    copy (or a dataset from benchmarks/bench_indexes.py), not an empty one.
+    
+    Returns:
+        list: one dict per shape with its route, analysis and, when flagged,
+        the suggested index
+    """
+    findings = []
+    
+    for shape in route_queries(user_id, days):
+        explain = db.command('explain', explain_command(shape), verbosity='executionStats')
+        matched = None
+        if shape['op'] != 'find':
+            matched = db[shape['collection']].count_documents(_filter_and_sort(shape)[0])
+        finding = {'route': shape['route'], 'collection': shape['collection'],
+                   **analyze(explain, matched, max_ratio)}
+        if finding['flags']:
+            finding['suggestion'] = suggest_index(shape)
+        findings.append(finding)
+    
+    return findings
+
+
+def sample_user(db):
+    """The user behind the most recent event, or None for an empty collection"""
+    latest = db.events.find_one({}, {'userId': 1}, sort=[('timestamp', -1)])
+    return str(latest['userId']) if latest else None
+
+
+def report_lines(findings):
+    """Text report: one line per shape, plus flags and suggestions under flagged ones"""
+    lines = [f"{'route':<46}{'returned':>9}{'keys':>9}{'docs':>9}{'ms':>6}  plan"]
+    
+    for finding in findings:
+        plan = ' <- '.join(finding['stages']) or '-'
+        lines.append(f"{finding['route']:<46}{finding['returned']:>9}{finding['keys_examined']:>9}"
+                     f"{finding['docs_examined']:>9}{finding['millis']:>6}  {plan}")
+        if finding['flags']:
+            lines.append(f"    ! {', '.join(finding['flags'])}")
+        if finding.get('suggestion'):
+            keys, options = finding['suggestion']
+            lines.append(f"    suggest {finding['collection']} {keys} {options or ''}".rstrip())
+    
+    flagged = sum(1 for finding in findings if finding['flags'])
+    lines.append(f"\n{flagged} of {len(findings)} query shapes flagged")
+    return lines
@@ -0,0 +1,255 @@
+import time
+from datetime import datetime, timedelta
+from itertools import chain
+from bson import ObjectId
+from app.analytics.queries import ACTIVITY_EVENT_TYPES, MAX_ACTIVE_GAP_MINUTES
+
+# Watermark of a user nothing has been compacted for (events carry ms since the epoch)
+EPOCH = datetime(1970, 1, 1)
+
+
+def floor_hour(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def noisy_types(config):
+    """RETENTION_NOISY_TYPES, checked: tab activity must stay raw until it is folded into sessions"""
+    types = tuple(config.get('RETENTION_NOISY_TYPES') or ())
+    activity = sorted(set(types) & set(ACTIVITY_EVENT_TYPES))
+    if activity:
+        raise ValueError(f"RETENTION_NOISY_TYPES cannot include tab activity types ({', '.join(activity)}); "
+                         'time spent reads them until the sessions are built')
+    return types
+
+
+def policy(config, settings):
+    """
+    A user's (retention days, noisy retention days); None keeps those events raw
+    
+    `retention_days` / `noisy_retention_days` in the user's settings
+    override RETENTION_DAYS / RETENTION_NOISY_DAYS; 0 turns compaction off.
+    """
+    def days(name, default):
+        value = settings.get(name, default)
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            value = default
+        return value if value and value > 0 else None
+    
+    return (
+        days('retention_days', config['RETENTION_DAYS']),
+        days('noisy_retention_days', config['RETENTION_NOISY_DAYS'])
+    )
+
+
+def build_sessions(user_id, activity, following=None):
+    """
+    Fold tab activity ({timestamp, domain}, oldest first) into browsing sessions
+    
+    A session is a run of events without an idle gap. It keeps the
+    minutes compute_domain_time() would attribute to each domain,
+    including the gap to `following`, the next activity event (which
+    stays raw), so summed by domain the sessions give the same time spent
+    as the events they replace. `domain` is the one with the most time,
+    and `_id` that of the session's first event.
+    """
+    user_oid = ObjectId(user_id)
+    sessions = []
+    current = previous = None
+    
+    def close(session):
+        minutes = session.pop('_minutes')
+        session['domains'] = [
+            {'_id': domain, 'minutes': value}
+            for domain, value in sorted(minutes.items(), key=lambda item: -item[1])
+        ]
+        session['minutes'] = sum(minutes.values())
+        session['domain'] = session['domains'][0]['_id'] if session['domains'] else session['domain']
+        sessions.append(session)
+    
+    for event in chain(activity, [following] if following else []):
+        if previous is not None:
+            gap = (event['timestamp'] - previous['timestamp']).total_seconds() / 60
+            if gap < MAX_ACTIVE_GAP_MINUTES:
+                current['_minutes'][previous['domain']] = current['_minutes'].get(previous['domain'], 0) + gap
+                current['endTime'] = event['timestamp']
+            else:
+                close(current)
+                current = None
+        if event is following:
+            break
+        
+        if current is None:
+            current = {
+                '_id': event['_id'],
+                'userId': user_oid,
+                'domain': event['domain'],
+                'startTime': event['timestamp'],
+                'endTime': event['timestamp'],
+                'events': 0,
+                '_minutes': {}
+            }
+        current['events'] += 1
+        previous = event
+    
+    if current is not None:
+        close(current)
+    return sessions
+
+
+class _Rollup:
+    """Counts of the events one run folds for one hour"""
+    
+    def __init__(self):
+        self.first = None
+        self.count = 0
+        self.types = {}
+        self.domains = {}
+    
+    def add(self, event):
+        if self.first is None or event['_id'] < self.first:
+            self.first = event['_id']
+        self.count += 1
+        self.types[event.get('type')] = self.types.get(event.get('type'), 0) + 1
+        
+        domain = event.get('domain')
+        if domain:
+            count, last_visit = self.domains.get(domain, (0, event['timestamp']))
+            self.domains[domain] = (count + 1, max(last_visit, event['timestamp']))
+    
+    def document(self, user_oid, hour):
+        return {
+            'userId': user_oid,
+            'hour': hour,
+            'first': self.first,
+            'count': self.count,
+            'types': [{'_id': name, 'count': count} for name, count in self.types.items()],
+            'domains': [
+                {'_id': domain, 'count': count, 'lastVisit': last_visit}
+                for domain, (count, last_visit) in self.domains.items()
+            ]
+        }
+
+
+def compact_user(storage, user_id, days, noisy_days=None, noisy=(), now=None, batch_size=1000, pause=0.0):
+    """
+    Fold a user's expired raw events into hourly rollups and sessions, then delete them
+    
+    Events older than `days` expire, and so do `noisy` types older than
+    `noisy_days` (never later than the rest). The run writes rollups
+    and sessions, moves the user's watermarks, then deletes the raw
+    events in batches of `batch_size`, sleeping `pause` seconds between
+    batches so the deletes do not crowd out ingest. Interrupted runs are
+    safe to repeat: events below the old watermarks that were stored
+    before the previous run started were folded by it and are only
+    deleted; the rest (late arrivals) are folded now. Late activity below
+    the old watermark becomes sessions of its own, keyed by their first
+    event so a repeated run replaces them.
+    
+    Returns:
+        dict: events folded, rollups and sessions written, events deleted
+    """
+    now = now or datetime.utcnow()
+    user_oid = ObjectId(user_id)
+    state = storage.rollups.state(user_id) or {}
+    old_before = state.get('compactedBefore', EPOCH)
+    old_noisy_before = state.get('noisyBefore', old_before)
+    folded_until = ObjectId.from_datetime(state['foldedUntil']) if state.get('foldedUntil') else None
+    
+    before = max(floor_hour(now - timedelta(days=days)) if days else EPOCH, old_before)
+    noisy_before = floor_hour(now - timedelta(days=noisy_days)) if noisy_days and noisy else EPOCH
+    noisy_before = max(noisy_before, old_noisy_before, before)
+    result = {'folded': 0, 'rollups': 0, 'sessions': 0, 'deleted': 0}
+    
+    def folded_before(event):
+        # Below the old watermarks and stored before the previous run started
+        return folded_until is not None and event['_id'] < folded_until and (
+            event['timestamp'] < old_before or (event.get('type') in noisy and event['timestamp'] < old_noisy_before)
+        )
+    
+    rollups = {}
+    activity = []
+    late = []
+    for event in storage.events.expired(user_id, before, noisy, noisy_before, inserted_before=now):
+        if folded_before(event):
+            continue
+        
+        rollups.setdefault(floor_hour(event['timestamp']), _Rollup()).add(event)
+        result['folded'] += 1
+        if event.get('type') in ACTIVITY_EVENT_TYPES and event.get('domain'):
+            (activity if event['timestamp'] >= old_before else late).append(event)
+    
+    documents = [rollup.document(user_oid, hour) for hour, rollup in rollups.items()]
+    storage.rollups.save(documents)
+    result['rollups'] = len(documents)
+    
+    if before > old_before:
+        following = next(iter(storage.events.activity(
+            user_id, before, before + timedelta(minutes=MAX_ACTIVE_GAP_MINUTES)
+        )), None)
+        sessions = build_sessions(user_id, activity, following)
+        storage.sessions.replace(user_id, old_before if old_before > EPOCH else None, before, sessions)
+        result['sessions'] = len(sessions)
+    
+    if late:
+        sessions = build_sessions(user_id, late)
+        # An interrupted run left sessions keyed by events it folded; this run folds them again
+        storage.sessions.replace_ids(user_id, [event['_id'] for event in late], sessions)
+        result['sessions'] += len(sessions)
+    
+    storage.rollups.set_state(user_id, {
+        'compactedBefore': before,
+        'noisyBefore': noisy_before,
+        'foldedUntil': now,
+        'updatedAt': datetime.utcnow()
+    })
+    
+    while True:
+        deleted = storage.events.delete_expired(
+            user_id, before, noisy, noisy_before, inserted_before=now, limit=batch_size
+        )
+        result['deleted'] += deleted
+        if deleted < batch_size:
+            break
+        time.sleep(pause)
+    
+    return result
+
+
+def compact_events(storage_for, users, config, limit=None, batch_size=1000, pause=0.0, log=print, skip=None):
+    """
+    Apply each user's retention policy
+    
+    Args:
+        storage_for: Callable user id -> Storage (the user's shard)
+        users: Iterable of (user id, settings)
+        skip: Callable user id -> bool, for users to leave alone this run
+            (app.sharding.move_in_progress: mid-move users are on two shards)
+    
+    Returns:
+        dict: users compacted and totals of compact_user()'s counts
+    """
+    noisy = noisy_types(config)
+    totals = {'users': 0, 'folded': 0, 'rollups': 0, 'sessions': 0, 'deleted': 0}
+    
+    for user_id, settings in users:
+        if limit is not None and totals['users'] >= limit:
+            break
+        days, noisy_days = policy(config, settings)
+        if days is None and noisy_days is None:
+            continue
+        if skip is not None and skip(str(user_id)):
+            log(f"  {user_id}: skipped (moving between shards)")
+            continue
+        
+        result = compact_user(storage_for(str(user_id)), str(user_id), days, noisy_days, noisy,
+                              batch_size=batch_size, pause=pause)
+        if result['folded'] or result['deleted']:
+            totals['users'] += 1
+            log(f"  {user_id}: {result['folded']} folded into {result['rollups']} rollups and "
+                f"{result['sessions']} sessions, {result['deleted']} deleted")
+        for key in ('folded', 'rollups', 'sessions', 'deleted'):
+            totals[key] += result[key]
+    
+    return totals
@@ -0,0 +1,417 @@
+import bisect
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+from bson import ObjectId
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError
+
+# The database at MONGODB_URI / MONGODB_DB_NAME: users, revoked tokens and the
+# shard directory live here, and so do users placed before sharding was enabled
+HOME = 'home'
+
+# Per-user collections (keyed by userId); they live on the user's shard and move with it
+USER_COLLECTIONS = ('events', 'insights', 'sessions', 'event_rollups', 'compaction_state')
+
+# Written only by retention runs (app/retention.py), which leave users being
+# moved alone, so during a move the source copy of these is authoritative
+MIRRORED_COLLECTIONS = ('event_rollups', 'sessions', 'compaction_state')
+
+# Collection (in the home database) mapping userId -> shard
+DIRECTORY = 'user_shards'
+
+# Directory entries of users being moved: their documents may be on two shards
+MOVING_QUERY = {'$or': [{'movingTo': {'$exists': True}}, {'movedFrom': {'$exists': True}}]}
+
+# Events stored this long before a move started are taken to predate it,
+# whatever the app servers' clocks (ObjectIds hold the writer's time)
+CLOCK_SKEW = timedelta(minutes=5)
+
+_NAME = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+def ring_position(key):
+    """64-bit position on the ring (stable across processes, unlike hash())"""
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """
+    Consistent hashing of keys onto shard names
+    
+    Each shard owns `vnodes` points on a 64-bit ring and a key belongs to
+    the first point at or after its hash. Adding a shard only takes keys
+    from the others (about 1/N of them), and removing one only hands its
+    own keys on, so a resize moves the minimum number of users.
+    """
+    
+    def __init__(self, shards, vnodes=128):
+        if not shards:
+            raise ValueError('A hash ring needs at least one shard')
+        
+        self.shards = list(shards)
+        self.vnodes = vnodes
+        points = sorted((ring_position(f'{shard}#{i}'), shard) for shard in self.shards for i in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._owners = [shard for _, shard in points]
+    
+    def owner(self, key):
+        i = bisect.bisect_left(self._hashes, ring_position(str(key)))
+        return self._owners[i % len(self._owners)]
+    
+    def shares(self):
+        """Fraction of the ring (and so of users, on average) each shard owns"""
+        shares = dict.fromkeys(self.shards, 0)
+        previous = self._hashes[-1] - 2 ** 64
+        for point, shard in zip(self._hashes, self._owners):
+            shares[shard] += point - previous
+            previous = point
+        return {shard: share / 2 ** 64 for shard, share in shares.items()}
+
+
+def parse_shards(config):
+    """
+    Shard locations and ring members from MONGODB_SHARDS
+    
+    Entries are `name=uri` separated by `;`; the database is the URI's path,
+    else MONGODB_DB_NAME. A bare `home` puts the home database on the ring.
+    Shards listed in MONGODB_SHARDS_DRAINING stay readable but take no new
+    users, and `flask shards rebalance` empties them.
+    
+    Returns:
+        tuple: (locations {name: {'uri', 'db_name'}}, ring member names)
+    """
+    locations = {HOME: {'uri': config['MONGODB_URI'], 'db_name': config['MONGODB_DB_NAME']}}
+    members = []
+    
+    for entry in filter(None, (entry.strip() for entry in config.get('MONGODB_SHARDS', '').split(';'))):
+        name, _, uri = entry.partition('=')
+        name, uri = name.strip(), uri.strip()
+        if not _NAME.match(name):
+            raise ValueError(f"Invalid shard name in MONGODB_SHARDS: {name!r}")
+        if name in members:
+            raise ValueError(f"Duplicate shard in MONGODB_SHARDS: {name}")
+        if uri:
+            if name == HOME:
+                raise ValueError(f"'{HOME}' is MONGODB_URI; list it without a URI")
+            locations[name] = {'uri': uri, 'db_name': urlsplit(uri).path.strip('/') or config['MONGODB_DB_NAME']}
+        elif name != HOME:
+            raise ValueError(f"Shard {name} has no URI")
+        members.append(name)
+    
+    draining = {name.strip() for name in config.get('MONGODB_SHARDS_DRAINING', '').split(',') if name.strip()}
+    unknown = draining - set(locations)
+    if unknown:
+        raise ValueError(f"Unknown shards in MONGODB_SHARDS_DRAINING: {', '.join(sorted(unknown))}")
+    
+    members = [name for name in members if name not in draining] or [HOME]
+    return locations, members
+
+
+class ShardRouter:
+    """
+    Which shard holds a user's data
+    
+    The directory (home `user_shards`) is authoritative: new users are
+    pinned to their ring owner at registration, and users without an entry
+    predate sharding and live at home. Lookups are cached per process for
+    `cache_ttl` seconds, so a move becomes visible everywhere within the
+    TTL; the rebalancer waits that long before cleaning up the old copy.
+    With home as the only location every user is there and nothing is
+    looked up.
+    """
+    
+    def __init__(self, members, locations=(HOME,), vnodes=128, cache_ttl=30, max_entries=100000):
+        self.ring = HashRing(members, vnodes)
+        self.cache_ttl = cache_ttl
+        self.max_entries = max_entries
+        # A draining shard still holds users even when the ring is home alone
+        self.sharded = set(locations) | set(members) != {HOME}
+        self.hits = 0
+        self.misses = 0
+        
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def owner(self, user_id):
+        """The shard consistent hashing assigns to a user"""
+        return self.ring.owner(user_id)
+    
+    def locate(self, user_id, directory):
+        """Shard of a user, given the directory collection (pymongo)"""
+        if not self.sharded:
+            return HOME
+        
+        shard = self._cached(user_id)
+        if shard is None:
+            shard = self._remember(user_id, directory.find_one({'_id': ObjectId(user_id)}, {'shard': 1}))
+        return shard
+    
+    def assign(self, user_id, directory):
+        """Pin a new user to its ring owner; returns the shard"""
+        if not self.sharded:
+            return HOME
+        
+        directory.update_one(
+            {'_id': ObjectId(user_id)},
+            {'$setOnInsert': {'shard': self.owner(user_id), 'updatedAt': datetime.utcnow()}},
+            upsert=True
+        )
+        return self._remember(user_id, directory.find_one({'_id': ObjectId(user_id)}, {'shard': 1}))
+    
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(str(user_id), None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+    
+    def _cached(self, user_id):
+        key = str(user_id)
+        now = time.monotonic()
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def _remember(self, user_id, row):
+        shard = row['shard'] if row else HOME
+        
+        if self.cache_ttl > 0:
+            with self._lock:
+                self._entries[str(user_id)] = (time.monotonic() + self.cache_ttl, shard)
+                self._entries.move_to_end(str(user_id))
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        
+        return shard
+    
+    def stats(self):
+        return {
+            'shards': self.ring.shards,
+            'sharded': self.sharded,
+            'cached_users': len(self._entries),
+            'cache_ttl_seconds': self.cache_ttl,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+def plan_moves(router, home_db, limit=None):
+    """
+    Users whose shard is not their ring owner, as (user_id, source, target)
+    
+    Covers users pinned elsewhere (after a shard was added or set draining)
+    and unpinned users still at home when home is not their owner.
+    """
+    pipeline = [
+        {'$project': {'_id': 1}},
+        {'$lookup': {'from': DIRECTORY, 'localField': '_id', 'foreignField': '_id', 'as': 'placement'}}
+    ]
+    moves = []
+    
+    for row in home_db.users.aggregate(pipeline):
+        source = row['placement'][0]['shard'] if row['placement'] else HOME
+        target = router.owner(row['_id'])
+        if source != target:
+            moves.append((row['_id'], source, target))
+            if limit and len(moves) >= limit:
+                break
+    
+    return moves
+
+
+def copy_user(source_db, target_db, user_id, batch_size=1000):
+    """
+    Copy a user's documents to another shard, skipping ones already there
+    
+    Idempotent (documents keep their _id), so it is safe to re-run after a
+    failure.
+    
+    Returns:
+        int: documents inserted
+    """
+    copied = 0
+    
+    for collection in USER_COLLECTIONS:
+        cursor = source_db[collection].find({'userId': ObjectId(user_id)}).sort('_id', 1)
+        for documents in _batches(cursor, batch_size):
+            copied += _insert_missing(target_db[collection], documents)
+    
+    return copied
+
+
+def _batches(cursor, size):
+    batch = []
+    for document in cursor:
+        batch.append(document)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _insert_missing(collection, documents):
+    try:
+        return len(collection.insert_many(documents, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        # Duplicate _ids were copied by an earlier pass; anything else is a real failure
+        if any(error['code'] != 11000 for error in e.details['writeErrors']):
+            raise
+        return e.details['nInserted']
+
+
+def _replace_all(collection, documents):
+    result = collection.bulk_write(
+        [ReplaceOne({'_id': document['_id']}, document, upsert=True) for document in documents], ordered=False
+    )
+    return result.upserted_count + result.modified_count
+
+
+def catch_up_user(source_db, target_db, user_id, since, batch_size=1000):
+    """
+    Carry writes made on the source during a move over to the target
+    
+    New documents are copied. Rollups, sessions and compaction state are
+    made identical to the source's: retention runs replace and delete
+    them, and only the source has them during a move. Events deleted from
+    the source (by a retention or archive run already under way when the
+    move started at `since`) are deleted from the target too; events
+    stored since then are left alone, as the target gets new ones after
+    the flip.
+    
+    Returns:
+        tuple: (documents copied or replaced, documents deleted)
+    """
+    user_oid = ObjectId(user_id)
+    copied = deleted = 0
+    
+    for collection in USER_COLLECTIONS:
+        source, target = source_db[collection], target_db[collection]
+        query = {'userId': user_oid}
+        mirrored = collection in MIRRORED_COLLECTIONS
+        
+        # Deletes first, so a unique key freed on the source is free on the target too
+        if mirrored:
+            stale = query
+        elif collection == 'events':
+            stale = {**query, '_id': {'$lt': ObjectId.from_datetime(since - CLOCK_SKEW)}}
+        else:
+            stale = None
+        if stale is not None:
+            ids = list(_missing_ids(source, target, stale))
+            for i in range(0, len(ids), batch_size):
+                deleted += target.delete_many({'_id': {'$in': ids[i:i + batch_size]}}).deleted_count
+        
+        write = _replace_all if mirrored else _insert_missing
+        for documents in _batches(source.find(query).sort('_id', 1), batch_size):
+            copied += write(target, documents)
+    
+    return copied, deleted
+
+
+def _missing_ids(source, target, query):
+    """_ids of the target's documents matching `query` that the source does not have"""
+    present = (document['_id'] for document in source.find(query, {'_id': 1}).sort('_id', 1))
+    current = next(present, None)
+    
+    for document in target.find(query, {'_id': 1}).sort('_id', 1):
+        while current is not None and current < document['_id']:
+            current = next(present, None)
+        if current != document['_id']:
+            yield document['_id']
+
+
+def move_in_progress(home_db, user_id):
+    """Whether a user is mid-move between shards (retention and archive runs skip such users)"""
+    return home_db[DIRECTORY].count_documents({'_id': ObjectId(user_id), **MOVING_QUERY}, limit=1) > 0
+
+
+def _counts(db, user_id):
+    return {collection: db[collection].count_documents({'userId': ObjectId(user_id)}) for collection in USER_COLLECTIONS}
+
+
+def move_users(router, home_db, shard_dbs, moves, grace_seconds=None, batch_size=1000, log=print):
+    """
+    Move users between shards while the app keeps serving them
+    
+    1. Mark each user `movingTo` and copy its documents (the source stays
+       authoritative, so reads and writes carry on there). Retention and
+       archive runs skip the user from now until the move is done.
+    2. Flip the directory entry to the target, keeping `movedFrom`.
+    3. Wait out the routers' cache TTL (`grace_seconds`), after which no
+       worker still sends the user to the source.
+    4. Catch up with writes, updates and deletes that reached the source
+       meanwhile (catch_up_user()), check the target holds at least as
+       many documents, then delete the source copy.
+    
+    Step 4 also runs first for users a previous, interrupted run left with
+    `movedFrom`, and step 1 simply re-copies for ones left `movingTo`.
+    
+    Returns:
+        dict: users moved, documents copied, removed from the target by
+        the catch-up and deleted from the source, users not cleaned up
+    """
+    directory = home_db[DIRECTORY]
+    grace_seconds = router.cache_ttl + 5 if grace_seconds is None else grace_seconds
+    result = {'moved': 0, 'copied': 0, 'removed': 0, 'deleted': 0, 'unverified': []}
+    
+    flipped = [(row['_id'], row['movedFrom'], row['shard'], row.get('movingSince', row['updatedAt']))
+               for row in directory.find({'movedFrom': {'$exists': True}})]
+    if flipped:
+        log(f"Finishing {len(flipped)} interrupted moves")
+    
+    for user_id, source, target in moves:
+        since = datetime.utcnow()
+        directory.update_one(
+            {'_id': user_id},
+            {'$set': {'shard': source, 'movingTo': target, 'movingSince': since, 'updatedAt': since}},
+            upsert=True
+        )
+        copied = copy_user(shard_dbs[source], shard_dbs[target], user_id, batch_size)
+        directory.update_one(
+            {'_id': user_id},
+            {'$set': {'shard': target, 'movedFrom': source, 'updatedAt': datetime.utcnow()},
+             '$unset': {'movingTo': ''}}
+        )
+        router.invalidate(user_id)
+        result['copied'] += copied
+        result['moved'] += 1
+        flipped.append((user_id, source, target, since))
+        log(f"  {user_id}: {source} -> {target}, {copied} documents copied")
+    
+    if not flipped:
+        return result
+    
+    log(f"Waiting {grace_seconds:g}s for cached placements to expire")
+    time.sleep(grace_seconds)
+    
+    for user_id, source, target, since in flipped:
+        copied, removed = catch_up_user(shard_dbs[source], shard_dbs[target], user_id, since, batch_size)
+        result['copied'] += copied
+        result['removed'] += removed
+        source_counts, target_counts = _counts(shard_dbs[source], user_id), _counts(shard_dbs[target], user_id)
+        if any(target_counts[name] < count for name, count in source_counts.items()):
+            log(f"  {user_id}: {target} has {target_counts}, {source} has {source_counts}; kept the source copy")
+            result['unverified'].append(str(user_id))
+            continue
+        
+        for collection in USER_COLLECTIONS:
+            result['deleted'] += shard_dbs[source][collection].delete_many({'userId': user_id}).deleted_count
+        directory.update_one({'_id': user_id}, {'$unset': {'movedFrom': '', 'movingSince': ''}})
+    
+    return result
@@ -0,0 +1,3 @@
+from .routes import status_bp
+
+__all__ = ['status_bp']
@@ -0,0 +1,27 @@
+from flask import Blueprint, jsonify, current_app
+from flask_jwt_extended import jwt_required
+from app.database import pool_stats
+
+status_bp = Blueprint('status', __name__)
+
+
+@status_bp.route('/db', methods=['GET'])
+@jwt_required()
+def get_db_status():
+    """Get MongoDB connection pool settings and checkout metrics for this worker"""
+    try:
+        return jsonify(pool_stats()), 200
+    
+    except Exception as e:
+        return jsonify({'error': 'Failed to get database status', 'message': str(e)}), 500
+
+
+@status_bp.route('/startup', methods=['GET'])
+@jwt_required()
+def get_startup_report():
+    """Get how long this worker took to import and build the app"""
+    try:
+        return jsonify(current_app.extensions.get('startup_report', {})), 200
+    
+    except Exception as e:
+        return jsonify({'error': 'Failed to get startup report', 'message': str(e)}), 500
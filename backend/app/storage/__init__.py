@@ -0,0 +1,89 @@
+import copy
+from app.interning import init_interning
+from .base import (
+    EventRepository, UserRepository, InsightRepository, SessionRepository, TokenRepository, RollupRepository,
+    StringRepository, RateLimitRepository, Storage
+)
+
+# Callable (workload, user_id) -> Storage, chosen by init_storage()
+_factory = None
+
+
+def init_storage(app):
+    """
+    Set up the STORAGE_BACKEND: MongoDB (see init_db) or an embedded SQLite file
+    
+    The backends are imported here rather than at module level, since
+    they pull in the query modules of the blueprints that use get_storage.
+    """
+    global _factory
+    
+    # Before any Storage is built: each picks up the process's string cache
+    init_interning(app.config)
+    
+    backend = app.config.get('STORAGE_BACKEND', 'mongodb')
+    
+    if backend == 'mongodb':
+        from app.database import init_db
+        from .mongo import MongoStorage
+        
+        init_db(app)
+        _factory = MongoStorage
+    elif backend == 'sqlite':
+        from .sqlite import SQLiteStorage
+        
+        storage = SQLiteStorage(app.config['SQLITE_PATH'], app.config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+        _factory = lambda workload='default', user_id=None: storage
+    else:
+        raise ValueError(f"Unknown STORAGE_BACKEND: {backend!r} (expected 'mongodb' or 'sqlite')")
+    
+    if app.config.get('ARCHIVE_ENABLED') and app.config.get('RETENTION_ENABLED'):
+        # Compaction would find nothing left to fold once the archive has moved it
+        raise ValueError('ARCHIVE_ENABLED and RETENTION_ENABLED are exclusive: pick one cold tier')
+    
+    if app.config.get('ARCHIVE_ENABLED'):
+        from app.archive import EventArchive
+        from .archive import ArchivedEventRepository
+        
+        archive = EventArchive(app.config['ARCHIVE_DIR'], app.config.get('ARCHIVE_COMPRESSION', 'zstd'))
+        app.extensions['event_archive'] = archive
+        _factory = _with_events(_factory, lambda storage: ArchivedEventRepository(storage.events, archive))
+    
+    if app.config.get('RETENTION_ENABLED'):
+        from app.retention import noisy_types
+        from .retention import CompactedEventRepository
+        
+        noisy = noisy_types(app.config)
+        _factory = _with_events(
+            _factory, lambda storage: CompactedEventRepository(storage.events, storage.rollups, storage.sessions, noisy)
+        )
+
+
+def _with_events(factory, repository):
+    """Wrap a storage factory so its events go through `repository(storage)` (a federated cold tier)"""
+    
+    def wrapped(workload='default', user_id=None):
+        # A copy, since the SQLite backend hands out one shared Storage
+        storage = copy.copy(factory(workload, user_id))
+        storage.events = repository(storage)
+        return storage
+    
+    return wrapped
+
+
+def get_storage(workload='default', user_id=None):
+    """
+    Repositories for a request
+    
+    `workload` and `user_id` pick the MongoDB client and shard as get_db()
+    does; the embedded backend has a single database and ignores them.
+    """
+    if _factory is None:
+        raise RuntimeError('Storage is not initialized; call create_app() first')
+    return _factory(workload, user_id)
+
+
+__all__ = [
+    'EventRepository', 'UserRepository', 'InsightRepository', 'SessionRepository', 'TokenRepository',
+    'RollupRepository', 'StringRepository', 'RateLimitRepository', 'Storage', 'init_storage', 'get_storage'
+]
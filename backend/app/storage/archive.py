@@ -0,0 +1,126 @@
+from datetime import datetime
+from heapq import merge
+from itertools import chain, takewhile
+from app.archive import Partials
+from app.storage.base import EventRepository
+
+
+class ArchivedEventRepository(EventRepository):
+    """
+    An event repository federated with the Parquet archive (app/archive.py)
+    
+    Aggregations over a range that starts before the user's watermark add
+    the archive's counts to the hot tier's and cut top-N lists afterwards;
+    time spent merges the archive's activity with the hot tier's. The hot
+    tier leaves out what the archive holds (see EventArchive.cutoff), so
+    events synced late below the watermark count before they are archived.
+    Ranges inside the hot window go straight to the hot repository, as do
+    the raw event listings.
+    """
+    
+    def __init__(self, hot, archive):
+        self.hot = hot
+        self.archive = archive
+    
+    def insert_many(self, documents):
+        return self.hot.insert_many(documents)
+    
+    def find(self, user_id, filters, limit=100, skip=0):
+        return self.hot.find(user_id, filters, limit, skip)
+    
+    def count(self, user_id, filters=None):
+        return self.hot.count(user_id, filters)
+    
+    def recent(self, user_id, hours, limit=50):
+        return self.hot.recent(user_id, hours, limit)
+    
+    def count_legacy(self):
+        return self.hot.count_legacy()
+    
+    def compact_legacy(self, after=None, limit=1000):
+        return self.hot.compact_legacy(after, limit)
+    
+    def _cutoff(self, user_id, start_date):
+        """The user's (watermark, archived until) when [start_date, ...] reaches into the archive, else None"""
+        cutoff = self.archive.cutoff(user_id)
+        if cutoff is None or (start_date is not None and start_date >= cutoff[0]):
+            return None
+        return cutoff
+    
+    def _archived(self, cutoff):
+        """The hot tier's `skip` for the events the archive holds (expired_query()'s arguments)"""
+        watermark, until = cutoff
+        return watermark, (), None, until
+    
+    def _partials(self, user_id, start_date, end_date, cutoff):
+        partials = Partials(self.archive.partials(user_id, start_date, end_date, *cutoff))
+        return partials.add(self.hot.partials(user_id, start_date, end_date, skip=self._archived(cutoff)))
+    
+    def top_domains(self, user_id, limit):
+        cutoff = self._cutoff(user_id, None)
+        if cutoff is None:
+            return self.hot.top_domains(user_id, limit)
+        return self._partials(user_id, None, None, cutoff).top_domains(limit)
+    
+    def type_stats(self, user_id, filters):
+        start_date, end_date = (
+            datetime.fromisoformat(filters[name]) if filters.get(name) else None
+            for name in ('start_date', 'end_date')
+        )
+        cutoff = self._cutoff(user_id, start_date)
+        if cutoff is None:
+            return self.hot.type_stats(user_id, filters)
+        return self._partials(user_id, start_date, end_date, cutoff).type_stats()
+    
+    def dashboard(self, user_id, start_date, end_date):
+        cutoff = self._cutoff(user_id, start_date)
+        if cutoff is None:
+            return self.hot.dashboard(user_id, start_date, end_date)
+        return self._partials(user_id, start_date, end_date, cutoff).dashboard()
+    
+    def activity(self, user_id, start_date, end_date):
+        cutoff = self._cutoff(user_id, start_date)
+        if cutoff is None:
+            return self.hot.activity(user_id, start_date, end_date)
+        
+        watermark = cutoff[0]
+        cold = self.archive.activity(user_id, start_date, end_date, *cutoff)
+        # Hot events below the watermark are the few synced late, so merging them in costs little
+        late = self.hot.activity(user_id, start_date, min(end_date, watermark), skip=self._archived(cutoff))
+        cold = merge(cold, takewhile(lambda event: event['timestamp'] < watermark, late),
+                     key=lambda event: event['timestamp'])
+        if end_date < watermark:
+            return cold
+        return chain(cold, self.hot.activity(user_id, watermark, end_date))
+    
+    def productivity_counts(self, user_id, start_date, end_date):
+        cutoff = self._cutoff(user_id, start_date)
+        if cutoff is None:
+            return self.hot.productivity_counts(user_id, start_date, end_date)
+        return self._partials(user_id, start_date, end_date, cutoff).productivity_counts()
+    
+    def peaks(self, user_id, start_date, end_date):
+        cutoff = self._cutoff(user_id, start_date)
+        if cutoff is None:
+            return self.hot.peaks(user_id, start_date, end_date)
+        return self._partials(user_id, start_date, end_date, cutoff).peaks()
+    
+    def daily_stats(self, user_id, start_time, end_time):
+        cutoff = self._cutoff(user_id, start_time)
+        if cutoff is None:
+            return self.hot.daily_stats(user_id, start_time, end_time)
+        return self._partials(user_id, start_time, end_time, cutoff).daily_stats()
+    
+    def weekly_stats(self, user_id, start_date, end_date):
+        cutoff = self._cutoff(user_id, start_date)
+        if cutoff is None:
+            return self.hot.weekly_stats(user_id, start_date, end_date)
+        return self._partials(user_id, start_date, end_date, cutoff).weekly_stats()
+    
+    def partials(self, user_id, start_date, end_date=None):
+        cutoff = self._cutoff(user_id, start_date)
+        if cutoff is None:
+            return self.hot.partials(user_id, start_date, end_date)
+        
+        partials = self._partials(user_id, start_date, end_date, cutoff)
+        return {field: partials.rows(field) for field in partials.counts} | {'domains': partials.top_domains(None)}
@@ -0,0 +1,257 @@
+class EventRepository:
+    """
+    Interface for a user's browser events
+    
+    Documents use the MongoDB shape (`_id`, `userId` as ObjectIds, naive
+    UTC datetimes) and grouped results the aggregation row shape (`_id`
+    plus `count`, ...), so the models and format_* helpers serve every
+    backend unchanged. `filters` is a mapping with optional `start_date`
+    / `end_date` (ISO strings), `type` and `domain`, as the routes take
+    them from the query string. Raw events come back in either stored
+    layout (app/models/event.py); Event.from_dict() reads both.
+    """
+    
+    def insert_many(self, documents):
+        """Store new events (each gets an `_id`); returns how many were inserted"""
+        raise NotImplementedError
+    
+    def find(self, user_id, filters, limit=100, skip=0):
+        """Matching events, newest first"""
+        raise NotImplementedError
+    
+    def count(self, user_id, filters=None):
+        raise NotImplementedError
+    
+    def recent(self, user_id, hours, limit=50):
+        """Events of the last `hours` hours, newest first"""
+        raise NotImplementedError
+    
+    def top_domains(self, user_id, limit):
+        """All-time top domains: rows of _id (domain), count and lastVisit"""
+        raise NotImplementedError
+    
+    def type_stats(self, user_id, filters):
+        """(total, rows of _id (type) and count, most frequent first)"""
+        raise NotImplementedError
+    
+    def dashboard(self, user_id, start_date, end_date):
+        """(total, {daily_events, top_domains, event_types, hourly_activity}) for format_dashboard"""
+        raise NotImplementedError
+    
+    def activity(self, user_id, start_date, end_date, skip=None):
+        """
+        Tab activity events with a domain ({timestamp, domain}), oldest first, for time spent
+        
+        `skip` leaves out events already in sessions or the archive, as in partials().
+        """
+        raise NotImplementedError
+    
+    def productivity_counts(self, user_id, start_date, end_date):
+        """(productive, social, with a domain) event counts for format_productivity"""
+        raise NotImplementedError
+    
+    def peaks(self, user_id, start_date, end_date):
+        """(busiest hour, busiest day of week) as lists of at most one row, for format_patterns"""
+        raise NotImplementedError
+    
+    def daily_stats(self, user_id, start_time, end_time):
+        """A day's totals, top domains, types and hours, in the shape format_daily_stats takes"""
+        raise NotImplementedError
+    
+    def weekly_stats(self, user_id, start_date, end_date):
+        """(total, top domain rows, productive count, peak hour rows) for format_weekly_data"""
+        raise NotImplementedError
+    
+    def partials(self, user_id, start_date, end_date=None, skip=None):
+        """
+        Counts by day, hour, weekday, type and domain since start_date, as app.archive.Partials reads them
+        
+        `skip` is an optional (before, noisy_types, noisy_before,
+        inserted_before), as expired() takes them: the events it matches
+        are left out (they are already in the rollups or the archive).
+        """
+        raise NotImplementedError
+    
+    def expired(self, user_id, before, noisy_types=(), noisy_before=None, inserted_before=None):
+        """
+        Events older than `before`, or of a noisy type and older than `noisy_before`, oldest first
+        
+        Only `_id`, timestamp, type and domain are returned. With
+        `inserted_before` (a datetime), events stored after it are left out.
+        """
+        raise NotImplementedError
+    
+    def delete_expired(self, user_id, before, noisy_types=(), noisy_before=None, inserted_before=None, limit=1000):
+        """Delete up to `limit` of the events expired() would return; returns how many were deleted"""
+        raise NotImplementedError
+    
+    def count_legacy(self):
+        """Events still stored in the version 1 layout (app/models/event.py)"""
+        raise NotImplementedError
+    
+    def compact_legacy(self, after=None, limit=1000):
+        """
+        Rewrite up to `limit` version 1 events, in _id order after `after`, in the compact layout
+        
+        Returns:
+            tuple: (events rewritten, _id to resume after, or None once none are left)
+        """
+        raise NotImplementedError
+
+
+class UserRepository:
+    """Interface for user accounts"""
+    
+    def insert(self, document):
+        """Store a new user; returns its id"""
+        raise NotImplementedError
+    
+    def find_by_id(self, user_id):
+        raise NotImplementedError
+    
+    def find_by_email(self, email):
+        raise NotImplementedError
+    
+    def replace_password_hash(self, user_id, old_hash, new_hash):
+        """Swap a password hash, unless it changed since it was read"""
+        raise NotImplementedError
+    
+    def update_profile(self, user_id, fields):
+        """Set `fields`; returns the updated user, or None when missing or nothing changed"""
+        raise NotImplementedError
+    
+    def settings(self):
+        """(user id, settings) of every user"""
+        raise NotImplementedError
+
+
+class InsightRepository:
+    """Interface for generated AI insights"""
+    
+    def insert(self, document):
+        raise NotImplementedError
+    
+    def history(self, user_id, limit=10):
+        """A user's insights, latest date first"""
+        raise NotImplementedError
+
+
+class SessionRepository:
+    """
+    Interface for browsing sessions: runs of tab activity without an idle gap
+    
+    {_id (the first event's), userId, startTime, endTime, events, minutes,
+    domain (most time), domains: [{_id, minutes}]}, written by retention
+    runs (app/retention.py).
+    """
+    
+    def insert_many(self, documents):
+        raise NotImplementedError
+    
+    def find(self, user_id, start_date, end_date):
+        """Sessions starting within the range, latest first"""
+        raise NotImplementedError
+    
+    def replace(self, user_id, start_date, end_date, documents):
+        """Swap the sessions starting in [start_date (None: any), end_date) for `documents`"""
+        raise NotImplementedError
+    
+    def replace_ids(self, user_id, ids, documents):
+        """Swap the sessions whose _id is among `ids` for `documents`"""
+        raise NotImplementedError
+
+
+class RollupRepository:
+    """
+    Interface for compacted events (app/retention.py)
+    
+    A rollup holds the counts of the events stored in one hour that one
+    compaction run folded: {userId, hour, first (smallest event _id),
+    count, types, domains}. Rollups are keyed by (userId, hour, first), so
+    a run repeated after a failure rewrites its own rollups rather than
+    adding to them. Each user also has a compaction state: how far the
+    rollups reach.
+    """
+    
+    def save(self, documents):
+        """Insert or overwrite rollups by (userId, hour, first)"""
+        raise NotImplementedError
+    
+    def partials(self, user_id, start_date, end_date=None):
+        """EventRepository.partials() for the rollups whose hour is within the range"""
+        raise NotImplementedError
+    
+    def count(self, user_id):
+        raise NotImplementedError
+    
+    def state(self, user_id):
+        """{compactedBefore, noisyBefore, foldedUntil, updatedAt}, or None before the first run"""
+        raise NotImplementedError
+    
+    def set_state(self, user_id, state):
+        raise NotImplementedError
+
+
+class TokenRepository:
+    """Interface for revoked JWT ids"""
+    
+    def revoke(self, document):
+        """Record a revocation (a repeated jti is ignored)"""
+        raise NotImplementedError
+    
+    def revoked_since(self, now, since=None):
+        """Unexpired revocations ({jti, expiresAt}), only those revoked at or after `since` if given"""
+        raise NotImplementedError
+
+
+class StringRepository:
+    """
+    Interface for interned strings (app/interning.py): each url or title
+    stored once under its 64-bit id
+    """
+    
+    def find(self, ids):
+        """{id: string} of the ids stored"""
+        raise NotImplementedError
+    
+    def insert(self, strings):
+        """Store {id: string}, skipping ids already stored; returns the set of those ids"""
+        raise NotImplementedError
+
+
+class RateLimitRepository:
+    """
+    Interface for ingest rate limiter state shared by workers (app/events/ratelimit.py)
+    
+    One state per user: {levels: {limit: tokens}, at (seconds since the
+    epoch), version, expiresAt (when every bucket is full again)}.
+    """
+    
+    def get(self, user_id):
+        """The user's state, or None"""
+        raise NotImplementedError
+    
+    def swap(self, user_id, version, state):
+        """Store a state if the stored one is still at `version` (None: none stored); returns whether it was"""
+        raise NotImplementedError
+
+
+class Storage:
+    """
+    A backend's repositories, as handed out by get_storage()
+    
+    `strings` is the backend's StringDictionary (app/interning.py), which
+    its event repository interns and resolves urls and titles with.
+    """
+    
+    name = 'base'
+    
+    def __init__(self, events, users, insights, sessions, tokens, rollups, strings, rate_limits):
+        self.events = events
+        self.users = users
+        self.insights = insights
+        self.sessions = sessions
+        self.tokens = tokens
+        self.rollups = rollups
+        self.strings = strings
+        self.rate_limits = rate_limits
@@ -0,0 +1,327 @@
+from bson import ObjectId
+from pymongo import ReplaceOne, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from app.ai.queries import (
+    daily_stats_pipeline, weekly_top_domains_pipeline, weekly_productive_query,
+    weekly_peak_hour_pipeline, history_query
+)
+from app.analytics.queries import (
+    range_match, dashboard_pipelines, time_spent_query, TIME_SPENT_PROJECTION,
+    productivity_queries, peak_pipeline, partials_pipeline, rollup_partials_pipeline
+)
+from app.database import assign_shard, get_db
+from app.interning import StringDictionary
+from app.events.queries import (
+    apply_date_filter, events_query, recent_query, top_domains_pipeline, event_stats_pipeline, expired_query,
+    LEGACY_QUERY
+)
+from app.models.event import compact_document
+from app.storage.base import (
+    EventRepository, UserRepository, InsightRepository, SessionRepository, TokenRepository, RollupRepository,
+    StringRepository, RateLimitRepository, Storage
+)
+
+# Fields a retention run reads from expired events
+EXPIRED_PROJECTION = {'timestamp': 1, 'type': 1, 'domain': 1}
+
+
+def revoked_query(now, since=None):
+    """Unexpired revocations, optionally only those revoked since `since`"""
+    query = {'expiresAt': {'$gt': now}}
+    if since is not None:
+        query['revokedAt'] = {'$gte': since}
+    return query
+
+
+class MongoEventRepository(EventRepository):
+    """
+    Events in a MongoDB database, queried with the shared query builders
+    
+    With a StringDictionary (`strings`), new events are interned and the
+    raw event listings resolve interned urls and titles.
+    """
+    
+    def __init__(self, db, strings=None):
+        self.collection = db.events
+        self.strings = strings
+    
+    def _resolve(self, documents):
+        return self.strings.resolve_documents(documents) if self.strings is not None else documents
+    
+    def insert_many(self, documents):
+        if self.strings is not None:
+            self.strings.intern_documents(documents)
+        return len(self.collection.insert_many(documents).inserted_ids)
+    
+    def find(self, user_id, filters, limit=100, skip=0):
+        return self._resolve(list(self.collection.find(events_query(user_id, filters))
+                                  .sort('timestamp', -1)
+                                  .limit(limit)
+                                  .skip(skip)))
+    
+    def count(self, user_id, filters=None):
+        return self.collection.count_documents(events_query(user_id, filters or {}))
+    
+    def recent(self, user_id, hours, limit=50):
+        return self._resolve(list(self.collection.find(recent_query(user_id, hours))
+                                  .sort('timestamp', -1)
+                                  .limit(limit)))
+    
+    def top_domains(self, user_id, limit):
+        return list(self.collection.aggregate(top_domains_pipeline(user_id, limit)))
+    
+    def type_stats(self, user_id, filters):
+        match_query = apply_date_filter({'userId': ObjectId(user_id)}, filters)
+        rows = list(self.collection.aggregate(event_stats_pipeline(match_query)))
+        return self.collection.count_documents(match_query), rows
+    
+    def dashboard(self, user_id, start_date, end_date):
+        total = self.collection.count_documents(range_match(user_id, start_date, end_date))
+        results = {
+            name: list(self.collection.aggregate(pipeline))
+            for name, pipeline in dashboard_pipelines(user_id, start_date, end_date).items()
+        }
+        return total, results
+    
+    def activity(self, user_id, start_date, end_date, skip=None):
+        return self.collection.find(
+            time_spent_query(user_id, start_date, end_date, skip),
+            TIME_SPENT_PROJECTION
+        ).sort('timestamp', 1)
+    
+    def productivity_counts(self, user_id, start_date, end_date):
+        return tuple(
+            self.collection.count_documents(query)
+            for query in productivity_queries(user_id, start_date, end_date)
+        )
+    
+    def peaks(self, user_id, start_date, end_date):
+        return (
+            list(self.collection.aggregate(peak_pipeline(user_id, start_date, end_date, '$hour'))),
+            list(self.collection.aggregate(peak_pipeline(user_id, start_date, end_date, '$dayOfWeek')))
+        )
+    
+    def daily_stats(self, user_id, start_time, end_time):
+        return next(self.collection.aggregate(daily_stats_pipeline(user_id, start_time, end_time)), {})
+    
+    def weekly_stats(self, user_id, start_date, end_date):
+        return (
+            self.collection.count_documents(range_match(user_id, start_date, end_date)),
+            list(self.collection.aggregate(weekly_top_domains_pipeline(user_id, start_date, end_date))),
+            self.collection.count_documents(weekly_productive_query(user_id, start_date, end_date)),
+            list(self.collection.aggregate(weekly_peak_hour_pipeline(user_id, start_date, end_date)))
+        )
+    
+    def partials(self, user_id, start_date, end_date=None, skip=None):
+        return next(self.collection.aggregate(partials_pipeline(user_id, start_date, end_date, skip)), {})
+    
+    def expired(self, user_id, before, noisy_types=(), noisy_before=None, inserted_before=None):
+        query = expired_query(user_id, before, noisy_types, noisy_before, inserted_before)
+        return self.collection.find(query, EXPIRED_PROJECTION).sort('timestamp', 1)
+    
+    def delete_expired(self, user_id, before, noisy_types=(), noisy_before=None, inserted_before=None, limit=1000):
+        query = expired_query(user_id, before, noisy_types, noisy_before, inserted_before)
+        ids = [document['_id'] for document in self.collection.find(query, {'_id': 1}).limit(limit)]
+        if not ids:
+            return 0
+        return self.collection.delete_many({'_id': {'$in': ids}}).deleted_count
+    
+    def count_legacy(self):
+        return self.collection.count_documents(LEGACY_QUERY)
+    
+    def compact_legacy(self, after=None, limit=1000):
+        query = dict(LEGACY_QUERY, _id={'$gt': after}) if after is not None else LEGACY_QUERY
+        documents = list(self.collection.find(query).sort('_id', 1).limit(limit))
+        if documents:
+            compacted = [compact_document(document) for document in documents]
+            if self.strings is not None:
+                self.strings.intern_documents(compacted)
+            # Still matching the old layout, so a concurrent run cannot rewrite over a newer write
+            self.collection.bulk_write([
+                ReplaceOne({'_id': document['_id'], **LEGACY_QUERY}, document)
+                for document in compacted
+            ], ordered=False)
+        return len(documents), documents[-1]['_id'] if documents and len(documents) == limit else None
+
+
+class MongoUserRepository(UserRepository):
+    def __init__(self, db):
+        self.collection = db.users
+    
+    def insert(self, document):
+        user_id = self.collection.insert_one(document).inserted_id
+        # Pin the user's events and insights to a shard
+        assign_shard(user_id)
+        return user_id
+    
+    def find_by_id(self, user_id):
+        return self.collection.find_one({'_id': ObjectId(user_id)})
+    
+    def find_by_email(self, email):
+        return self.collection.find_one({'email': email})
+    
+    def replace_password_hash(self, user_id, old_hash, new_hash):
+        self.collection.update_one(
+            {'_id': ObjectId(user_id), 'passwordHash': old_hash},
+            {'$set': {'passwordHash': new_hash}}
+        )
+    
+    def update_profile(self, user_id, fields):
+        # Only match when something actually changes, so a no-op update
+        # and a missing user both come back as None in one round trip
+        return self.collection.find_one_and_update(
+            {
+                '_id': ObjectId(user_id),
+                '$or': [{field: {'$ne': value}} for field, value in fields.items()]
+            },
+            {'$set': fields},
+            return_document=ReturnDocument.AFTER
+        )
+    
+    def settings(self):
+        for user in self.collection.find({}, {'settings': 1}):
+            yield user['_id'], user.get('settings') or {}
+
+
+class MongoInsightRepository(InsightRepository):
+    def __init__(self, db):
+        self.collection = db.insights
+    
+    def insert(self, document):
+        self.collection.insert_one(document)
+    
+    def history(self, user_id, limit=10):
+        return list(self.collection.find(history_query(user_id)).sort('date', -1).limit(limit))
+
+
+class MongoSessionRepository(SessionRepository):
+    def __init__(self, db):
+        self.collection = db.sessions
+    
+    def insert_many(self, documents):
+        if documents:
+            self.collection.insert_many(documents)
+    
+    def find(self, user_id, start_date, end_date):
+        return list(self.collection.find({
+            'userId': ObjectId(user_id),
+            'startTime': {'$gte': start_date, '$lte': end_date}
+        }).sort('startTime', -1))
+    
+    def replace(self, user_id, start_date, end_date, documents):
+        start_time = {'$lt': end_date}
+        if start_date is not None:
+            start_time['$gte'] = start_date
+        self.collection.delete_many({'userId': ObjectId(user_id), 'startTime': start_time})
+        self.insert_many(documents)
+    
+    def replace_ids(self, user_id, ids, documents):
+        self.collection.delete_many({'userId': ObjectId(user_id), '_id': {'$in': list(ids)}})
+        self.insert_many(documents)
+
+
+class MongoRollupRepository(RollupRepository):
+    def __init__(self, db):
+        self.collection = db.event_rollups
+        self.states = db.compaction_state
+    
+    def save(self, documents):
+        if documents:
+            self.collection.bulk_write([
+                ReplaceOne({key: document[key] for key in ('userId', 'hour', 'first')}, document, upsert=True)
+                for document in documents
+            ], ordered=False)
+    
+    def partials(self, user_id, start_date, end_date=None):
+        return next(self.collection.aggregate(rollup_partials_pipeline(user_id, start_date, end_date)), {})
+    
+    def count(self, user_id):
+        return self.collection.count_documents({'userId': ObjectId(user_id)})
+    
+    def state(self, user_id):
+        return self.states.find_one({'userId': ObjectId(user_id)}, {'_id': 0})
+    
+    def set_state(self, user_id, state):
+        self.states.replace_one({'userId': ObjectId(user_id)}, {**state, 'userId': ObjectId(user_id)}, upsert=True)
+
+
+class MongoStringRepository(StringRepository):
+    """Interned strings as {_id: id, s: string}, in the home database so shard moves never copy them"""
+    
+    def __init__(self, db):
+        self.collection = db.strings
+    
+    def find(self, ids):
+        return {document['_id']: document['s'] for document in self.collection.find({'_id': {'$in': list(ids)}})}
+    
+    def insert(self, strings):
+        try:
+            self.collection.insert_many([{'_id': key, 's': value} for key, value in strings.items()], ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            if any(error.get('code') != 11000 for error in errors):
+                raise
+            return {error['op']['_id'] for error in errors}
+        return set()
+
+
+class MongoRateLimitRepository(RateLimitRepository):
+    """Limiter state by user id in `rate_limits`, removed by a TTL index once every bucket is full"""
+    
+    def __init__(self, db):
+        self.collection = db.rate_limits
+    
+    def get(self, user_id):
+        return self.collection.find_one({'_id': user_id})
+    
+    def swap(self, user_id, version, state):
+        if version is None:
+            try:
+                self.collection.insert_one({'_id': user_id, **state})
+                return True
+            except DuplicateKeyError:
+                return False
+        return self.collection.update_one({'_id': user_id, 'version': version}, {'$set': state}).matched_count == 1
+
+
+class MongoTokenRepository(TokenRepository):
+    PROJECTION = {'jti': 1, 'expiresAt': 1, '_id': 0}
+    
+    def __init__(self, db):
+        self.collection = db.revoked_tokens
+    
+    def revoke(self, document):
+        try:
+            self.collection.insert_one(document)
+        except DuplicateKeyError:
+            pass  # Already revoked
+    
+    def revoked_since(self, now, since=None):
+        return self.collection.find(revoked_query(now, since), self.PROJECTION)
+
+
+class MongoStorage(Storage):
+    """
+    Repositories over the MongoDB databases get_db() hands out
+    
+    Users, revoked tokens, interned strings and rate limits always live in
+    the home database; events, insights, sessions and rollups in the
+    user's shard, through the workload class's client.
+    """
+    
+    name = 'mongodb'
+    
+    def __init__(self, workload='default', user_id=None):
+        home = get_db()
+        data = get_db(workload, user_id) if (workload, user_id) != ('default', None) else home
+        strings = StringDictionary(MongoStringRepository(home))
+        super().__init__(
+            events=MongoEventRepository(data, strings),
+            users=MongoUserRepository(home),
+            insights=MongoInsightRepository(data),
+            sessions=MongoSessionRepository(data),
+            tokens=MongoTokenRepository(home),
+            rollups=MongoRollupRepository(data),
+            strings=strings,
+            rate_limits=MongoRateLimitRepository(home)
+        )
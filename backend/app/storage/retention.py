@@ -0,0 +1,84 @@
+from datetime import timedelta
+from itertools import chain
+from app.archive import Partials
+from app.storage.archive import ArchivedEventRepository
+
+# How far before a range to look for sessions that run into it
+SESSION_LOOKBACK = timedelta(days=1)
+
+
+def _overlap(session, start_date, end_date):
+    """Share of a session's time within [start_date, end_date], assuming it is spread evenly"""
+    start, end = session['startTime'], session['endTime']
+    if end <= start:
+        return 1.0 if start_date <= start <= end_date else 0.0
+    return max(0.0, (min(end, end_date) - max(start, start_date)) / (end - start))
+
+
+class CompactedEventRepository(ArchivedEventRepository):
+    """
+    An event repository federated with the rollups and sessions of compacted events (app/retention.py)
+    
+    The same merge as ArchivedEventRepository, with a different cold
+    tier: rollups count the events before the user's watermarks (by the
+    hour), sessions stand in for their tab activity, and the hot tier
+    serves the rest, including events below the watermarks (tab activity
+    too) that no run has folded yet. Ranges after the noisy watermark go
+    straight to the hot repository, as do the raw event listings.
+    """
+    
+    def __init__(self, hot, rollups, sessions, noisy_types):
+        self.hot = hot
+        self.rollups = rollups
+        self.sessions = sessions
+        self.noisy_types = noisy_types
+    
+    def expired(self, user_id, before, noisy_types=(), noisy_before=None, inserted_before=None):
+        return self.hot.expired(user_id, before, noisy_types, noisy_before, inserted_before)
+    
+    def delete_expired(self, user_id, before, noisy_types=(), noisy_before=None, inserted_before=None, limit=1000):
+        return self.hot.delete_expired(user_id, before, noisy_types, noisy_before, inserted_before, limit)
+    
+    def _cutoff(self, user_id, start_date):
+        """The user's compaction state when [start_date, ...] reaches into the rollups, else None"""
+        state = self.rollups.state(user_id)
+        if state is None or (start_date is not None and start_date >= state['noisyBefore']):
+            return None
+        return state
+    
+    def _folded(self, state):
+        """The `skip` for the hot tier: events the runs so far have folded, as expired() takes them"""
+        return state['compactedBefore'], self.noisy_types, state['noisyBefore'], state.get('foldedUntil')
+    
+    def _partials(self, user_id, start_date, end_date, state):
+        # The hot tier over the whole range, less what the rollups hold: raw events below
+        # the watermarks that a run has not folded yet (stored since it started) still count
+        partials = Partials(self.rollups.partials(user_id, start_date, end_date))
+        partials.add(self.hot.partials(user_id, start_date, end_date, skip=self._folded(state)))
+        return partials
+    
+    def activity(self, user_id, start_date, end_date):
+        state = self._cutoff(user_id, start_date)
+        if state is None or start_date >= state['compactedBefore']:
+            return self.hot.activity(user_id, start_date, end_date)
+        
+        # Sessions as already attributed spans (see compute_domain_time), then the raw events
+        # less the folded ones, so late activity below the watermark still counts
+        before = state['compactedBefore']
+        sessions = []
+        for session in reversed(self.sessions.find(user_id, start_date - SESSION_LOOKBACK, min(end_date, before))):
+            share = _overlap(session, start_date, end_date)
+            if share and session['startTime'] < before:
+                sessions.extend(
+                    {'timestamp': session['startTime'], 'domain': domain['_id'], 'minutes': domain['minutes'] * share}
+                    for domain in session['domains']
+                )
+        return chain(sessions, self.hot.activity(user_id, start_date, end_date, skip=self._folded(state)))
+    
+    def partials(self, user_id, start_date, end_date=None, skip=None):
+        state = self._cutoff(user_id, start_date)
+        if state is None:
+            return self.hot.partials(user_id, start_date, end_date, skip)
+        
+        partials = self._partials(user_id, start_date, end_date, state)
+        return {field: partials.rows(field) for field in partials.counts} | {'domains': partials.top_domains(None)}
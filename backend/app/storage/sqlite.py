@@ -0,0 +1,776 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId, json_util
+from app.ai.gemini import PROMPT_MAX_DOMAINS, PROMPT_MAX_EVENT_TYPES
+from app.ai.queries import WEEKLY_PRODUCTIVE_PATTERN
+from app.analytics.queries import ACTIVITY_EVENT_TYPES, PRODUCTIVE_DOMAINS, SOCIAL_DOMAINS
+from app.interning import StringDictionary
+from app.models.event import (
+    COMPACT_FIELDS, EXTRA_FIELD, INTERNED_FIELDS, SCHEMA_VERSION, compact_document, expand_document
+)
+from app.storage.base import (
+    EventRepository, UserRepository, InsightRepository, SessionRepository, TokenRepository, RollupRepository,
+    StringRepository, RateLimitRepository, Storage
+)
+
+# Events get real columns so every filter and group-by is answered from the
+# (user_id, timestamp, type, domain) index alone; the dashboard, time-spent
+# and report aggregations never touch the wide url/title/payload rows.
+# Other collections keep their MongoDB document as JSON next to the keys
+# they are looked up by.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    type TEXT,
+    domain TEXT,
+    window_id,
+    tab_id,
+    url TEXT,
+    title TEXT,
+    payload TEXT
+);
+CREATE INDEX IF NOT EXISTS events_user_time ON events (user_id, timestamp, type, domain);
+
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    email TEXT UNIQUE,
+    document TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS insights (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    date TEXT,
+    document TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS insights_user_date ON insights (user_id, date);
+
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    start_time TEXT,
+    document TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_user_start ON sessions (user_id, start_time);
+
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    jti TEXT PRIMARY KEY,
+    user_id TEXT,
+    type TEXT,
+    revoked_at TEXT NOT NULL,
+    expires_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS revoked_tokens_revoked_at ON revoked_tokens (revoked_at);
+CREATE INDEX IF NOT EXISTS revoked_tokens_expires_at ON revoked_tokens (expires_at);
+
+-- Counts of compacted events by hour; types and domains are JSON arrays that partials() sums in SQL
+CREATE TABLE IF NOT EXISTS event_rollups (
+    user_id TEXT NOT NULL,
+    hour TEXT NOT NULL,
+    first TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    types TEXT NOT NULL,
+    domains TEXT NOT NULL,
+    PRIMARY KEY (user_id, hour, first)
+);
+
+CREATE TABLE IF NOT EXISTS compaction_state (
+    user_id TEXT PRIMARY KEY,
+    document TEXT NOT NULL
+);
+
+-- Interned urls and titles by 64-bit id; events hold the id as an 8-byte BLOB in url / title
+CREATE TABLE IF NOT EXISTS strings (
+    id INTEGER PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS rate_limits (
+    user_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    document TEXT NOT NULL
+);
+"""
+
+EVENT_COLUMNS = 'id, user_id, timestamp, type, domain, window_id, tab_id, url, title, payload'
+
+# Rows written before the compact layout (app/models/event.py) keep the whole
+# extension record in `payload`, repeating the columns; compact rows never do
+# (an id that is not a scalar stays in the payload, see _event_row())
+LEGACY_PAYLOAD = (
+    "(json_type(payload, '$.url') IS NOT NULL OR json_type(payload, '$.title') IS NOT NULL "
+    "OR json_type(payload, '$.tabId') NOT IN ('object', 'array') "
+    "OR json_type(payload, '$.windowId') NOT IN ('object', 'array') "
+    "OR json_extract(payload, '$.type') IS type)"
+)
+
+# Hour and day of week ($hour, $dayOfWeek: 1 = Sunday) of a stored timestamp
+HOUR = 'CAST(substr(timestamp, 12, 2) AS INTEGER)'
+DAY_OF_WEEK = "CAST(strftime('%w', timestamp) AS INTEGER) + 1"
+
+
+def _ts(value):
+    """
+    Sortable text for a datetime: naive UTC to the millisecond, as BSON
+    stores it, so range filters and ordering match the MongoDB backend
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime('%Y-%m-%d %H:%M:%S.') + f'{value.microsecond // 1000:03d}'
+
+
+def _datetime(text):
+    return datetime.fromisoformat(text) if text else None
+
+
+def _limit(limit):
+    """SQL LIMIT for a pymongo-style limit (0 means none)"""
+    return abs(limit) or -1
+
+
+def _scalar(value):
+    """Whether a loosely typed field fits a column (ids from the extension are usually ints)"""
+    return value is None or isinstance(value, (int, float, str))
+
+
+def _dump(document):
+    return json_util.dumps({key: value for key, value in document.items() if key != '_id'})
+
+
+def _load(row_id, text):
+    return {'_id': ObjectId(row_id), **json_util.loads(text)}
+
+
+def _regexp(pattern, value):
+    return value is not None and re.search(pattern, value) is not None
+
+
+def _where(user_id, start_date=None, end_date=None, **equal):
+    """WHERE clause and parameters for a user's events, optionally in a range"""
+    clauses = ['user_id = ?']
+    params = [str(ObjectId(user_id))]
+    
+    if start_date is not None:
+        clauses.append('timestamp >= ?')
+        params.append(_ts(start_date))
+    if end_date is not None:
+        clauses.append('timestamp <= ?')
+        params.append(_ts(end_date))
+    for column, value in equal.items():
+        if value:
+            clauses.append(f'{column} = ?')
+            params.append(value)
+    
+    return ' AND '.join(clauses), params
+
+
+def _expired_where(user_id, before, noisy_types=(), noisy_before=None, inserted_before=None):
+    """WHERE clause and parameters for expired_query()"""
+    where = 'user_id = ? AND (timestamp < ?'
+    params = [str(ObjectId(user_id)), _ts(before)]
+    
+    if noisy_types and noisy_before is not None:
+        # IFNULL: NOT (...) in partials() must be true, not NULL, for untyped events
+        where += f" OR (IFNULL(type, '') IN ({_placeholders(noisy_types)}) AND timestamp < ?)"
+        params += [*noisy_types, _ts(noisy_before)]
+    where += ')'
+    # Hex ObjectIds sort like the ObjectIds, so this compares creation times
+    if inserted_before is not None:
+        where += ' AND id < ?'
+        params.append(str(ObjectId.from_datetime(inserted_before)))
+    
+    return where, params
+
+
+def _unfolded(user_id, where, params, skip=None):
+    """Narrow a WHERE clause to events not in a cold tier yet: `skip` holds _expired_where()'s arguments"""
+    if skip is None:
+        return where, params
+    folded, folded_params = _expired_where(user_id, *skip)
+    return f'{where} AND NOT ({folded})', [*params, *folded_params]
+
+
+def _event_row(document):
+    """EVENT_COLUMNS values for an event document in either layout"""
+    stored = compact_document(document)
+    extra = dict(stored.get(EXTRA_FIELD) or {})
+    ids = []
+    for field in ('windowId', 'tabId'):
+        value = stored.get(COMPACT_FIELDS[field])
+        if not _scalar(value):
+            # Kept with its type in the payload, which expand_document() merges back
+            extra[field], value = value, None
+        ids.append(value)
+    strings = []
+    for field in ('url', 'title'):
+        value = stored.get(COMPACT_FIELDS[field])
+        if INTERNED_FIELDS[field] in stored:
+            # A BLOB keeps its type in a TEXT column, where an integer would become text
+            value = stored[INTERNED_FIELDS[field]].to_bytes(8, 'big', signed=True)
+        strings.append(value)
+    
+    return (
+        str(stored['_id']),
+        str(stored['userId']),
+        _ts(stored['timestamp']),
+        stored.get('type'),
+        stored.get('domain'),
+        *ids,
+        *strings,
+        json_util.dumps(extra) if extra else None
+    )
+
+
+def _event(row):
+    """An events row (EVENT_COLUMNS) as a compact layout document"""
+    document = {
+        '_id': ObjectId(row[0]),
+        'userId': ObjectId(row[1]),
+        'timestamp': _datetime(row[2]),
+        'type': row[3],
+        'domain': row[4],
+        'v': SCHEMA_VERSION
+    }
+    for field, value in zip(('windowId', 'tabId', 'url', 'title'), row[5:9]):
+        if isinstance(value, bytes):
+            document[INTERNED_FIELDS[field]] = int.from_bytes(value, 'big', signed=True)
+        elif value is not None:
+            document[COMPACT_FIELDS[field]] = value
+    # A legacy row's whole payload, which expand_document() merges the same way
+    payload = json_util.loads(row[9]) if row[9] else None
+    if payload:
+        document[EXTRA_FIELD] = payload
+    return document
+
+
+def _filter_dates(filters):
+    """(start, end) datetimes from ?start_date= / ?end_date=, as apply_date_filter reads them"""
+    start_date, end_date = filters.get('start_date'), filters.get('end_date')
+    return (
+        datetime.fromisoformat(start_date) if start_date else None,
+        datetime.fromisoformat(end_date) if end_date else None
+    )
+
+
+def _placeholders(values):
+    return ', '.join('?' * len(values))
+
+
+class SQLiteDatabase:
+    """
+    Connections to one SQLite file, one per thread and process
+    
+    The database runs in WAL mode, so readers never block the writer and
+    several gunicorn workers can share the file; writers queue on the lock
+    for up to `busy_timeout_ms`. Connections are in autocommit mode and
+    multi-statement writes go through `transaction()`.
+    """
+    
+    def __init__(self, path, busy_timeout_ms=5000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._pid = os.getpid()
+        self._local = threading.local()
+        self._schema_ready = False
+        self._lock = threading.Lock()
+    
+    def connection(self):
+        if self._pid != os.getpid():
+            # Never reuse a connection inherited across fork
+            self._pid = os.getpid()
+            self._local = threading.local()
+            self._lock = threading.Lock()
+        
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+    
+    def _connect(self):
+        connection = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000,
+            isolation_level=None,
+            uri=self.path.startswith('file:')
+        )
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute(f'PRAGMA busy_timeout={int(self.busy_timeout_ms)}')
+        connection.create_function('REGEXP', 2, _regexp, deterministic=True)
+        
+        with self._lock:
+            if not self._schema_ready:
+                connection.executescript(SCHEMA)
+                self._schema_ready = True
+        
+        return connection
+    
+    @contextmanager
+    def transaction(self):
+        """Write transaction holding the database lock from the start"""
+        connection = self.connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+    
+    def execute(self, sql, params=()):
+        return self.connection().execute(sql, params)
+
+
+class SQLiteEventRepository(EventRepository):
+    """
+    Events in SQLite, aggregated with SQL equivalents of the MongoDB pipelines
+    
+    With a StringDictionary (`strings`), new events are interned and the
+    raw event listings resolve interned urls and titles.
+    """
+    
+    def __init__(self, database, strings=None):
+        self.database = database
+        self.strings = strings
+    
+    def insert_many(self, documents):
+        for document in documents:
+            document.setdefault('_id', ObjectId())
+        stored = [compact_document(document) for document in documents]
+        if self.strings is not None:
+            self.strings.intern_documents(stored)
+        rows = [_event_row(document) for document in stored]
+        
+        # One transaction per batch: a single commit however many events it holds
+        if rows:
+            with self.database.transaction() as connection:
+                connection.executemany(f'INSERT INTO events ({EVENT_COLUMNS}) VALUES ({_placeholders(rows[0])})', rows)
+        return len(rows)
+    
+    def _events(self, where, params, order, limit, skip=0):
+        rows = self.database.execute(
+            f'SELECT {EVENT_COLUMNS} FROM events WHERE {where} ORDER BY timestamp {order} LIMIT ? OFFSET ?',
+            [*params, _limit(limit), skip]
+        )
+        documents = [_event(row) for row in rows]
+        return self.strings.resolve_documents(documents) if self.strings is not None else documents
+    
+    def _count(self, where, params):
+        return self.database.execute(f'SELECT COUNT(*) FROM events WHERE {where}', params).fetchone()[0]
+    
+    def _group(self, key, where, params, order='count DESC, _id', limit=None):
+        """Rows of {_id, count} grouped by an SQL expression"""
+        sql = f'SELECT {key} AS _id, COUNT(*) AS count FROM events WHERE {where} GROUP BY 1 ORDER BY {order}'
+        if limit is not None:
+            sql += f' LIMIT {int(limit)}'
+        return [{'_id': row[0], 'count': row[1]} for row in self.database.execute(sql, params)]
+    
+    def find(self, user_id, filters, limit=100, skip=0):
+        start_date, end_date = _filter_dates(filters)
+        where, params = _where(user_id, start_date, end_date, type=filters.get('type'), domain=filters.get('domain'))
+        return self._events(where, params, 'DESC', limit, skip)
+    
+    def count(self, user_id, filters=None):
+        filters = filters or {}
+        start_date, end_date = _filter_dates(filters)
+        return self._count(*_where(user_id, start_date, end_date, type=filters.get('type'), domain=filters.get('domain')))
+    
+    def recent(self, user_id, hours, limit=50):
+        where, params = _where(user_id, datetime.utcnow() - timedelta(hours=hours))
+        return self._events(where, params, 'DESC', limit)
+    
+    def top_domains(self, user_id, limit):
+        where, params = _where(user_id)
+        rows = self.database.execute(
+            f'SELECT domain, COUNT(*), MAX(timestamp) FROM events WHERE {where} AND domain IS NOT NULL '
+            f'GROUP BY domain ORDER BY 2 DESC, 1 LIMIT ?',
+            [*params, _limit(limit)]
+        )
+        return [{'_id': row[0], 'count': row[1], 'lastVisit': _datetime(row[2])} for row in rows]
+    
+    def type_stats(self, user_id, filters):
+        rows = self._group('type', *_where(user_id, *_filter_dates(filters)))
+        return sum(row['count'] for row in rows), rows
+    
+    def dashboard(self, user_id, start_date, end_date):
+        where, params = _where(user_id, start_date, end_date)
+        results = {
+            'daily_events': self._group('substr(timestamp, 1, 10)', where, params, order='_id'),
+            'top_domains': self._group('domain', f'{where} AND domain IS NOT NULL', params, limit=10),
+            'event_types': self._group('type', where, params),
+            'hourly_activity': self._group(HOUR, where, params, order='_id')
+        }
+        return sum(row['count'] for row in results['daily_events']), results
+    
+    def activity(self, user_id, start_date, end_date, skip=None):
+        where, params = _unfolded(user_id, *_where(user_id, start_date, end_date), skip)
+        rows = self.database.execute(
+            f'SELECT timestamp, domain FROM events WHERE {where} '
+            f'AND type IN ({_placeholders(ACTIVITY_EVENT_TYPES)}) AND domain IS NOT NULL ORDER BY timestamp',
+            [*params, *ACTIVITY_EVENT_TYPES]
+        )
+        return ({'timestamp': _datetime(row[0]), 'domain': row[1]} for row in rows)
+    
+    def productivity_counts(self, user_id, start_date, end_date):
+        # All three counts in one pass over the range
+        where, params = _where(user_id, start_date, end_date)
+        row = self.database.execute(
+            f'SELECT COALESCE(SUM(domain IN ({_placeholders(PRODUCTIVE_DOMAINS)})), 0), '
+            f'COALESCE(SUM(domain IN ({_placeholders(SOCIAL_DOMAINS)})), 0), COUNT(domain) '
+            f'FROM events WHERE {where}',
+            [*PRODUCTIVE_DOMAINS, *SOCIAL_DOMAINS, *params]
+        ).fetchone()
+        return tuple(row)
+    
+    def peaks(self, user_id, start_date, end_date):
+        where, params = _where(user_id, start_date, end_date)
+        return (
+            self._group(HOUR, where, params, limit=1),
+            self._group(DAY_OF_WEEK, where, params, limit=1)
+        )
+    
+    def daily_stats(self, user_id, start_time, end_time):
+        where, params = _where(user_id, start_time, end_time)
+        total = self._count(where, params)
+        return {
+            'total': [{'count': total}] if total else [],
+            'top_domains': self._group('domain', f'{where} AND domain IS NOT NULL', params, limit=PROMPT_MAX_DOMAINS),
+            'event_types': self._group('type', where, params, limit=PROMPT_MAX_EVENT_TYPES),
+            'hourly_activity': self._group(HOUR, where, params, order='_id')
+        }
+    
+    def weekly_stats(self, user_id, start_date, end_date):
+        where, params = _where(user_id, start_date, end_date)
+        return (
+            self._count(where, params),
+            self._group('domain', f'{where} AND domain IS NOT NULL', params, limit=10),
+            self._count(f'{where} AND domain REGEXP ?', [*params, WEEKLY_PRODUCTIVE_PATTERN]),
+            self._group(HOUR, where, params, limit=1)
+        )
+    
+    def partials(self, user_id, start_date, end_date=None, skip=None):
+        where, params = _unfolded(user_id, *_where(user_id, start_date, end_date), skip)
+        domains = self.database.execute(
+            f'SELECT domain, COUNT(*), MAX(timestamp) FROM events WHERE {where} AND domain IS NOT NULL GROUP BY domain',
+            params
+        )
+        return {
+            'days': self._group('substr(timestamp, 1, 10)', where, params, order='_id'),
+            'hours': self._group(HOUR, where, params, order='_id'),
+            'weekdays': self._group(DAY_OF_WEEK, where, params, order='_id'),
+            'types': self._group('type', where, params),
+            'domains': [{'_id': row[0], 'count': row[1], 'lastVisit': _datetime(row[2])} for row in domains]
+        }
+    
+    def expired(self, user_id, before, noisy_types=(), noisy_before=None, inserted_before=None):
+        where, params = _expired_where(user_id, before, noisy_types, noisy_before, inserted_before)
+        rows = self.database.execute(f'SELECT id, timestamp, type, domain FROM events WHERE {where} ORDER BY timestamp', params)
+        return (
+            {'_id': ObjectId(row[0]), 'timestamp': _datetime(row[1]), 'type': row[2], 'domain': row[3]}
+            for row in rows
+        )
+    
+    def delete_expired(self, user_id, before, noisy_types=(), noisy_before=None, inserted_before=None, limit=1000):
+        where, params = _expired_where(user_id, before, noisy_types, noisy_before, inserted_before)
+        with self.database.transaction() as connection:
+            return connection.execute(
+                f'DELETE FROM events WHERE id IN (SELECT id FROM events WHERE {where} LIMIT ?)',
+                [*params, _limit(limit)]
+            ).rowcount
+    
+    def count_legacy(self):
+        return self._count(LEGACY_PAYLOAD, [])
+    
+    def compact_legacy(self, after=None, limit=1000):
+        rows = self.database.execute(
+            f'SELECT {EVENT_COLUMNS} FROM events WHERE id > ? AND {LEGACY_PAYLOAD} ORDER BY id LIMIT ?',
+            (str(after) if after is not None else '', _limit(limit))
+        ).fetchall()
+        documents = [compact_document(expand_document(_event(row))) for row in rows]
+        if self.strings is not None:
+            self.strings.intern_documents(documents)
+        # The columns already hold the fields the payload repeated: only it, and interned strings, change
+        updates = [(*_event_row(document)[7:], str(document['_id'])) for document in documents]
+        with self.database.transaction() as connection:
+            connection.executemany('UPDATE events SET url = ?, title = ?, payload = ? WHERE id = ?', updates)
+        return len(rows), ObjectId(rows[-1][0]) if rows and len(rows) == limit else None
+
+
+class SQLiteUserRepository(UserRepository):
+    def __init__(self, database):
+        self.database = database
+    
+    def insert(self, document):
+        user_id = document.setdefault('_id', ObjectId())
+        self.database.execute(
+            'INSERT INTO users (id, email, document) VALUES (?, ?, ?)',
+            (str(user_id), document.get('email'), _dump(document))
+        )
+        return user_id
+    
+    def _find(self, column, value):
+        row = self.database.execute(f'SELECT id, document FROM users WHERE {column} = ?', (value,)).fetchone()
+        return _load(*row) if row else None
+    
+    def find_by_id(self, user_id):
+        return self._find('id', str(ObjectId(user_id)))
+    
+    def find_by_email(self, email):
+        return self._find('email', email)
+    
+    def replace_password_hash(self, user_id, old_hash, new_hash):
+        self.database.execute(
+            "UPDATE users SET document = json_set(document, '$.passwordHash', ?) "
+            "WHERE id = ? AND json_extract(document, '$.passwordHash') = ?",
+            (new_hash, str(ObjectId(user_id)), old_hash)
+        )
+    
+    def update_profile(self, user_id, fields):
+        with self.database.transaction() as connection:
+            row = connection.execute('SELECT id, document FROM users WHERE id = ?', (str(ObjectId(user_id)),)).fetchone()
+            if row is None:
+                return None
+            
+            user = _load(*row)
+            if all(user.get(field) == value for field, value in fields.items()):
+                return None
+            
+            user.update(fields)
+            connection.execute('UPDATE users SET document = ? WHERE id = ?', (_dump(user), row[0]))
+            return user
+    
+    def settings(self):
+        for row in self.database.execute("SELECT id, json_extract(document, '$.settings') FROM users"):
+            yield ObjectId(row[0]), json_util.loads(row[1]) if row[1] else {}
+
+
+class SQLiteInsightRepository(InsightRepository):
+    def __init__(self, database):
+        self.database = database
+    
+    def insert(self, document):
+        document.setdefault('_id', ObjectId())
+        self.database.execute(
+            'INSERT INTO insights (id, user_id, date, document) VALUES (?, ?, ?, ?)',
+            (str(document['_id']), str(document['userId']), _ts(document['date']) if document.get('date') else None,
+             _dump(document))
+        )
+    
+    def history(self, user_id, limit=10):
+        rows = self.database.execute(
+            'SELECT id, document FROM insights WHERE user_id = ? ORDER BY date DESC LIMIT ?',
+            (str(ObjectId(user_id)), _limit(limit))
+        )
+        return [_load(*row) for row in rows]
+
+
+class SQLiteSessionRepository(SessionRepository):
+    def __init__(self, database):
+        self.database = database
+    
+    def _rows(self, documents):
+        rows = []
+        for document in documents:
+            document.setdefault('_id', ObjectId())
+            rows.append((str(document['_id']), str(document['userId']), _ts(document['startTime']), _dump(document)))
+        return rows
+    
+    def insert_many(self, documents):
+        with self.database.transaction() as connection:
+            connection.executemany('INSERT INTO sessions (id, user_id, start_time, document) VALUES (?, ?, ?, ?)',
+                                   self._rows(documents))
+    
+    def find(self, user_id, start_date, end_date):
+        rows = self.database.execute(
+            'SELECT id, document FROM sessions WHERE user_id = ? AND start_time >= ? AND start_time <= ? '
+            'ORDER BY start_time DESC',
+            (str(ObjectId(user_id)), _ts(start_date), _ts(end_date))
+        )
+        return [_load(*row) for row in rows]
+    
+    def replace(self, user_id, start_date, end_date, documents):
+        with self.database.transaction() as connection:
+            connection.execute(
+                'DELETE FROM sessions WHERE user_id = ? AND start_time >= ? AND start_time < ?',
+                (str(ObjectId(user_id)), _ts(start_date) if start_date is not None else '', _ts(end_date))
+            )
+            connection.executemany('INSERT INTO sessions (id, user_id, start_time, document) VALUES (?, ?, ?, ?)',
+                                   self._rows(documents))
+    
+    def replace_ids(self, user_id, ids, documents):
+        user = str(ObjectId(user_id))
+        with self.database.transaction() as connection:
+            connection.executemany('DELETE FROM sessions WHERE user_id = ? AND id = ?',
+                                   [(user, str(session_id)) for session_id in ids])
+            connection.executemany('INSERT INTO sessions (id, user_id, start_time, document) VALUES (?, ?, ?, ?)',
+                                   self._rows(documents))
+
+
+class SQLiteRollupRepository(RollupRepository):
+    def __init__(self, database):
+        self.database = database
+    
+    def save(self, documents):
+        rows = [
+            (
+                str(document['userId']),
+                _ts(document['hour']),
+                str(document['first']),
+                document['count'],
+                json.dumps([[row['_id'], row['count']] for row in document['types']]),
+                json.dumps([[row['_id'], row['count'], _ts(row['lastVisit'])] for row in document['domains']])
+            )
+            for document in documents
+        ]
+        with self.database.transaction() as connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO event_rollups (user_id, hour, first, count, types, domains) '
+                'VALUES (?, ?, ?, ?, ?, ?)', rows
+            )
+    
+    def _sum(self, key, total, where, params, source='event_rollups'):
+        """Rows of {_id, count}: `total` summed by an SQL expression"""
+        sql = f'SELECT {key} AS _id, SUM({total}) FROM {source} WHERE {where} GROUP BY 1 ORDER BY 1'
+        return [{'_id': row[0], 'count': row[1]} for row in self.database.execute(sql, params)]
+    
+    def partials(self, user_id, start_date, end_date=None):
+        where, params = 'user_id = ? AND hour >= ?', [str(ObjectId(user_id)), _ts(start_date) if start_date is not None else '']
+        if end_date is not None:
+            where += ' AND hour <= ?'
+            params.append(_ts(end_date))
+        
+        # Types and domains are JSON arrays of [value, count(, last visit)], added up across hours with json_each
+        domains = self.database.execute(
+            "SELECT json_extract(value, '$[0]'), SUM(json_extract(value, '$[1]')), MAX(json_extract(value, '$[2]')) "
+            f'FROM event_rollups, json_each(event_rollups.domains) WHERE {where} GROUP BY 1',
+            params
+        )
+        return {
+            'days': self._sum('substr(hour, 1, 10)', 'count', where, params),
+            'hours': self._sum('CAST(substr(hour, 12, 2) AS INTEGER)', 'count', where, params),
+            'weekdays': self._sum("CAST(strftime('%w', hour) AS INTEGER) + 1", 'count', where, params),
+            'types': self._sum("json_extract(value, '$[0]')", "json_extract(value, '$[1]')", where, params,
+                              'event_rollups, json_each(event_rollups.types)'),
+            'domains': [{'_id': row[0], 'count': row[1], 'lastVisit': _datetime(row[2])} for row in domains]
+        }
+    
+    def count(self, user_id):
+        return self.database.execute(
+            'SELECT COUNT(*) FROM event_rollups WHERE user_id = ?', (str(ObjectId(user_id)),)
+        ).fetchone()[0]
+    
+    def state(self, user_id):
+        row = self.database.execute(
+            'SELECT document FROM compaction_state WHERE user_id = ?', (str(ObjectId(user_id)),)
+        ).fetchone()
+        return json_util.loads(row[0]) if row else None
+    
+    def set_state(self, user_id, state):
+        self.database.execute(
+            'INSERT OR REPLACE INTO compaction_state (user_id, document) VALUES (?, ?)',
+            (str(ObjectId(user_id)), json_util.dumps(state))
+        )
+
+
+class SQLiteStringRepository(StringRepository):
+    def __init__(self, database):
+        self.database = database
+    
+    def find(self, ids):
+        ids = list(ids)
+        return dict(self.database.execute(f'SELECT id, value FROM strings WHERE id IN ({_placeholders(ids)})', ids))
+    
+    def insert(self, strings):
+        ids = list(strings)
+        with self.database.transaction() as connection:
+            taken = {row[0] for row in connection.execute(
+                f'SELECT id FROM strings WHERE id IN ({_placeholders(ids)})', ids
+            )}
+            connection.executemany(
+                'INSERT INTO strings (id, value) VALUES (?, ?)',
+                [(key, value) for key, value in strings.items() if key not in taken]
+            )
+        return taken
+
+
+class SQLiteRateLimitRepository(RateLimitRepository):
+    def __init__(self, database):
+        self.database = database
+    
+    def get(self, user_id):
+        row = self.database.execute('SELECT document FROM rate_limits WHERE user_id = ?', (user_id,)).fetchone()
+        return json_util.loads(row[0]) if row else None
+    
+    def swap(self, user_id, version, state):
+        document = json_util.dumps(state)
+        if version is None:
+            cursor = self.database.execute(
+                'INSERT OR IGNORE INTO rate_limits (user_id, version, document) VALUES (?, ?, ?)',
+                (user_id, state['version'], document)
+            )
+        else:
+            cursor = self.database.execute(
+                'UPDATE rate_limits SET version = ?, document = ? WHERE user_id = ? AND version = ?',
+                (state['version'], document, user_id, version)
+            )
+        return cursor.rowcount == 1
+
+
+class SQLiteTokenRepository(TokenRepository):
+    def __init__(self, database):
+        self.database = database
+    
+    def revoke(self, document):
+        with self.database.transaction() as connection:
+            # Expired rows go here, as MongoDB's TTL index would drop them
+            connection.execute('DELETE FROM revoked_tokens WHERE expires_at <= ?', (_ts(datetime.utcnow()),))
+            connection.execute(
+                'INSERT OR IGNORE INTO revoked_tokens (jti, user_id, type, revoked_at, expires_at) VALUES (?, ?, ?, ?, ?)',
+                (
+                    document['jti'],
+                    str(document['userId']) if document.get('userId') else None,
+                    document.get('type'),
+                    _ts(document['revokedAt']),
+                    _ts(document['expiresAt'])
+                )
+            )
+    
+    def revoked_since(self, now, since=None):
+        sql = 'SELECT jti, expires_at FROM revoked_tokens WHERE expires_at > ?'
+        params = [_ts(now)]
+        if since is not None:
+            sql += ' AND revoked_at >= ?'
+            params.append(_ts(since))
+        return [{'jti': row[0], 'expiresAt': _datetime(row[1])} for row in self.database.execute(sql, params)]
+
+
+class SQLiteStorage(Storage):
+    """
+    Every repository in one SQLite file, for single-node installs
+    
+    Workload classes and shards do not apply: one database serves every
+    user and request.
+    """
+    
+    name = 'sqlite'
+    
+    def __init__(self, path, busy_timeout_ms=5000):
+        self.database = SQLiteDatabase(path, busy_timeout_ms)
+        strings = StringDictionary(SQLiteStringRepository(self.database))
+        super().__init__(
+            events=SQLiteEventRepository(self.database, strings),
+            users=SQLiteUserRepository(self.database),
+            insights=SQLiteInsightRepository(self.database),
+            sessions=SQLiteSessionRepository(self.database),
+            tokens=SQLiteTokenRepository(self.database),
+            rollups=SQLiteRollupRepository(self.database),
+            strings=strings,
+            rate_limits=SQLiteRateLimitRepository(self.database)
+        )
@@ -0,0 +1,17 @@
+#!/usr/bin/env python3
+"""
+ASGI Application Entry Point
+
+Serves the events, analytics and AI endpoints on an event loop with the
+Motor driver; the remaining routes run through the Flask app.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+import os
+from app.asgi import create_asgi_app
+
+# Get configuration from environment
+config_name = os.getenv('FLASK_ENV', 'development')
+
+# Create ASGI application
+app = create_asgi_app(config_name)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Time long-range analytics with old events in the Parquet archive against keeping them all hot
+
+Loads one user's events over --days (benchmarks/telemetry.py) into two
+SQLite event stores: one keeps every event, the other keeps the last
+--hot-days and moves the rest to a scratch EventArchive, as `flask
+archive run` does. Then times the dashboard, time-spent, patterns and
+AI weekly queries over 30 days to a year on both, checks that they
+return the same counts, and reports the hot table and archive sizes.
+
+Usage (from backend/):
+    python -m benchmarks.bench_archive [--days 365] [--hot-days 30]
+    python -m benchmarks.bench_archive --compression snappy
+"""
+import argparse
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from bson import ObjectId
+from app.archive import EventArchive, month_key
+from app.events.queries import build_event_documents
+from app.storage.archive import ArchivedEventRepository
+from app.storage.sqlite import SQLiteStorage
+from benchmarks.bench_micro import FIXTURE_END_MS
+from benchmarks.bench_storage import BATCH_SIZE, best_ms
+from benchmarks.telemetry import generate
+
+
+def size_mb(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path) / 1e6
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files) / 1e6
+
+
+def operations(user_id, end):
+    """name -> call on an event repository, over ranges reaching into the archive"""
+    ranges = {days: (end - timedelta(days=days), end) for days in (30, 90, 365)}
+    return {
+        'dashboard 30d': lambda events: events.dashboard(user_id, *ranges[30]),
+        'dashboard 90d': lambda events: events.dashboard(user_id, *ranges[90]),
+        'dashboard 365d': lambda events: events.dashboard(user_id, *ranges[365]),
+        'time-spent 365d': lambda events: len(list(events.activity(user_id, *ranges[365]))),
+        'patterns 365d': lambda events: events.peaks(user_id, *ranges[365]),
+        'ai weekly stats 90d': lambda events: events.weekly_stats(user_id, *ranges[90])
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--hot-days', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--compression', default='zstd', help='Parquet codec (zstd, snappy, gzip, none)')
+    args = parser.parse_args()
+    
+    end = datetime.fromtimestamp(FIXTURE_END_MS / 1000)
+    cutoff = end - timedelta(days=args.hot_days)
+    user_id = str(ObjectId())
+    documents, _ = build_event_documents(user_id, generate(1, args.days, args.seed, end_ms=FIXTURE_END_MS)[0])
+    cold = [document for document in documents if document['timestamp'] < cutoff]
+    print(f"{len(documents)} events over {args.days} days; {len(cold)} older than {args.hot_days} days")
+    
+    scratch = tempfile.mkdtemp()
+    try:
+        all_hot = SQLiteStorage(os.path.join(scratch, 'all.db')).events
+        hot = SQLiteStorage(os.path.join(scratch, 'hot.db')).events
+        archive = EventArchive(os.path.join(scratch, 'archive'), args.compression)
+        for i in range(0, len(documents), BATCH_SIZE):
+            all_hot.insert_many(documents[i:i + BATCH_SIZE])
+        
+        recent = [document for document in documents if document['timestamp'] >= cutoff]
+        for i in range(0, len(recent), BATCH_SIZE):
+            hot.insert_many(recent[i:i + BATCH_SIZE])
+        months = {}
+        for document in cold:
+            months.setdefault(month_key(document['timestamp']), []).append(document)
+        for month, month_documents in sorted(months.items()):
+            archive.write_month(user_id, month, month_documents)
+        archive.set_watermark(user_id, cutoff)
+        federated = ArchivedEventRepository(hot, archive)
+        
+        print(f"\n{'query (one user)':<22}{'all hot median ms':>19}{'federated':>11}{'ratio':>8}")
+        for operation, call in operations(user_id, end).items():
+            expected, actual = call(all_hot), call(federated)
+            if operation.startswith('dashboard') and expected[0] != actual[0]:
+                raise AssertionError(f'{operation}: {expected[0]} events hot, {actual[0]} federated')
+            _, hot_ms = best_ms(lambda: call(all_hot), args.repeat)
+            _, federated_ms = best_ms(lambda: call(federated), args.repeat)
+            print(f"{operation:<22}{hot_ms:>19.2f}{federated_ms:>11.2f}{federated_ms / hot_ms:>7.1f}x")
+        
+        print(f"\nSQLite, every event hot: {size_mb(os.path.join(scratch, 'all.db')):.1f} MB")
+        print(f"SQLite, last {args.hot_days} days:    {size_mb(os.path.join(scratch, 'hot.db')):.1f} MB")
+        print(f"Archive ({args.compression}, {len(months)} files): {size_mb(archive.directory):.1f} MB")
+    finally:
+        shutil.rmtree(scratch)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark the WSGI (gunicorn) and ASGI (uvicorn) servers under concurrent load
+
+Starts each server pinned to one core against a real MongoDB, registers a
+user, and drives concurrent event syncs and dashboard reads with an async
+client, reporting throughput and latency percentiles per scenario.
+
+Usage (from backend/, with MongoDB running):
+    python -m benchmarks.bench_asgi [--concurrency 64] [--duration 15] [--servers gunicorn,uvicorn]
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import uuid
+import httpx
+
+SERVERS = {
+    # One sync worker with a thread pool: the current deployment, scaled to one core
+    'gunicorn': ['gunicorn', '-w', '1', '--threads', '{threads}', '-b', '127.0.0.1:{port}', 'run:app'],
+    'uvicorn': [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', '{port}',
+                '--no-access-log'],
+}
+
+
+def make_events(count):
+    now = int(time.time() * 1000)
+    domains = ['github.com', 'stackoverflow.com', 'youtube.com', 'reddit.com', 'docs.python.org']
+    return [
+        {
+            'type': 'TAB_ACTIVATED' if i % 2 else 'TAB_UPDATED',
+            'ts': now - i * 15000,
+            'payload': {'url': f'https://{domains[i % len(domains)]}/page/{i}', 'title': f'Page {i}', 'tabId': i % 8}
+        }
+        for i in range(count)
+    ]
+
+
+def start_server(name, port, cpu, threads, env):
+    argv = [arg.format(port=port, threads=threads) for arg in SERVERS[name]]
+    pin = (lambda: os.sched_setaffinity(0, {cpu})) if hasattr(os, 'sched_setaffinity') else None
+    return subprocess.Popen(argv, env=env, preexec_fn=pin, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_until_up(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f'{base_url}/api/auth/me', timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Server at {base_url} did not start')
+
+
+async def drive(client, method, path, headers, concurrency, duration, body=None):
+    """Run `concurrency` closed-loop clients for `duration` seconds"""
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+    
+    async def worker():
+        nonlocal errors
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, headers=headers, json=body)
+                if response.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+    
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0
+    return len(latencies) / duration, pct(0.5), pct(0.99), errors
+
+
+async def run_scenarios(base_url, args):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        email = f'bench-{uuid.uuid4().hex[:8]}@example.com'
+        response = await client.post('/api/auth/register', json={'email': email, 'name': 'Bench', 'password': 'benchmark123'})
+        headers = {'Authorization': f"Bearer {response.json()['access_token']}"}
+        
+        # Seed history so the dashboard has something to aggregate
+        for _ in range(args.seed_batches):
+            await client.post('/api/events/sync', json={'events': make_events(args.batch)}, headers=headers)
+        
+        return [
+            ('sync', await drive(client, 'POST', '/api/events/sync', headers, args.concurrency, args.duration,
+                                 body={'events': make_events(args.batch)})),
+            ('dashboard', await drive(client, 'GET', '/api/analytics/dashboard', headers, args.concurrency, args.duration)),
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--servers', default='gunicorn,uvicorn')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--batch', type=int, default=50, help='events per sync request')
+    parser.add_argument('--seed-batches', type=int, default=40)
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads per worker')
+    parser.add_argument('--cpu', type=int, default=0, help='core to pin the server to')
+    parser.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args()
+    
+    env = {**os.environ, 'FLASK_ENV': os.getenv('FLASK_ENV', 'production'), 'LLM_PROVIDER': 'fake'}
+    
+    print(f"{args.concurrency} concurrent clients, {args.duration:.0f}s per scenario, server pinned to CPU {args.cpu}")
+    print(f"{'server':<10}{'scenario':<11}{'req/s':>9}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    
+    for name in args.servers.split(','):
+        server = start_server(name, args.port, args.cpu, args.threads, env)
+        base_url = f'http://127.0.0.1:{args.port}'
+        try:
+            wait_until_up(base_url)
+            for scenario, (rate, p50, p99, errors) in asyncio.run(run_scenarios(base_url, args)):
+                print(f"{name:<10}{scenario:<11}{rate:>9.1f}{p50:>10.2f}{p99:>10.2f}{errors:>8}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
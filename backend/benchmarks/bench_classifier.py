@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark the compiled DomainClassifier against the old keyword scan
+
+Usage (from backend/):
+    python -m benchmarks.bench_classifier [--domains 20000] [--repeat 5]
+"""
+import argparse
+import random
+import time
+from app.ai.classifier import DomainClassifier
+
+
+LEGACY_KEYWORDS = [
+    ('work', ['github', 'stackoverflow', 'docs', 'aws', 'google.com/cloud', 'notion', 'trello', 'asana', 'slack']),
+    ('social', ['facebook', 'twitter', 'instagram', 'reddit', 'tiktok', 'linkedin']),
+    ('entertainment', ['youtube', 'netflix', 'twitch', 'spotify', 'hulu']),
+    ('shopping', ['amazon', 'ebay', 'shopify', 'etsy']),
+    ('news', ['news', 'bbc', 'cnn', 'nytimes', 'reuters'])
+]
+
+
+def legacy_categorize(domain, keyword_lists=LEGACY_KEYWORDS):
+    """The substring scan GeminiAI._simple_categorize used before DomainClassifier"""
+    domain_lower = domain.lower()
+    
+    for category, keywords in keyword_lists:
+        if any(kw in domain_lower for kw in keywords):
+            return category
+    
+    return 'other'
+
+
+def scaled_rules(extra, seed=7):
+    """Default keyword lists plus `extra` random keywords per category"""
+    rng = random.Random(seed)
+    alphabet = 'abcdefghijklmnopqrstuvwxyz'
+    
+    keyword_lists = [
+        (category, keywords + [''.join(rng.choice(alphabet) for _ in range(rng.randint(6, 10))) for _ in range(extra)])
+        for category, keywords in LEGACY_KEYWORDS
+    ]
+    rules = [
+        {'name': category, 'domains': [], 'suffixes': [], 'keywords': keywords}
+        for category, keywords in keyword_lists
+    ]
+    
+    return keyword_lists, rules
+
+
+KNOWN_DOMAINS = [
+    'github.com', 'gist.github.com', 'stackoverflow.com', 'docs.python.org',
+    'aws.amazon.com', 'www.notion.so', 'trello.com', 'app.slack.com',
+    'www.facebook.com', 'twitter.com', 'www.reddit.com', 'www.linkedin.com',
+    'www.youtube.com', 'www.netflix.com', 'open.spotify.com', 'www.twitch.tv',
+    'www.amazon.com', 'www.ebay.co.uk', 'www.etsy.com', 'news.ycombinator.com',
+    'www.bbc.co.uk', 'edition.cnn.com', 'www.nytimes.com', 'mail.google.com',
+    'localhost:3000', 'chatgpt.com', 'en.wikipedia.org'
+]
+
+
+def generate_domains(count, seed=42):
+    """Zipf-ish mix of popular domains and a long tail of random ones"""
+    rng = random.Random(seed)
+    alphabet = 'abcdefghijklmnopqrstuvwxyz'
+    tlds = ['com', 'org', 'net', 'io', 'dev', 'co.uk']
+    
+    domains = []
+    for _ in range(count):
+        if rng.random() < 0.7:
+            index = min(int(rng.paretovariate(1.2)) - 1, len(KNOWN_DOMAINS) - 1)
+            domains.append(KNOWN_DOMAINS[index])
+        else:
+            name = ''.join(rng.choice(alphabet) for _ in range(rng.randint(5, 14)))
+            domains.append(f"{rng.choice(['', 'www.', 'app.'])}{name}.{rng.choice(tlds)}")
+    
+    return domains
+
+
+def best_of(fn, repeat):
+    """Best wall-clock time of `repeat` runs"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def report(title, domains, legacy_fn, classifier, repeat):
+    """Time the legacy scan against a fresh classifier (cold and warm memo)"""
+    mismatches = [d for d in set(domains) if classifier.classify(d) != legacy_fn(d)]
+    
+    legacy = best_of(lambda: [legacy_fn(d) for d in domains], repeat)
+    cold = best_of(lambda: [classifier._classify(d) for d in domains], repeat)
+    warm = best_of(lambda: classifier.classify_many(domains), repeat)
+    
+    print(f"\n{title}")
+    print(f"{'implementation':<34}{'total ms':>10}{'us/domain':>12}{'speedup':>10}")
+    for name, seconds in [
+        ('legacy keyword scan', legacy),
+        ('DomainClassifier (no memo)', cold),
+        ('DomainClassifier.classify_many', warm)
+    ]:
+        print(f"{name:<34}{seconds * 1000:>10.2f}{seconds / len(domains) * 1e6:>12.3f}{legacy / seconds:>9.1f}x")
+    
+    if mismatches:
+        print(f"WARNING: {len(mismatches)} domains classified differently, e.g. {mismatches[:5]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--domains', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--extra-keywords', type=int, default=200,
+                        help='random keywords added per category for the scaled run')
+    args = parser.parse_args()
+    
+    domains = generate_domains(args.domains)
+    print(f"domains: {len(domains)} ({len(set(domains))} distinct), best of {args.repeat}")
+    
+    # Defaults must reproduce the old behaviour exactly
+    report('default rules', domains, legacy_categorize, DomainClassifier(), args.repeat)
+    
+    keyword_lists, rules = scaled_rules(args.extra_keywords)
+    report(
+        f'scaled rules (+{args.extra_keywords} keywords per category)',
+        domains,
+        lambda d: legacy_categorize(d, keyword_lists),
+        DomainClassifier(rules),
+        args.repeat
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark response compression: size and time per encoding and level vs identity
+
+Builds realistic response bodies from synthetic telemetry (an events page
+of --limit events, a dashboard and a time-spent breakdown), rendered the
+way the API sends them, and compresses each with every available encoding
+(gzip, br, zstd) at a few levels. Reports the compressed size, best
+compress and decompress times, and the estimated time to deliver the body
+(compress + transfer + decompress) over a few link speeds, next to the
+uncompressed body.
+
+Usage (from backend/):
+    python -m benchmarks.bench_compression [--limit 1000] [--days 30] [--links 1,10,100]
+"""
+import argparse
+import gzip
+import json
+import timeit
+from collections import Counter
+from bson import ObjectId
+from flask.json.provider import DefaultJSONProvider
+from app.analytics.queries import (
+    ACTIVITY_EVENT_TYPES, compute_domain_time, format_dashboard, format_time_spent
+)
+from app.compression import ENCODERS, brotli, zstandard
+from app.events.queries import build_event_documents
+from app.models.event import Event
+from benchmarks.bench_micro import FIXTURE_END_MS
+from benchmarks.telemetry import generate
+
+LEVELS = {'gzip': [1, 6, 9], 'br': [1, 4, 6, 11], 'zstd': [1, 3, 9, 19]}
+
+DECOMPRESS = {
+    'gzip': gzip.decompress,
+    'br': brotli.decompress if brotli else None,
+    'zstd': (lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data)) if zstandard else None
+}
+
+
+def render(payload):
+    """Bytes as jsonify sends them outside debug mode (compact, sorted keys)"""
+    return json.dumps(payload, default=DefaultJSONProvider.default, sort_keys=True,
+                      separators=(',', ':')).encode('utf-8')
+
+
+def payloads(limit, days):
+    """name -> rendered body, for the largest routine responses"""
+    user_id = str(ObjectId())
+    raw = generate(users=1, days=days, seed=3, end_ms=FIXTURE_END_MS)[0]
+    documents, _ = build_event_documents(user_id, raw)
+    for document in documents:
+        document['_id'] = ObjectId()
+    documents.sort(key=lambda document: document['timestamp'], reverse=True)
+    
+    page = [Event.from_dict(document).to_json() for document in documents[:limit]]
+    events_body = {'events': page, 'total': len(documents), 'limit': limit, 'skip': 0}
+    
+    days_counter = Counter(document['timestamp'].strftime('%Y-%m-%d') for document in documents)
+    domains = Counter(document['domain'] for document in documents if document['domain'])
+    types = Counter(document['type'] for document in documents)
+    hours = Counter(document['timestamp'].hour for document in documents)
+    start, end = documents[-1]['timestamp'], documents[0]['timestamp']
+    dashboard_body = format_dashboard(start, end, days, len(documents), {
+        'daily_events': [{'_id': day, 'count': count} for day, count in sorted(days_counter.items())],
+        'top_domains': [{'_id': domain, 'count': count} for domain, count in domains.most_common(10)],
+        'event_types': [{'_id': kind, 'count': count} for kind, count in types.most_common()],
+        'hourly_activity': [{'_id': hour, 'count': count} for hour, count in sorted(hours.items())]
+    })
+    
+    activity = sorted(
+        ({'timestamp': document['timestamp'], 'domain': document['domain']}
+         for document in documents if document['type'] in ACTIVITY_EVENT_TYPES and document['domain']),
+        key=lambda event: event['timestamp']
+    )
+    time_spent_body = {**format_time_spent(compute_domain_time(activity)), 'period_days': days}
+    
+    return {
+        f'events (limit={limit})': render(events_body),
+        f'dashboard ({days}d)': render(dashboard_body),
+        f'time-spent ({days}d)': render(time_spent_body),
+    }
+
+
+def best_ms(func, repeat=5):
+    timer = timeit.Timer(func)
+    number = max(1, timer.autorange()[0] // 5)
+    return min(timer.repeat(repeat, number)) / number * 1000
+
+
+def compress(encoding, level, body):
+    encoder = ENCODERS[encoding][0](level)
+    return encoder.compress(body) + encoder.finish()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--limit', type=int, default=1000, help='events per page')
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--links', default='1,10,100', help='link speeds in Mbit/s')
+    args = parser.parse_args()
+    
+    links = [float(link) for link in args.links.split(',')]
+    link_header = ''.join(f"{f'@{link:g}Mb ms':>12}" for link in links)
+    transfer_ms = lambda size, link: size * 8 / (link * 1000)
+    
+    for name, body in payloads(args.limit, args.days).items():
+        print(f"\n{name}: {len(body)} bytes")
+        print(f"{'encoding':<12}{'bytes':>10}{'ratio':>8}{'comp ms':>9}{'decomp ms':>10}{link_header}")
+        print(f"{'identity':<12}{len(body):>10}{1:>8.1f}{0:>9.2f}{0:>10.2f}"
+              + ''.join(f"{transfer_ms(len(body), link):>12.2f}" for link in links))
+        
+        for encoding in ENCODERS:
+            for level in LEVELS[encoding]:
+                data = compress(encoding, level, body)
+                assert DECOMPRESS[encoding](data) == body
+                comp = best_ms(lambda: compress(encoding, level, body))
+                decomp = best_ms(lambda: DECOMPRESS[encoding](data))
+                print(f"{f'{encoding}-{level}':<12}{len(data):>10}{len(body) / len(data):>8.1f}{comp:>9.2f}{decomp:>10.2f}"
+                      + ''.join(f"{comp + transfer_ms(len(data), link) + decomp:>12.2f}" for link in links))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Audit the route queries on synthetic telemetry, before and after an index version
+
+Loads N users x M days of extension-shaped events (benchmarks/telemetry.py)
+into a scratch database, builds the index set up to --before, explains
+every route query shape (app/query_audit.py), then migrates to --after
+(default: latest) and explains them again. Prints both reports and the
+keys/documents examined per shape side by side, so a proposed index
+version can be checked against the data it is meant for.
+
+Usage (from backend/, with MongoDB running):
+    python -m benchmarks.bench_indexes [--users 20] [--days 30] [--before 2] [--after 3]
+"""
+import argparse
+import os
+from bson import ObjectId
+from pymongo import MongoClient
+from app.events.queries import build_event_documents
+from app.migrations import latest_version, migrate
+from app.query_audit import audit, report_lines
+from benchmarks.telemetry import generate
+
+
+def load(db, users, days, seed):
+    """Insert synthetic events for `users` users; returns their ids"""
+    user_ids = []
+    for events in generate(users, days, seed):
+        user_id = str(ObjectId())
+        documents, _ = build_event_documents(user_id, events)
+        if documents:
+            db.events.insert_many(documents, ordered=False)
+        user_ids.append(user_id)
+    return user_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--before', type=int, default=latest_version() - 1, help='index version audited first')
+    parser.add_argument('--after', type=int, default=latest_version(), help='index version audited second')
+    parser.add_argument('--mongodb-uri', default=os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
+    parser.add_argument('--db-name', default='browser_telemetry_index_audit')
+    args = parser.parse_args()
+    
+    client = MongoClient(args.mongodb_uri, serverSelectionTimeoutMS=5000)
+    db = client[args.db_name]
+    quiet = lambda message: None
+    
+    try:
+        client.drop_database(args.db_name)
+        migrate(db, target=args.before, log=quiet)
+        user_ids = load(db, args.users, args.days, args.seed)
+        print(f"{db.events.estimated_document_count()} events for {args.users} users over {args.days} days")
+        
+        # The first user's favourite domains and types are as representative as any
+        results = {}
+        for version in (args.before, args.after):
+            migrate(db, target=version, log=quiet)
+            results[version] = audit(db, user_ids[0])
+            print(f"\n== index version {version} ==")
+            for line in report_lines(results[version]):
+                print(line)
+        
+        print(f"\n{'route':<46}{'examined v' + str(args.before):>16}{'examined v' + str(args.after):>16}")
+        for old, new in zip(results[args.before], results[args.after]):
+            examined = lambda finding: max(finding['keys_examined'], finding['docs_examined'])
+            print(f"{old['route']:<46}{examined(old):>16}{examined(new):>16}")
+    finally:
+        client.drop_database(args.db_name)
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Measure single-flight coalescing of identical concurrent LLM prompts
+
+Usage (from backend/):
+    python -m benchmarks.bench_llm_coalescing [--clients 32] [--latency-ms 500]
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.ai.providers import FakeProvider, CoalescingProvider
+
+
+def run(provider, clients, prompt):
+    """Fire `clients` identical prompts at once; return (wall seconds, distinct results)"""
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        start = time.perf_counter()
+        results = list(pool.map(lambda _: provider.generate(prompt), range(clients)))
+        elapsed = time.perf_counter() - start
+    
+    return elapsed, len(set(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--latency-ms', type=int, default=500)
+    args = parser.parse_args()
+    
+    prompt = 'Analyze this browsing activity data and provide a concise daily summary'
+    
+    print(f"{args.clients} concurrent identical prompts, {args.latency_ms} ms fake upstream latency")
+    print(f"{'mode':<14}{'upstream calls':>16}{'wall ms':>10}{'results':>9}")
+    
+    for name, coalesce in [('direct', False), ('coalesced', True)]:
+        upstream = FakeProvider(latency_ms=args.latency_ms)
+        provider = CoalescingProvider(upstream) if coalesce else upstream
+        elapsed, distinct = run(provider, args.clients, prompt)
+        print(f"{name:<14}{upstream.calls:>16}{elapsed * 1000:>10.1f}{distinct:>9}")
+
+
+if __name__ == '__main__':
+    main()
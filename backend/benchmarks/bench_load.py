@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test: synthetic telemetry in, concurrent dashboard traffic out
+
+Generates realistic extension event streams (benchmarks/telemetry.py) for
+N users over M days, loads them through /api/events/sync the way the
+extension batches them, then drives a weighted mix of dashboard,
+time-spent, events-listing and AI (fake LLM backend) requests from
+concurrent clients. Reports throughput and p50/p95/p99 latency per
+scenario, and can save the results as a named baseline or compare against
+one, so a change can be checked commit to commit.
+
+The server is started here (gunicorn with gunicorn.conf.py, or uvicorn)
+against a dedicated database on a local mongod, which is dropped and
+re-indexed first; --server external targets an already running --url.
+
+Usage (from backend/, with MongoDB running):
+    python -m benchmarks.bench_load [--server gunicorn] [--users 20] [--days 7] [--duration 30]
+    python -m benchmarks.bench_load --save-baseline main
+    python -m benchmarks.bench_load --compare main
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+import httpx
+from benchmarks.bench_asgi import wait_until_up
+from benchmarks.telemetry import generate, batches
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), 'baselines')
+
+SERVERS = {
+    'gunicorn': ['gunicorn', '-c', 'gunicorn.conf.py', 'run:app'],
+    'uvicorn': [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', '{port}',
+                '--workers', '{workers}', '--no-access-log'],
+}
+
+# Read traffic: (scenario, path, weight)
+READ_MIX = [
+    ('dashboard', '/api/analytics/dashboard', 4),
+    ('time-spent', '/api/analytics/time-spent', 3),
+    ('events-list', '/api/events/?limit=100', 3),
+    ('productivity', '/api/analytics/productivity', 1),
+    ('ai-daily-summary', '/api/ai/daily-summary', 1),
+    ('ai-weekly-report', '/api/ai/weekly-report', 1),
+]
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+def summarize(latencies, errors, elapsed, **extra):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / elapsed, 2) if elapsed else 0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'errors': errors,
+        **extra
+    }
+
+
+async def timed(client, method, path, headers, json_body=None):
+    start = time.perf_counter()
+    try:
+        response = await client.request(method, path, headers=headers, json=json_body)
+        ok = response.status_code == 200
+    except httpx.HTTPError:
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+async def register_users(client, count):
+    run_id = f'{random.getrandbits(32):08x}'
+    headers = []
+    for i in range(count):
+        response = await client.post('/api/auth/register', json={
+            'email': f'load-{run_id}-{i}@example.com', 'name': f'Load {i}', 'password': 'benchmark123'
+        })
+        response.raise_for_status()
+        headers.append({'Authorization': f"Bearer {response.json()['access_token']}"})
+    return headers
+
+
+async def ingest(client, users, streams, batch_size, concurrency):
+    """Sync every user's events in order, up to `concurrency` users at a time"""
+    latencies = []
+    errors = 0
+    gate = asyncio.Semaphore(concurrency)
+    
+    async def sync_user(headers, events):
+        nonlocal errors
+        async with gate:
+            for batch in batches(events, batch_size):
+                elapsed, ok = await timed(client, 'POST', '/api/events/sync', headers, {'events': batch})
+                latencies.append(elapsed)
+                errors += not ok
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(sync_user(headers, events) for headers, events in zip(users, streams)))
+    elapsed = time.perf_counter() - start
+    
+    total_events = sum(len(events) for events in streams)
+    return summarize(latencies, errors, elapsed, events=total_events, events_per_s=round(total_events / elapsed, 1))
+
+
+async def read_traffic(client, users, concurrency, duration, seed):
+    """Closed-loop clients issuing the weighted READ_MIX for `duration` seconds"""
+    rng = random.Random(seed)
+    latencies = {name: [] for name, _, _ in READ_MIX}
+    errors = {name: 0 for name, _, _ in READ_MIX}
+    weights = [weight for _, _, weight in READ_MIX]
+    deadline = time.monotonic() + duration
+    
+    async def worker():
+        while time.monotonic() < deadline:
+            name, path, _ = rng.choices(READ_MIX, weights)[0]
+            elapsed, ok = await timed(client, 'GET', path, rng.choice(users))
+            latencies[name].append(elapsed)
+            errors[name] += not ok
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    
+    results = {name: summarize(latencies[name], errors[name], elapsed) for name, _, _ in READ_MIX}
+    results['reads-total'] = summarize(
+        [value for values in latencies.values() for value in values], sum(errors.values()), elapsed
+    )
+    return results
+
+
+async def run(base_url, args):
+    streams = generate(args.users, args.days, args.seed)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        users = await register_users(client, args.users)
+        results = {'ingest': await ingest(client, users, streams, args.batch, args.concurrency)}
+        results.update(await read_traffic(client, users, args.concurrency, args.duration, args.seed))
+    
+    return results
+
+
+def prepare_database(uri, db_name):
+    """Start from an empty benchmark database with the current index set"""
+    from pymongo import MongoClient
+    from app.migrations import migrate
+    
+    client = MongoClient(uri, serverSelectionTimeoutMS=5000)
+    try:
+        client.drop_database(db_name)
+        migrate(client[db_name], log=lambda message: None)
+    finally:
+        client.close()
+
+
+def start_server(name, port, workers, env):
+    argv = [arg.format(port=port, workers=workers) for arg in SERVERS[name]]
+    env = {**env, 'GUNICORN_BIND': f'127.0.0.1:{port}', 'GUNICORN_WORKERS': str(workers)}
+    return subprocess.Popen(argv, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(__file__),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(results, baseline=None):
+    header = f"{'scenario':<18}{'requests':>9}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}"
+    if baseline:
+        header += f"{'req/s Δ':>10}{'p95 Δ':>9}"
+    print(header)
+    
+    for name, row in results.items():
+        line = (f"{name:<18}{row['requests']:>9}{row['rps']:>9.1f}{row['p50_ms']:>9.2f}"
+                f"{row['p95_ms']:>9.2f}{row['p99_ms']:>9.2f}{row['errors']:>8}")
+        old = (baseline or {}).get(name)
+        if old:
+            change = lambda new, before: f"{(new - before) / before * 100:+.1f}%" if before else 'n/a'
+            line += f"{change(row['rps'], old['rps']):>10}{change(row['p95_ms'], old['p95_ms']):>9}"
+        print(line)
+    
+    ingest_row = results['ingest']
+    print(f"\ningested {ingest_row['events']} events at {ingest_row['events_per_s']} events/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--server', choices=[*SERVERS, 'external'], default='gunicorn')
+    parser.add_argument('--url', default=None, help='base URL with --server external')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--port', type=int, default=5056)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--batch', type=int, default=100, help='events per sync request (extension: 100)')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30, help='seconds of read traffic')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--mongodb-uri', default=os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
+    parser.add_argument('--db-name', default='browser_telemetry_bench')
+    parser.add_argument('--save-baseline', metavar='NAME')
+    parser.add_argument('--compare', metavar='NAME')
+    args = parser.parse_args()
+    
+    baseline = None
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f'{args.compare}.json')) as f:
+            baseline = json.load(f)
+        print(f"comparing with baseline '{args.compare}' ({baseline['meta']['revision']}, {baseline['meta']['date']})")
+        baseline = baseline['results']
+    
+    server = None
+    if args.server == 'external':
+        if not args.url:
+            parser.error('--server external needs --url')
+        base_url = args.url.rstrip('/')
+    else:
+        prepare_database(args.mongodb_uri, args.db_name)
+        env = {
+            **os.environ,
+            'FLASK_ENV': os.getenv('FLASK_ENV', 'production'),
+            'MONGODB_URI': args.mongodb_uri,
+            'MONGODB_DB_NAME': args.db_name,
+            'LLM_PROVIDER': 'fake'
+        }
+        server = start_server(args.server, args.port, args.workers, env)
+        base_url = f'http://127.0.0.1:{args.port}'
+    
+    print(f"{args.users} users x {args.days} days, {args.concurrency} clients, "
+          f"{args.duration:.0f}s of reads against {args.server}")
+    try:
+        wait_until_up(base_url)
+        results = asyncio.run(run(base_url, args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    
+    report(results, baseline)
+    
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f'{args.save_baseline}.json')
+        meta = {
+            'revision': git_revision(),
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'args': {key: value for key, value in vars(args).items() if key not in ('save_baseline', 'compare')}
+        }
+        with open(path, 'w') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent=2)
+        print(f"saved baseline to {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark bcrypt login throughput: inline vs the bounded process pool
+
+Also measures how long a trivial concurrent "ingest" task takes to run
+while logins are in progress, i.e. how much password work stalls other
+requests on the same worker.
+
+Usage (from backend/):
+    python -m benchmarks.bench_login [--rounds 12] [--logins 64] [--pool-sizes 1,2,4]
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.auth.passwords import PasswordHasher
+from app.models.user import User
+
+
+def probe_latency(stop, samples):
+    """Repeatedly time a tiny unit of Python work, as an ingest request would"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        sum(range(2000))
+        samples.append(time.perf_counter() - start)
+        time.sleep(0.001)
+
+
+def run(hasher, password_hash, logins, concurrency):
+    """Verify `logins` passwords with `concurrency` request threads"""
+    stop = threading.Event()
+    samples = []
+    probe = threading.Thread(target=probe_latency, args=(stop, samples))
+    probe.start()
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: hasher.verify('correct horse battery', password_hash), range(logins)))
+    elapsed = time.perf_counter() - start
+    
+    stop.set()
+    probe.join()
+    assert all(results)
+    
+    samples.sort()
+    p99 = samples[int(len(samples) * 0.99) - 1] if samples else 0
+    return elapsed, statistics.median(samples) if samples else 0, p99
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rounds', type=int, default=12)
+    parser.add_argument('--logins', type=int, default=64)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--pool-sizes', default='1,2,4')
+    args = parser.parse_args()
+    
+    password_hash = User.hash_password('correct horse battery', args.rounds)
+    print(f"bcrypt cost {args.rounds}, {args.logins} logins, {args.concurrency} request threads, {os.cpu_count()} CPUs")
+    print(f"{'mode':<12}{'cores':>6}{'logins/s':>10}{'per core':>10}{'probe p50 ms':>14}{'probe p99 ms':>14}")
+    
+    modes = [('inline', PasswordHasher(rounds=args.rounds, pool_size=0, queue_depth=args.logins), 1)]
+    for size in [int(s) for s in args.pool_sizes.split(',')]:
+        modes.append((f'pool={size}', PasswordHasher(rounds=args.rounds, pool_size=size, queue_depth=args.logins), size))
+    
+    for name, hasher, cores in modes:
+        if hasher.pool_size:
+            hasher.verify('warm up', password_hash)  # start the worker processes
+        elapsed, p50, p99 = run(hasher, password_hash, args.logins, args.concurrency)
+        rate = args.logins / elapsed
+        print(f"{name:<12}{cores:>6}{rate:>10.1f}{rate / cores:>10.1f}{p50 * 1000:>14.3f}{p99 * 1000:>14.3f}")
+        hasher.shutdown()
+
+
+if __name__ == '__main__':
+    main()
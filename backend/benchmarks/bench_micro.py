@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the pure-Python hot spots, gated against a baseline
+
+Each case times one hot loop on fixed synthetic telemetry and reports
+microseconds per item (event, URL, domain or prompt). --save stores the
+results as a baseline; --check compares against it and exits 1 when a
+case is slower than its threshold allows, so a regression fails CI.
+
+Results are normalised by a fixed reference workload timed in the same
+run, so a baseline recorded on one machine stays usable on another.
+
+Usage (from backend/):
+    python -m benchmarks.bench_micro [--only sync_build,time_spent]
+    python -m benchmarks.bench_micro --save            # benchmarks/baselines/micro.json
+    python -m benchmarks.bench_micro --check [--threshold 0.25]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from collections import Counter
+from datetime import datetime
+from bson import ObjectId
+from app.ai.classifier import get_domain_classifier
+from app.ai.gemini import GeminiAI
+from app.ai.providers import FakeProvider
+from app.ai.queries import format_daily_stats
+from app.analytics.queries import ACTIVITY_EVENT_TYPES, compute_domain_time, format_time_spent
+from app.events.queries import build_event_documents
+from app.models.event import Event
+from benchmarks.bench_load import BASELINE_DIR, git_revision
+from benchmarks.telemetry import domain_universe, generate
+
+# Fixed end time (2026-01-01T00:00Z) so the fixtures, and per-item costs, never drift
+FIXTURE_END_MS = 1767225600000
+SYNC_BATCH = 100
+
+DEFAULT_THRESHOLD = 0.25
+# Cases whose timings are noisier than the rest get more room
+THRESHOLDS = {
+    'daily_prompt': 0.35
+}
+
+
+class Fixtures:
+    """Inputs shared by the cases, built once from synthetic telemetry"""
+    
+    def __init__(self):
+        self.user_id = str(ObjectId())
+        raw = generate(users=1, days=3, seed=7, end_ms=FIXTURE_END_MS)[0]
+        self.batch = raw[:SYNC_BATCH]
+        
+        documents, _ = build_event_documents(self.user_id, raw)
+        for document in documents:
+            document['_id'] = ObjectId()
+        self.documents = documents
+        self.events = [Event.from_dict(document) for document in documents]
+        self.urls = [event.url for event in self.events if event.url]
+        
+        self.activity = [
+            {'timestamp': document['timestamp'], 'domain': document['domain']}
+            for document in documents
+            if document['type'] in ACTIVITY_EVENT_TYPES and document['domain']
+        ]
+        self.domains = domain_universe(500)
+        
+        self.ai = GeminiAI(provider=FakeProvider())
+        get_domain_classifier({})
+        self.daily_stats = format_daily_stats(self._daily_facet(documents))
+    
+    @staticmethod
+    def _daily_facet(documents):
+        """What daily_stats_pipeline would return for these documents"""
+        domains = Counter(document['domain'] for document in documents if document['domain'])
+        types = Counter(document['type'] for document in documents)
+        hours = Counter(document['timestamp'].hour for document in documents)
+        return {
+            'total': [{'count': len(documents)}],
+            'top_domains': [{'_id': domain, 'count': count} for domain, count in domains.most_common(10)],
+            'event_types': [{'_id': kind, 'count': count} for kind, count in types.most_common()],
+            'hourly_activity': [{'_id': hour, 'count': count} for hour, count in sorted(hours.items())]
+        }
+
+
+# Each case returns (callable, items processed per call)
+CASES = {
+    'sync_build': lambda fx: (
+        lambda: build_event_documents(fx.user_id, fx.batch), len(fx.batch)
+    ),
+    'event_from_dict': lambda fx: (
+        lambda: [Event.from_dict(document) for document in fx.documents], len(fx.documents)
+    ),
+    'event_to_json': lambda fx: (
+        lambda: [event.to_json() for event in fx.events], len(fx.events)
+    ),
+    'extract_domain': lambda fx: (
+        lambda: [fx.events[0]._extract_domain(url) for url in fx.urls], len(fx.urls)
+    ),
+    'time_spent': lambda fx: (
+        lambda: format_time_spent(compute_domain_time(fx.activity)), len(fx.activity)
+    ),
+    'simple_categorize': lambda fx: (
+        lambda: [fx.ai._simple_categorize(domain) for domain in fx.domains], len(fx.domains)
+    ),
+    'daily_prompt': lambda fx: (
+        lambda: fx.ai._build_daily_summary_prompt(fx.daily_stats), 1
+    ),
+}
+
+
+def reference_workload():
+    """Fixed mix of interpreter work (dicts, strings, arithmetic) used to normalise timings"""
+    counts = {}
+    for i in range(2000):
+        key = f'k{i % 97}'
+        counts[key] = counts.get(key, 0) + i * i
+    return sorted(counts.items())
+
+
+def measure(func, items, rounds):
+    """
+    Best microseconds per item for `func` and for the reference workload
+    
+    The two are timed in alternating short chunks and the minimum of each
+    is kept, so a burst of machine noise hits both rather than one.
+    """
+    timers = [timeit.Timer(func), timeit.Timer(reference_workload)]
+    # Chunks of ~50 ms: short enough that the minimum filters out interference
+    numbers = [max(1, timer.autorange()[0] // 4) for timer in timers]
+    best = [float('inf'), float('inf')]
+    
+    for _ in range(rounds):
+        for i, (timer, number) in enumerate(zip(timers, numbers)):
+            best[i] = min(best[i], timer.timeit(number) / number)
+    
+    return best[0] / items * 1e6, best[1] * 1e6
+
+
+def run(names, rounds):
+    """
+    Time each case
+    
+    Returns:
+        dict: {case: {'us': microseconds per item, 'relative': us / reference us}}
+    """
+    fixtures = Fixtures()
+    results = {}
+    for name in names:
+        func, items = CASES[name](fixtures)
+        us, reference_us = measure(func, items, rounds)
+        results[name] = {'us': round(us, 4), 'relative': round(us / reference_us, 6)}
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Rows of (case, current us, change, status) against a baseline
+    
+    Cases are compared by their cost relative to the reference workload,
+    so only changes relative to the machine's speed count.
+    """
+    rows = []
+    
+    for name, current in results.items():
+        if name not in baseline:
+            rows.append((name, current['us'], None, 'NEW'))
+            continue
+        
+        change = current['relative'] / baseline[name]['relative'] - 1
+        limit = THRESHOLDS.get(name, threshold)
+        rows.append((name, current['us'], change, 'FAIL' if change > limit else 'PASS'))
+    
+    return rows
+
+
+def baseline_path(name):
+    return os.path.join(BASELINE_DIR, f'{name}.json')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--only', default=None, help='comma-separated case names')
+    parser.add_argument('--rounds', type=int, default=20, help='timing chunks per case (best is kept)')
+    parser.add_argument('--save', nargs='?', const='micro', metavar='NAME', help='store results as a baseline')
+    parser.add_argument('--check', nargs='?', const='micro', metavar='NAME', help='compare with a baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed slowdown as a fraction (per-case overrides in THRESHOLDS)')
+    args = parser.parse_args()
+    
+    names = args.only.split(',') if args.only else list(CASES)
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(unknown)}")
+    
+    results = run(names, args.rounds)
+    
+    if args.check:
+        with open(baseline_path(args.check)) as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline['results'], args.threshold)
+        
+        print(f"baseline '{args.check}' ({baseline['meta']['revision']}, {baseline['meta']['date']})")
+        print(f"{'case':<20}{'us/item':>10}{'change':>10}  status")
+        for name, us, change, status in rows:
+            change_text = f'{change * 100:>+9.1f}%' if change is not None else f"{'-':>10}"
+            print(f"{name:<20}{us:>10.3f}{change_text}  {status}")
+        
+        failed = [row[0] for row in rows if row[3] == 'FAIL']
+        if failed:
+            print(f"\nregressed: {', '.join(failed)}")
+            sys.exit(1)
+    else:
+        print(f"{'case':<20}{'us/item':>10}{'relative':>12}")
+        for name, row in results.items():
+            print(f"{name:<20}{row['us']:>10.3f}{row['relative']:>12.3e}")
+    
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        meta = {'revision': git_revision(), 'date': datetime.now().isoformat(timespec='seconds'),
+                'python': sys.version.split()[0]}
+        with open(baseline_path(args.save), 'w') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent=2)
+        print(f"saved baseline to {baseline_path(args.save)}")
+
+
+if __name__ == '__main__':
+    main()
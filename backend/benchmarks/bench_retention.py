@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Measure what compaction saves: raw events kept against rollups and sessions, and the query cost
+
+Loads one user's events over --days (benchmarks/telemetry.py) into two
+SQLite stores, compacts one of them with the default retention policy
+(app/retention.py) and compares stored rows, file size and the time of
+the dashboard, time-spent, patterns and AI weekly queries over 7 days
+to a year. Dashboard totals must match wherever a range starts on the
+hour.
+
+Usage (from backend/):
+    python -m benchmarks.bench_retention [--days 365] [--retention-days 30] [--noisy-days 7]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from bson import ObjectId
+from app.events.queries import build_event_documents
+from app.retention import compact_user
+from app.storage.retention import CompactedEventRepository
+from app.storage.sqlite import SQLiteStorage
+from benchmarks.bench_storage import BATCH_SIZE, best_ms
+from benchmarks.telemetry import generate
+
+NOISY_TYPES = ('WINDOW_FOCUS_CHANGED', 'IDLE_STATE_CHANGED')
+
+
+def operations(user_id, end):
+    """name -> call on an event repository, over ranges starting on the hour"""
+    ranges = {days: (end - timedelta(days=days), end) for days in (7, 30, 365)}
+    return {
+        'dashboard 7d': lambda events: events.dashboard(user_id, *ranges[7]),
+        'dashboard 30d': lambda events: events.dashboard(user_id, *ranges[30]),
+        'dashboard 365d': lambda events: events.dashboard(user_id, *ranges[365]),
+        'time-spent 365d': lambda events: len(list(events.activity(user_id, *ranges[365]))),
+        'patterns 365d': lambda events: events.peaks(user_id, *ranges[365]),
+        'ai weekly stats 30d': lambda events: events.weekly_stats(user_id, *ranges[30])
+    }
+
+
+def rows(storage, table):
+    return storage.database.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--retention-days', type=int, default=30)
+    parser.add_argument('--noisy-days', type=int, default=7)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+    
+    end = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    user_id = str(ObjectId())
+    documents, _ = build_event_documents(
+        user_id, generate(1, args.days, args.seed, end_ms=int(end.timestamp() * 1000))[0]
+    )
+    print(f"{len(documents)} events over {args.days} days")
+    
+    scratch = tempfile.mkdtemp()
+    try:
+        raw = SQLiteStorage(os.path.join(scratch, 'raw.db'))
+        compacted = SQLiteStorage(os.path.join(scratch, 'compacted.db'))
+        for storage in (raw, compacted):
+            for i in range(0, len(documents), BATCH_SIZE):
+                storage.events.insert_many([dict(document) for document in documents[i:i + BATCH_SIZE]])
+        
+        # A second on, as a later run would: compaction only folds events stored before it starts
+        result = compact_user(compacted, user_id, args.retention_days, args.noisy_days, NOISY_TYPES,
+                              now=datetime.utcnow() + timedelta(seconds=1))
+        compacted.database.execute('VACUUM')
+        print(f"compaction: {result['folded']} events folded into {result['rollups']} rollups "
+              f"and {result['sessions']} sessions")
+        federated = CompactedEventRepository(compacted.events, compacted.rollups, compacted.sessions, NOISY_TYPES)
+        
+        print(f"\n{'query (one user)':<22}{'raw median ms':>15}{'compacted':>11}{'ratio':>8}")
+        for operation, call in operations(user_id, end).items():
+            expected, actual = call(raw.events), call(federated)
+            if operation.startswith('dashboard') and expected[0] != actual[0]:
+                raise AssertionError(f'{operation}: {expected[0]} events raw, {actual[0]} compacted')
+            _, raw_ms = best_ms(lambda: call(raw.events), args.repeat)
+            _, compacted_ms = best_ms(lambda: call(federated), args.repeat)
+            print(f"{operation:<22}{raw_ms:>15.2f}{compacted_ms:>11.2f}{compacted_ms / raw_ms:>7.1f}x")
+        
+        print(f"\nRaw:       {rows(raw, 'events')} event rows, "
+              f"{os.path.getsize(os.path.join(scratch, 'raw.db')) / 1e6:.1f} MB")
+        print(f"Compacted: {rows(compacted, 'events')} event rows, {rows(compacted, 'event_rollups')} rollups, "
+              f"{rows(compacted, 'sessions')} sessions, "
+              f"{os.path.getsize(os.path.join(scratch, 'compacted.db')) / 1e6:.1f} MB")
+    finally:
+        shutil.rmtree(scratch)
+
+
+if __name__ == '__main__':
+    main()
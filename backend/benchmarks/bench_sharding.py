@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Check the shard ring's balance and a live rebalance across several mongods
+
+Ring (no MongoDB needed): places --keys random user ids on --shards shards
+for a few vnode counts and reports each one's spread (largest and smallest
+shard against an even split), then the share of users that move when one
+shard is added, next to what hash-modulo placement would move.
+
+Live (--uris, one per local mongod; the first is home): seeds --users users
+with --days of synthetic telemetry on all but the last shard, adds the last
+one to the ring and runs the rebalancer (app/sharding.py) while a writer
+thread keeps syncing --write-rate events/s through a ShardRouter. Then
+checks that each user's events all sit on its ring owner with none lost
+or duplicated, and reports the copy rate. Scratch databases are dropped.
+
+Usage (from backend/):
+    python -m benchmarks.bench_sharding [--shards 4] [--keys 100000]
+    # e.g. mongod --port 27018 --dbpath /tmp/shard1, and the same for 27019
+    python -m benchmarks.bench_sharding --uris mongodb://localhost:27017/ mongodb://localhost:27018/ mongodb://localhost:27019/
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+import timeit
+from collections import Counter
+from datetime import datetime
+from bson import ObjectId
+from pymongo import MongoClient
+from app.events.queries import build_event_documents
+from app.sharding import DIRECTORY, HOME, HashRing, ShardRouter, ring_position, move_users, plan_moves
+from benchmarks.telemetry import generate
+
+VNODES = [16, 64, 128, 256]
+
+
+def ring_report(shard_count, key_count, seed):
+    rng = random.Random(seed)
+    keys = [str(ObjectId(rng.randbytes(12))) for _ in range(key_count)]
+    shards = [f's{i}' for i in range(shard_count)]
+    even = key_count / shard_count
+    
+    print(f"{key_count} users on {shard_count} shards (even split: {even:.0f} each)")
+    print(f"{'vnodes':>8}{'max/even':>10}{'min/even':>10}{'stdev %':>9}{'moved +1':>10}{'owner us':>10}")
+    for vnodes in VNODES:
+        ring = HashRing(shards, vnodes)
+        owners = [ring.owner(key) for key in keys]
+        counts = Counter(owners)
+        grown = HashRing(shards + [f's{shard_count}'], vnodes)
+        moved = sum(1 for key, owner in zip(keys, owners) if grown.owner(key) != owner)
+        timer = timeit.Timer(lambda: ring.owner(keys[0]))
+        number = timer.autorange()[0]
+        lookup_us = min(timer.repeat(3, number)) / number * 1e6
+        print(f"{vnodes:>8}{max(counts.values()) / even:>10.3f}{min(counts.values()) / even:>10.3f}"
+              f"{statistics.pstdev(counts.values()) / even * 100:>9.1f}{moved / key_count:>10.1%}{lookup_us:>10.2f}")
+    
+    modulo_moved = sum(1 for key in keys if ring_position(key) % shard_count != ring_position(key) % (shard_count + 1))
+    print(f"Adding a shard: consistent hashing should move ~{1 / (shard_count + 1):.1%}, "
+          f"hash % N moves {modulo_moved / key_count:.1%}")
+
+
+def live_rebalance(uris, users, days, db_name, seed, cache_ttl, write_rate):
+    clients = [MongoClient(uri, serverSelectionTimeoutMS=5000) for uri in uris]
+    names = [HOME] + [f's{i}' for i in range(1, len(uris))]
+    shard_dbs = dict(zip(names, (client[db_name] for client in clients)))
+    home = shard_dbs[HOME]
+    
+    try:
+        for client in clients:
+            client.drop_database(db_name)
+        
+        # Before: the ring without the last shard, every user pinned to its owner there
+        before = ShardRouter(names[:-1], names, cache_ttl=cache_ttl)
+        user_ids = []
+        for events in generate(users, days, seed):
+            user_id = home.users.insert_one({'email': f'{ObjectId()}@bench', 'createdAt': datetime.utcnow()}).inserted_id
+            shard = before.assign(user_id, home[DIRECTORY])
+            documents, _ = build_event_documents(str(user_id), events)
+            if documents:
+                shard_dbs[shard].events.insert_many(documents)
+            user_ids.append(user_id)
+        seeded = sum(db.events.estimated_document_count() for db in shard_dbs.values())
+        print(f"Seeded {seeded} events for {users} users on {', '.join(names[:-1])}")
+        
+        # After: the app's routers see the grown ring; a writer keeps syncing meanwhile
+        router = ShardRouter(names, names, cache_ttl=cache_ttl)
+        moves = plan_moves(router, home)
+        print(f"{len(moves)} of {users} users move to {names[-1]} (even share: {users / len(names):.0f})")
+        
+        written = Counter()
+        stop = threading.Event()
+        
+        def writer():
+            rng = random.Random(seed)
+            while not stop.is_set():
+                user_id = rng.choice(user_ids)
+                shard = router.locate(user_id, home[DIRECTORY])
+                shard_dbs[shard].events.insert_one({
+                    'userId': user_id, 'type': 'TAB_UPDATED', 'timestamp': datetime.utcnow(),
+                    'domain': 'example.com', 'createdAt': datetime.utcnow()
+                })
+                written[user_id] += 1
+                time.sleep(1 / write_rate)
+        
+        thread = threading.Thread(target=writer, daemon=True)
+        thread.start()
+        started = time.perf_counter()
+        result = move_users(router, home, shard_dbs, moves, grace_seconds=cache_ttl + 1, log=lambda message: None)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        thread.join()
+        
+        # Every event, seeded or written during the move, should now be on its user's owner
+        misplaced = 0
+        for user_id in user_ids:
+            owner = router.owner(user_id)
+            for name, db in shard_dbs.items():
+                count = db.events.count_documents({'userId': user_id})
+                if name != owner and count:
+                    misplaced += count
+        total = sum(db.events.estimated_document_count() for db in shard_dbs.values())
+        lost = seeded + sum(written.values()) - total
+        
+        print(f"Moved {result['moved']} users in {elapsed:.2f}s (incl. {cache_ttl + 1:g}s grace), "
+              f"{result['copied']} documents copied, {result['deleted']} deleted, "
+              f"{result['copied'] / max(elapsed - cache_ttl - 1, 1e-9):.0f} docs/s")
+        print(f"Concurrent writes: {sum(written.values())}; lost or duplicated: {lost}; "
+              f"off their owner: {misplaced}; unverified: {len(result['unverified'])}")
+    finally:
+        for client in clients:
+            client.drop_database(db_name)
+            client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--shards', type=int, default=4)
+    parser.add_argument('--keys', type=int, default=100000, help='user ids placed on the ring')
+    parser.add_argument('--uris', nargs='*', default=[], help='mongod URIs for the live run (home first)')
+    parser.add_argument('--users', type=int, default=30)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--cache-ttl', type=float, default=2, help='router cache TTL in the live run')
+    parser.add_argument('--write-rate', type=float, default=200, help='events/s synced during the live run')
+    parser.add_argument('--db-name', default='browser_telemetry_shard_bench')
+    args = parser.parse_args()
+    
+    ring_report(args.shards, args.keys, args.seed)
+    
+    if args.uris:
+        if len(args.uris) < 2:
+            parser.error('--uris needs at least two MongoDB URIs')
+        print()
+        live_rebalance(args.uris, args.users, args.days, args.db_name, args.seed, args.cache_ttl, args.write_rate)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark worker cold start: fresh interpreter to a ready Flask app
+
+Each run starts a new Python process that imports the app and calls
+create_app(), as a gunicorn worker or a new autoscaled instance would, and
+reports the wall time plus the app's own startup report (imports and
+create_app phases). MongoDB does not need to be reachable: boot no longer
+connects.
+
+Usage (from backend/):
+    python -m benchmarks.bench_startup [--runs 10] [--config production]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+CHILD = """
+import json
+from app import create_app
+app = create_app({config!r})
+print(json.dumps(app.extensions['startup_report']))
+"""
+
+
+def run_once(config_name, env):
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD.format(config=config_name)],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    wall = (time.perf_counter() - start) * 1000
+    return wall, json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--config', default='production')
+    args = parser.parse_args()
+
+    # An unroutable MongoDB shows that boot does not wait on the database
+    env = {**os.environ, 'MONGODB_URI': os.getenv('MONGODB_URI', 'mongodb://127.0.0.1:1/')}
+
+    walls, imports, creates = [], [], []
+    phases = {}
+    for _ in range(args.runs):
+        wall, report = run_once(args.config, env)
+        walls.append(wall)
+        imports.append(report['imports_ms'])
+        creates.append(report['create_app_ms'])
+        for name, ms in report['phases_ms'].items():
+            phases.setdefault(name, []).append(ms)
+
+    print(f"{args.runs} cold starts, config={args.config}")
+    print(f"{'stage':<22}{'median ms':>12}{'max ms':>10}")
+    rows = [('process wall time', walls), ('app package imports', imports), ('create_app', creates)]
+    rows += [(f'  {name}', values) for name, values in phases.items()]
+    for label, values in rows:
+        print(f"{label:<22}{statistics.median(values):>12.1f}{max(values):>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
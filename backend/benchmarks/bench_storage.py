@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Compare the storage backends on the analytics read paths and on ingest
+
+Loads N users x M days of extension-shaped events (benchmarks/telemetry.py)
+through each backend's event repository, in /events/sync sized batches,
+then times the queries behind the dashboard, time-spent, productivity,
+patterns, AI daily/weekly and event listing routes for one user. SQLite
+always runs (in a scratch file); MongoDB runs too when --mongodb-uri is
+given, in a scratch database with the latest index version.
+
+Usage (from backend/):
+    python -m benchmarks.bench_storage [--users 20] [--days 30]
+    python -m benchmarks.bench_storage --mongodb-uri mongodb://localhost:27017/
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import MongoClient
+from app.events.queries import build_event_documents
+from app.migrations import migrate
+from app.storage.mongo import MongoEventRepository
+from app.storage.sqlite import SQLiteStorage
+from benchmarks.bench_micro import FIXTURE_END_MS
+from benchmarks.telemetry import generate
+
+BATCH_SIZE = 500
+
+
+def load(events_repository, streams):
+    """Insert every user's events in sync-sized batches; returns (user ids, events/s)"""
+    user_ids = []
+    inserted = 0
+    started = time.perf_counter()
+    
+    for events in streams:
+        user_id = str(ObjectId())
+        documents, _ = build_event_documents(user_id, events)
+        for i in range(0, len(documents), BATCH_SIZE):
+            inserted += events_repository.insert_many(documents[i:i + BATCH_SIZE])
+        user_ids.append(user_id)
+    
+    return user_ids, inserted / (time.perf_counter() - started)
+
+
+def operations(user_id, end):
+    """name -> call on an event repository, for the routes' query shapes"""
+    day_start = datetime.combine((end - timedelta(days=1)).date(), datetime.min.time())
+    ranges = {days: (end - timedelta(days=days), end) for days in (7, 30)}
+    return {
+        'dashboard 30d': lambda events: events.dashboard(user_id, *ranges[30]),
+        'time-spent 30d': lambda events: list(events.activity(user_id, *ranges[30])),
+        'productivity 7d': lambda events: events.productivity_counts(user_id, *ranges[7]),
+        'patterns 30d': lambda events: events.peaks(user_id, *ranges[30]),
+        'ai daily stats': lambda events: events.daily_stats(user_id, day_start, day_start + timedelta(days=1)),
+        'ai weekly stats': lambda events: events.weekly_stats(user_id, *ranges[7]),
+        'events page': lambda events: events.find(user_id, {}, limit=100),
+        'top domains': lambda events: events.top_domains(user_id, 10)
+    }
+
+
+def best_ms(func, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - started) * 1000)
+    return min(times), statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--mongodb-uri', help='also run against MongoDB (scratch database, dropped afterwards)')
+    parser.add_argument('--db-name', default='browser_telemetry_storage_bench')
+    args = parser.parse_args()
+    
+    streams = generate(args.users, args.days, args.seed, end_ms=FIXTURE_END_MS)
+    end = datetime.fromtimestamp(FIXTURE_END_MS / 1000)
+    print(f"{sum(len(events) for events in streams)} events for {args.users} users over {args.days} days")
+    
+    scratch = tempfile.mkdtemp()
+    backends = {'sqlite': SQLiteStorage(os.path.join(scratch, 'bench.db')).events}
+    client = None
+    if args.mongodb_uri:
+        client = MongoClient(args.mongodb_uri, serverSelectionTimeoutMS=5000)
+        client.drop_database(args.db_name)
+        migrate(client[args.db_name], log=lambda message: None)
+        backends['mongodb'] = MongoEventRepository(client[args.db_name])
+    
+    try:
+        results = {}
+        for name, events in backends.items():
+            user_ids, rate = load(events, streams)
+            print(f"{name}: ingest {rate:,.0f} events/s")
+            results[name] = {
+                operation: best_ms(lambda: call(events), args.repeat)
+                for operation, call in operations(user_ids[0], end).items()
+            }
+        
+        names = list(results)
+        print(f"\n{'query (one user)':<18}" + ''.join(f"{name + ' best ms':>18}{'median':>9}" for name in names)
+              + (f"{'speedup':>9}" if len(names) > 1 else ''))
+        for operation in results[names[0]]:
+            row = ''.join(f"{results[name][operation][0]:>18.2f}{results[name][operation][1]:>9.2f}" for name in names)
+            if len(names) > 1:
+                row += f"{results['mongodb'][operation][1] / results['sqlite'][operation][1]:>9.1f}x"
+            print(f"{operation:<18}{row}")
+        print(f"\nSQLite file: {sum(os.path.getsize(os.path.join(scratch, f)) for f in os.listdir(scratch)) / 1e6:.1f} MB")
+    finally:
+        if client is not None:
+            client.drop_database(args.db_name)
+            client.close()
+        for f in os.listdir(scratch):
+            os.remove(os.path.join(scratch, f))
+        os.rmdir(scratch)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Synthetic browser telemetry shaped like the extension's IndexedDB records
+
+Each simulated user has working days made of focus blocks separated by
+idle breaks. Within a block they navigate (TAB_UPDATED), switch tabs
+(TAB_ACTIVATED), open and close tabs and occasionally leave the browser
+window (WINDOW_FOCUS_CHANGED); breaks are bracketed by IDLE_STATE_CHANGED.
+Domains follow a Zipf distribution, with each user favouring a different
+handful of sites. Output is deterministic for a given seed.
+
+Usage (from backend/):
+    python -m benchmarks.telemetry [--users 3] [--days 1] [--seed 1] > events.jsonl
+"""
+import argparse
+import bisect
+import itertools
+import json
+import random
+import sys
+import time
+
+DAY_MS = 24 * 60 * 60 * 1000
+MINUTE_MS = 60 * 1000
+
+POPULAR_DOMAINS = [
+    'github.com', 'stackoverflow.com', 'docs.python.org', 'mail.google.com', 'youtube.com',
+    'reddit.com', 'slack.com', 'notion.so', 'news.ycombinator.com', 'twitter.com',
+    'linkedin.com', 'amazon.com', 'developer.mozilla.org', 'medium.com', 'netflix.com',
+    'calendar.google.com', 'jira.atlassian.com', 'bbc.com', 'wikipedia.org', 'figma.com'
+]
+
+# Navigation (per minute of focus) and page mix within a focus block
+MEAN_GAP_SECONDS = 40
+ACTION_WEIGHTS = {
+    'navigate': 0.55,  # TAB_UPDATED in the current tab
+    'switch': 0.30,    # TAB_ACTIVATED on another open tab
+    'open': 0.08,      # TAB_CREATED + TAB_UPDATED
+    'close': 0.04,     # TAB_REMOVED
+    'blur': 0.03       # WINDOW_FOCUS_CHANGED away and back
+}
+
+
+class ZipfSampler:
+    """Draw ranks 0..n-1 with P(k) proportional to 1 / (k + 1) ** s"""
+    
+    def __init__(self, n, s=1.1):
+        weights = [1 / (k + 1) ** s for k in range(n)]
+        self.cumulative = list(itertools.accumulate(weights))
+    
+    def sample(self, rng):
+        return bisect.bisect(self.cumulative, rng.random() * self.cumulative[-1])
+
+
+def domain_universe(size):
+    """Popular real domains followed by a long tail of synthetic ones"""
+    tail = [f'site{i}.example.com' for i in range(max(0, size - len(POPULAR_DOMAINS)))]
+    return (POPULAR_DOMAINS + tail)[:size]
+
+
+def _record(rng, event_type, ts, **payload):
+    """One event as the extension stores and syncs it"""
+    return {
+        '_id': f'{rng.getrandbits(128):032x}',
+        'v': 1,
+        'type': event_type,
+        'ts': ts,
+        'payload': {'type': event_type, 'ts': ts, **payload}
+    }
+
+
+class UserSimulator:
+    """Generates one user's events, day by day"""
+    
+    def __init__(self, seed, domains, zipf_s=1.1):
+        self.rng = random.Random(seed)
+        # Everyone shares the long tail, but favourites differ per user
+        head = domains[:len(POPULAR_DOMAINS)]
+        self.rng.shuffle(head)
+        self.domains = head + domains[len(POPULAR_DOMAINS):]
+        self.zipf = ZipfSampler(len(self.domains), zipf_s)
+        self.window_id = self.rng.randint(1, 10 ** 6)
+        self.next_tab_id = self.rng.randint(1, 10 ** 6)
+    
+    def _page(self):
+        domain = self.domains[self.zipf.sample(self.rng)]
+        page = self.rng.randint(1, 500)
+        return f'https://{domain}/page/{page}', f'{domain} page {page}'
+    
+    def day(self, day_start_ms):
+        """Events for the day starting at `day_start_ms` (may be empty on days off)"""
+        rng = self.rng
+        weekday = time.gmtime(day_start_ms / 1000).tm_wday
+        if rng.random() > (0.92 if weekday < 5 else 0.45):
+            return []
+        
+        events = []
+        tabs = {}
+        
+        def open_tab(ts):
+            tab_id = self.next_tab_id
+            self.next_tab_id += 1
+            url, title = self._page()
+            tabs[tab_id] = url
+            events.append(_record(rng, 'TAB_CREATED', ts, tabId=tab_id, windowId=self.window_id, url='chrome://newtab/'))
+            events.append(_record(rng, 'TAB_UPDATED', ts + rng.randint(200, 2000), tabId=tab_id,
+                                  windowId=self.window_id, url=url, title=title))
+            return tab_id
+        
+        ts = day_start_ms + int(rng.uniform(7.5, 10.5) * 60 * MINUTE_MS)
+        current = open_tab(ts)
+        actions, weights = zip(*ACTION_WEIGHTS.items())
+        
+        for block in range(rng.randint(2, 5)):
+            if block:
+                # Idle break before each block after the first
+                events.append(_record(rng, 'IDLE_STATE_CHANGED', ts, state='idle'))
+                ts += int(rng.uniform(10, 75) * MINUTE_MS)
+                events.append(_record(rng, 'IDLE_STATE_CHANGED', ts, state='active'))
+            
+            block_end = ts + int(rng.uniform(30, 150) * MINUTE_MS)
+            while ts < block_end:
+                ts += max(500, int(rng.expovariate(1 / MEAN_GAP_SECONDS) * 1000))
+                action = rng.choices(actions, weights)[0]
+                
+                if action == 'navigate' or (action == 'switch' and len(tabs) < 2):
+                    url, title = self._page()
+                    tabs[current] = url
+                    events.append(_record(rng, 'TAB_UPDATED', ts, tabId=current, windowId=self.window_id,
+                                          url=url, title=title))
+                elif action == 'switch':
+                    current = rng.choice([tab for tab in tabs if tab != current])
+                    events.append(_record(rng, 'TAB_ACTIVATED', ts, tabId=current, windowId=self.window_id,
+                                          url=tabs[current], title=tabs[current].split('/')[2]))
+                elif action == 'open':
+                    current = open_tab(ts)
+                elif action == 'close' and len(tabs) > 1:
+                    tabs.pop(current)
+                    events.append(_record(rng, 'TAB_REMOVED', ts, tabId=current, windowId=self.window_id))
+                    current = rng.choice(list(tabs))
+                    events.append(_record(rng, 'TAB_ACTIVATED', ts + 50, tabId=current, windowId=self.window_id,
+                                          url=tabs[current], title=tabs[current].split('/')[2]))
+                elif action == 'blur':
+                    events.append(_record(rng, 'WINDOW_FOCUS_CHANGED', ts, windowId=-1))
+                    ts += int(rng.uniform(5, 300) * 1000)
+                    events.append(_record(rng, 'WINDOW_FOCUS_CHANGED', ts, windowId=self.window_id))
+        
+        events.append(_record(rng, 'IDLE_STATE_CHANGED', ts, state='idle'))
+        events.sort(key=lambda event: event['ts'])
+        return events
+
+
+def generate(users, days, seed=1, domain_count=500, zipf_s=1.1, end_ms=None):
+    """
+    Synthetic telemetry for `users` users over the `days` days up to `end_ms`
+    
+    Returns:
+        list: one chronological event list per user; events later than
+        `end_ms` (default: now) are dropped so "today" stays partial
+    """
+    end_ms = end_ms if end_ms is not None else int(time.time() * 1000)
+    first_day = (end_ms // DAY_MS - days + 1) * DAY_MS
+    domains = domain_universe(domain_count)
+    
+    streams = []
+    for user in range(users):
+        simulator = UserSimulator(seed * 100003 + user, domains, zipf_s)
+        events = []
+        for day in range(days):
+            events.extend(event for event in simulator.day(first_day + day * DAY_MS) if event['ts'] <= end_ms)
+        streams.append(events)
+    
+    return streams
+
+
+def batches(events, size):
+    """Split one user's events into sync requests, as the extension does"""
+    for start in range(0, len(events), size):
+        yield events[start:start + size]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=3)
+    parser.add_argument('--days', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--domains', type=int, default=500)
+    args = parser.parse_args()
+    
+    for user, events in enumerate(generate(args.users, args.days, args.seed, args.domains)):
+        for event in events:
+            sys.stdout.write(json.dumps({'user': user, **event}) + '\n')
+
+
+if __name__ == '__main__':
+    main()
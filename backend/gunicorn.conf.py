@@ -0,0 +1,46 @@
+"""
+Gunicorn configuration
+
+    flask indexes migrate              # once per deploy
+    gunicorn -c gunicorn.conf.py run:app
+
+Every worker opens its own MongoDB connection pool after the fork, so
+--preload is safe, and boot never waits on MongoDB. Each worker has one
+pool per workload class (default, ingest, analytics); size each to at
+least the threads per worker. The deployment opens up to workers x the
+sum of MONGODB_MAX_POOL_SIZE, MONGODB_INGEST_MAX_POOL_SIZE and
+MONGODB_ANALYTICS_MAX_POOL_SIZE.
+
+Prometheus samples are shared between workers through files in
+PROMETHEUS_MULTIPROC_DIR (set and wiped here, before the app is
+imported), so GET /metrics reports the whole server whichever worker answers.
+"""
+import os
+import shutil
+import tempfile
+
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('PORT', 5000)}")
+workers = int(os.getenv('GUNICORN_WORKERS', 4))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'tracker-metrics'))
+
+# Samples left by a previous run would be merged into this one's. This runs
+# when gunicorn reads its config, before --preload imports the app (which
+# writes its first samples at import), so it cannot delete this run's files.
+shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+
+def post_fork(server, worker):
+    # Drop anything inherited from the master; the worker connects on its first query
+    from app.database import reset_after_fork
+    
+    reset_after_fork()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    
+    multiprocess.mark_process_dead(worker.pid)
@@ -52,11 +52,20 @@ if __name__ == '__main__':
     
     AI Insights:
     • GET    /api/ai/daily-summary            - Generate daily summary
+    • GET    /api/ai/daily-summary/stream     - Stream daily summary (SSE)
     • GET    /api/ai/productivity-insights    - Get productivity insights
+    • GET    /api/ai/productivity-insights/stream - Stream insights (SSE)
     • POST   /api/ai/categorize               - Categorize domain
+    • POST   /api/ai/categorize/batch         - Categorize many domains
     • GET    /api/ai/weekly-report            - Generate weekly report
+    • GET    /api/ai/status                   - LLM circuit breaker status
     • GET    /api/ai/insights/history         - Get insights history
     
+    Status:
+    • GET    /api/status/db                   - DB pool settings and wait metrics
+    • GET    /api/status/startup              - Worker startup time report
+    • GET    /metrics                         - Prometheus metrics
+    
     ═══════════════════════════════════════════════════
     """)
     
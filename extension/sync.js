@@ -41,6 +41,18 @@ export async function syncEvents() {
       };
     }
 
+    // Hold off after a 429 until the server's Retry-After has passed
+    const { syncRetryAt } = await chrome.storage.local.get(["syncRetryAt"]);
+    if (syncRetryAt && Date.now() < syncRetryAt) {
+      const retryAfter = Math.ceil((syncRetryAt - Date.now()) / 1000);
+      console.log(`[Sync] Rate limited - skipping sync for ${retryAfter}s`);
+      return {
+        success: false,
+        message: `Rate limited - retry in ${retryAfter}s`,
+        retryAfter,
+      };
+    }
+
     // Get all events from local database
     const events = await getAllEvents();
 
@@ -62,6 +74,7 @@ export async function syncEvents() {
     }
 
     let totalSynced = 0;
+    let retryAfter = null;
     const syncedEventIds = [];
 
     // Sync each batch
@@ -81,6 +94,16 @@ export async function syncEvents() {
           body: JSON.stringify({ events: batch }),
         });
 
+        if (response.status === 429) {
+          // Backpressure: keep the remaining batches until Retry-After has passed
+          retryAfter = parseInt(response.headers.get("Retry-After"), 10) || 60;
+          await chrome.storage.local.set({
+            syncRetryAt: Date.now() + retryAfter * 1000,
+          });
+          console.warn(`[Sync] Rate limited - retrying in ${retryAfter}s`);
+          break;
+        }
+
         if (!response.ok) {
           if (response.status === 401) {
             console.error(
@@ -118,6 +141,15 @@ export async function syncEvents() {
       await deleteEvents(syncedEventIds);
     }
 
+    if (retryAfter !== null) {
+      return {
+        success: false,
+        message: `Rate limited - retry in ${retryAfter}s`,
+        synced: totalSynced,
+        retryAfter,
+      };
+    }
+
     console.log(`[Sync] Sync complete - ${totalSynced} events synced`);
 
     return {